@@ -4,16 +4,32 @@ import random
 import pandas as pd
 import undetected_chromedriver as uc
 from selenium.webdriver.common.by import By
+from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, WebDriverException
 import urllib.parse
 import sys
+import argparse
 
 # Add the parent directory to sys.path to import file_manager
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 import file_manager
-
+import adaptive_wait
+import driver_cache
+import media_render
+import contact_cache
+import app_logging
+import attachments
+from contact_utils import template_values
+
+log = app_logging.get_logger('main')
+
+# Wait timeouts learned per stage from observed wait times; the old fixed values are the defaults
+stage_timeouts = adaptive_wait.StageTimeouts(defaults={
+    'chat_open': 10, 'send_button': 10, 'attach_button': 10, 'file_input': 20, 'upload_preview': 20,
+    'caption_box': 20,
+})
 
 def setup_driver():
     chrome_options = uc.ChromeOptions()
@@ -21,23 +37,24 @@ def setup_driver():
     chrome_options.add_argument('--disable-notifications')
     chrome_options.add_argument('--start-maximized')
     chrome_options.add_argument('--disable-popup-blocking')
-    driver = uc.Chrome(options=chrome_options)
+    # The patched chromedriver comes from the local cache instead of being fetched on every start
+    driver = driver_cache.start_chrome(chrome_options)
     return driver
 
 
 def load_contacts(file_path):
     try:
-        # Load contacts from Excel file
-        df = pd.read_excel(file_path, engine='openpyxl')
-        df.columns = df.columns.str.strip().str.upper()  # Normalize column names
+        # Loaded like media_render.py does, so pre-rendered media match the files rendered here
+        df = contact_cache.read_contacts_frame(file_path)
         required_columns = {'NAME', 'UAN', 'MOBILE', 'DOB'}
         if required_columns.issubset(df.columns):
-            return df[['NAME', 'UAN', 'DOB', 'MOBILE']].to_dict(orient='records')
+            # Every column is kept for the templates, including the optional ATTACHMENTS column
+            return df.to_dict(orient='records')
         else:
-            print("Error: Required columns ('NAME', 'UAN', 'DOB', 'MOBILE') are missing.")
+            log.error("Required columns ('NAME', 'UAN', 'DOB', 'MOBILE') are missing.")
             return []
     except Exception as e:
-        print(f"Error loading contacts: {e}")
+        log.error("Error loading contacts: %s", e)
         return []
 
 
@@ -48,18 +65,13 @@ def load_message_template(file_path):
             message_template = file.read()
         return message_template
     except Exception as e:
-        print(f"Error reading message template: {e}")
+        log.error("Error reading message template: %s", e)
         return None
 
 
 def format_message(contact, message_template):
-    """Generate personalized message."""
-    return message_template.format(
-        name=contact['NAME'],
-        uan=contact['UAN'],
-        dob=contact['DOB'],
-        mobile=contact['MOBILE']
-    )
+    """Generate personalized message. Every contact column is a placeholder, e.g. {name} or {uan}."""
+    return message_template.format(**template_values(contact))
 
 def send_message(driver, contact, message):
     try:
@@ -68,67 +80,119 @@ def send_message(driver, contact, message):
 
         # Navigate to the WhatsApp Web URL for the contact
         url = f"https://web.whatsapp.com/send?phone={phone_number}&text={encoded_message}"
+        started = time.monotonic()  # The chat is timed from the navigation, pause included
         driver.get(url)
         time.sleep(random.uniform(3,10))
 
         # Wait for the message box and send button
-        WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.XPATH, '//div[@contenteditable="true"][@data-tab="10"]'))
+        stage_timeouts.wait(driver, 'chat_open',
+            EC.presence_of_element_located((By.XPATH, '//div[@contenteditable="true"][@data-tab="10"]')), started=started
         )
-        send_button = WebDriverWait(driver, 10).until(
+        send_button = stage_timeouts.wait(driver, 'send_button',
             EC.presence_of_element_located((By.XPATH, "//button[@data-tab='11' and @aria-label='Send']"))
         )
         send_button.click()
         time.sleep(random.uniform(1,5))
 
-        print(f"Message sent to {contact['MOBILE']}")
+        log.info("Message sent to %s", contact['MOBILE'], extra=app_logging.log_fields(contact, stage='send_message'))
+        return True
+    except TimeoutException:
+        log.warning("Timeout occurred for contact: %s", contact['MOBILE'],
+                    extra=app_logging.log_fields(contact, stage='send_message'))
+        return False
+    except WebDriverException as e:
+        log.error("Error sending message to %s: %s", contact['MOBILE'], app_logging.short_error(e), exc_info=e,
+                  extra=app_logging.log_fields(contact, stage='send_message'))
+        return False
+
+def can_type(text):
+    # chromedriver's send_keys only handles the Basic Multilingual Plane, so no emoji
+    return all(ord(character) <= 0xFFFF for character in text)
+
+def type_caption(element, text):
+    """Type a multi-line text in one call; Shift+Enter starts a new line where Enter would send."""
+    keys = []
+    for number, line in enumerate(text.split('\n')):
+        if number:
+            keys.extend([Keys.SHIFT, Keys.ENTER, Keys.NULL])  # NULL releases Shift again
+        if line:
+            keys.append(line)
+    element.send_keys(*keys)
+
+def open_chat(driver, contact):
+    """Open the contact's chat without a typed message, for sending the message as a caption."""
+    try:
+        phone_number = str(contact['MOBILE']).strip().replace(" ", "").replace("-", "").replace("+", "")
+        started = time.monotonic()  # The chat is timed from the navigation, pause included
+        driver.get(f"https://web.whatsapp.com/send?phone={phone_number}")
+        time.sleep(random.uniform(3,10))
+
+        stage_timeouts.wait(driver, 'chat_open',
+            EC.presence_of_element_located((By.XPATH, '//div[@contenteditable="true"][@data-tab="10"]')), started=started
+        )
         return True
     except TimeoutException:
-        print(f"Timeout occurred for contact: {contact['MOBILE']}")
+        log.warning("Timeout occurred for contact: %s", contact['MOBILE'],
+                    extra=app_logging.log_fields(contact, stage='open_chat'))
         return False
     except WebDriverException as e:
-        print(f"Error sending message to {contact['MOBILE']}: {e}")
+        log.error("Error opening chat of %s: %s", contact['MOBILE'], app_logging.short_error(e), exc_info=e,
+                  extra=app_logging.log_fields(contact, stage='open_chat'))
         return False
 
-def send_photos(driver, contact, attachment_paths):
+def send_photos(driver, contact, attachment_paths, caption=None):
     try:
         # Click on the attachment button (paperclip icon)
-        attachment_button = WebDriverWait(driver, 10).until(
+        attachment_button = stage_timeouts.wait(driver, 'attach_button',
             EC.presence_of_element_located((By.XPATH, "//button[@title='Attach' and @data-tab='10']"))
         )
         attachment_button.click()
+        clicked = time.monotonic()
         time.sleep(random.uniform(5, 10))  # Short delay to allow dropdown menu to appear
 
         # Locate the file input for attaching photos
-        file_input = WebDriverWait(driver, 20).until(
-            EC.presence_of_element_located((By.XPATH, '//input[@accept="image/*,video/mp4,video/3gpp,video/quicktime" and @type="file"]'))
+        file_input = stage_timeouts.wait(driver, 'file_input',
+            EC.presence_of_element_located((By.XPATH, '//input[@accept="image/*,video/mp4,video/3gpp,video/quicktime" and @type="file"]')), started=clicked
         )
 
         # Send all images at once
         file_input.send_keys("\n".join(attachment_paths))  # Upload all photos at once by joining paths with newline
+        uploaded = time.monotonic()
         time.sleep(random.uniform(5, 10))  # Wait for the files to be uploaded
 
+        # Type the message into the preview's caption field
+        if caption:
+            caption_box = stage_timeouts.wait(driver, 'caption_box',
+                EC.presence_of_element_located((By.XPATH, '//div[@contenteditable="true"][@aria-label="Add a caption"]')), started=uploaded
+            )
+            type_caption(caption_box, caption)
+            uploaded = None  # The preview was there before the caption was typed
+
         # Click the send button
-        send_button = WebDriverWait(driver, 20).until(
-            EC.presence_of_element_located((By.XPATH, "//div[@class='x1247r65 xng8ra']//div[@role='button' and @aria-label='Send']"))
+        send_button = stage_timeouts.wait(driver, 'upload_preview',
+            EC.presence_of_element_located((By.XPATH, "//div[@class='x1247r65 xng8ra']//div[@role='button' and @aria-label='Send']")), started=uploaded
         )
         send_button.click()
         time.sleep(random.uniform(5, 10))  # Short delay after sending the photos
 
-        print(f"Photos sent to {contact['MOBILE']}: {', '.join(attachment_paths)}")
+        log.info("Photos sent to %s: %s", contact['MOBILE'], ', '.join(attachment_paths),
+                 extra=app_logging.log_fields(contact, stage='send_photos'))
         return True
     except TimeoutException:
-        print(f"Timeout occurred while sending photos to {contact['MOBILE']}")
+        log.warning("Timeout occurred while sending photos to %s", contact['MOBILE'],
+                    extra=app_logging.log_fields(contact, stage='send_photos'))
         return False
     except WebDriverException as e:
-        print(f"Error sending photos to {contact['MOBILE']}: {e}")
+        log.error("Error sending photos to %s: %s", contact['MOBILE'], app_logging.short_error(e), exc_info=e,
+                  extra=app_logging.log_fields(contact, stage='send_photos'))
         return False
 
-def main():
+def main(caption=False):
     # File paths
     base_path = os.path.dirname(os.path.abspath(__file__))
     excel_file = os.path.join(base_path, "contacts.xlsx")
     message_template_file = os.path.join(base_path, "Message.txt")
+    media_template_file = os.path.join(base_path, "Media_Template.json")  # Optional, see media_render.py
     failed_contacts_file = os.path.join(base_path, "Failed_Contacts.xlsx")
 
     # Image files
@@ -164,7 +228,7 @@ def main():
         if os.path.exists(image_file):
             file_manager.handle_image_file(image_file, action="backup")
 
-    print("All files have been reset. New empty files have been created.")
+    log.info("All files have been reset. New empty files have been created.")
 
     # Set the attachment paths for sending
     attachment_paths = [image_file for image_file in image_files if os.path.exists(image_file)]
@@ -172,16 +236,34 @@ def main():
     # Load contacts (will be empty since we just created a new file)
     contacts = load_contacts(excel_file)
     if not contacts:
-        print("No contacts found in the newly created Excel file.")
-        print("Please add contacts to the Excel file and run the program again.")
+        log.warning("No contacts found in the newly created Excel file.")
+        log.info("Please add contacts to the Excel file and run the program again.")
         return
 
     # Load message template
     message_template = load_message_template(message_template_file)
     if not message_template:
-        print("Error loading message template. Exiting.")
+        log.error("Error loading message template. Exiting.")
         return
 
+    # Check every per-contact attachment before the first message goes out
+    attachment_plan = attachments.build_attachment_plan(contacts, attachment_paths, base_dir=base_path)
+    if attachments.report_problems(attachment_plan):
+        log.error("Fix the attachment paths above and run the program again. Exiting.")
+        return
+
+    # Personalized images are rendered in worker processes ahead of the send loop; the first
+    # ones start here, so they render while the QR code is scanned
+    renderer = None
+    media_files = None
+    if os.path.exists(media_template_file):
+        try:
+            renderer = media_render.MediaRenderer.from_file(media_template_file)
+        except (OSError, ValueError, KeyError) as e:
+            log.error("Error loading media template: %s. Exiting.", e)
+            return
+        media_files = renderer.stream(contact for contact, _ in attachment_plan)
+
     # Setup browser driver
     driver = setup_driver()
     try:
@@ -189,31 +271,70 @@ def main():
         input("Scan the QR code and press Enter to continue...")
         time.sleep(10)  # Wait for user to log in
 
-        for i, contact in enumerate(contacts, start=1):
-            print(f"Sending message to ({i}/{len(contacts)}): {contact['MOBILE']}")
+        # Contacts are sent grouped by their attachment set
+        render_failed = []
+        for i, (contact, contact_attachments) in enumerate(attachment_plan, start=1):
+            log.info("Sending message to (%s/%s): %s", i, len(attachment_plan), contact['MOBILE'],
+                     extra=app_logging.log_fields(contact, stage='send'))
             message = format_message(contact, message_template)
+            if media_files is not None:
+                media_file = next(media_files)
+                if not media_file:
+                    # Sending without the personalized file would look like a success; count it as failed
+                    log.error("Not sending to %s: their personalized media could not be rendered", contact['MOBILE'],
+                              extra=app_logging.log_fields(contact, stage='render_media'))
+                    render_failed.append(contact)
+                    continue
+                contact_attachments = list(contact_attachments) + [media_file]
+
+            if caption and contact_attachments and not can_type(message):
+                log.info("Sending the message to %s as text: chromedriver cannot type its emoji into a caption",
+                         contact['MOBILE'], extra=app_logging.log_fields(contact, stage='send_photos'))
+            elif caption and contact_attachments:
+                # Photos and text in one upload; if the upload fails the text is sent on its own below
+                chat_opened = open_chat(driver, contact)
+                if not chat_opened or send_photos(driver, contact, contact_attachments, caption=message):
+                    time.sleep(random.uniform(3, 5))  # Short delay between messages
+                    continue
+                log.warning("Sending the message as caption failed for %s (the upload did not go out, see above); "
+                            "sending it as text", contact['MOBILE'],
+                            extra=app_logging.log_fields(contact, stage='send_photos'))
 
             # Send text message first
             message_sent = send_message(driver, contact, message)
 
             # Send photos with message if text message was sent successfully
-            if message_sent and attachment_paths:
-                photo_sent = send_photos(driver, contact, attachment_paths)
+            if message_sent and contact_attachments:
+                photo_sent = send_photos(driver, contact, contact_attachments)
                 if not photo_sent:
-                    print(f"Failed to send photos to {contact['MOBILE']}")
+                    log.warning("Failed to send photos to %s", contact['MOBILE'],
+                                extra=app_logging.log_fields(contact, stage='send_photos'))
             elif not message_sent:
-                print(f"Skipping photo upload for {contact['MOBILE']} due to text message failure.")
+                log.warning("Skipping photo upload for %s due to text message failure.", contact['MOBILE'],
+                            extra=app_logging.log_fields(contact, stage='send_photos'))
 
             time.sleep(random.uniform(3, 5))  # Short delay between messages
+
+        if render_failed:
+            log.error("%s contacts were not sent because their media could not be rendered; they are listed in '%s'.",
+                      len(render_failed), failed_contacts_file)
+            pd.DataFrame(render_failed).to_excel(failed_contacts_file, index=False)
     finally:
+        if renderer:
+            renderer.close()
         try:
             driver.quit()
         except Exception as e:
-            print(f"Error during driver quit: {e}")
+            log.error("Error during driver quit: %s", e)
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Send WhatsApp messages and photos to a list of contacts.")
+    parser.add_argument('--caption', action='store_true',
+                        help="Upload the photos together, with the message as caption, instead of sending them separately.")
+    args = parser.parse_args()
+    app_logging.configure_logging()
+    main(caption=args.caption)
 
 
 # This is the main code which send photo and text message to the contact using WhatsApp web so don't dare to touch
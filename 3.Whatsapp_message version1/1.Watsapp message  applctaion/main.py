@@ -4,7 +4,6 @@ import random
 import pandas as pd
 import undetected_chromedriver as uc
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, WebDriverException
 import urllib.parse
@@ -13,6 +12,13 @@ import sys
 # Add the parent directory to sys.path to import file_manager
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 import file_manager
+import adaptive_wait
+import app_logging
+
+log = app_logging.get_logger('main')
+
+# Wait timeouts learned per stage from observed wait times; the old fixed values are the defaults
+stage_timeouts = adaptive_wait.StageTimeouts(defaults={'chat_open': 10, 'send_button': 10, 'send_confirm': 10})
 
 
 def setup_driver():
@@ -34,10 +40,10 @@ def load_contacts(file_path):
         if required_columns.issubset(df.columns):
             return df[['MOBILE']].to_dict(orient='records')
         else:
-            print("Error: Required columns ( 'MOBILE') are missing.")
+            log.error("Required columns ( 'MOBILE') are missing.")
             return []
     except Exception as e:
-        print(f"Error loading contacts: {e}")
+        log.error("Error loading contacts: %s", e)
         return []
 
 
@@ -48,7 +54,7 @@ def load_message_template(file_path):
             message_template = file.read()
         return message_template
     except Exception as e:
-        print(f"Error reading message template: {e}")
+        log.error("Error reading message template: %s", e)
         return None
 
 
@@ -68,33 +74,38 @@ def send_message(driver, contact, message):
 
         # Navigate to the WhatsApp Web URL for the contact
         url = f"https://web.whatsapp.com/send?phone={phone_number}&text={encoded_message}"
+        started = time.monotonic()  # The chat is timed from the navigation, pause included
         driver.get(url)
         time.sleep(random.uniform(1,4))  # Wait for the page to load
 
         # Wait for the message box and send button
-        message_box = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.XPATH, '//div[@contenteditable="true"][@data-tab="10"]'))
+        message_box = stage_timeouts.wait(driver, 'chat_open',
+            EC.presence_of_element_located((By.XPATH, '//div[@contenteditable="true"][@data-tab="10"]')), started=started
         )
-        send_button = WebDriverWait(driver, 10).until(
+        send_button = stage_timeouts.wait(driver, 'send_button',
             EC.presence_of_element_located((By.XPATH, '//span[@data-icon="send"]'))
         )
 
         # Click on the send button
         send_button.click()
+        clicked = time.monotonic()
         time.sleep(random.uniform(1,4))  # Short delay after sending
 
         # Verify if the message was sent (a simple confirmation can be added here)
-        WebDriverWait(driver, 10).until(
-            EC.invisibility_of_element_located((By.XPATH, '//span[@data-icon="send"]'))
+        stage_timeouts.wait(driver, 'send_confirm',
+            EC.invisibility_of_element_located((By.XPATH, '//span[@data-icon="send"]')), started=clicked
         )
-        print(f"Message successfully sent to {contact['MOBILE']}")
+        log.info("Message successfully sent to %s", contact['MOBILE'],
+                 extra=app_logging.log_fields(contact, stage='send_message'))
         return True
 
     except TimeoutException:
-        print(f"Timeout occurred for contact: {contact['MOBILE']}")
+        log.warning("Timeout occurred for contact: %s", contact['MOBILE'],
+                    extra=app_logging.log_fields(contact, stage='send_message'))
         return False
     except WebDriverException as e:
-        print(f"Error sending message to {contact['MOBILE']}: {e}")
+        log.error("Error sending message to %s: %s", contact['MOBILE'], app_logging.short_error(e), exc_info=e,
+                  extra=app_logging.log_fields(contact, stage='send_message'))
         return False
 
 import os
@@ -105,25 +116,26 @@ def retry_failed_contacts(driver, contacts, message, max_retries=3):
     for attempt in range(max_retries):
         current_failed_contacts = []
         for contact in contacts:
-            print(f"Retrying ({attempt + 1}/{max_retries}): {contact['MOBILE']}")
+            log.info("Retrying (%s/%s): %s", attempt + 1, max_retries, contact['MOBILE'],
+                     extra=app_logging.log_fields(contact, stage='retry'))
             success = send_message(driver, contact, message)
             if not success:
                 current_failed_contacts.append(contact)
 
         if not current_failed_contacts:
-            print("All messages sent successfully!")
+            log.info("All messages sent successfully!")
             return True  # All messages sent successfully
         else:
-            print(f"Retrying failed contacts ({len(current_failed_contacts)})...")
+            log.warning("Retrying failed contacts (%s)...", len(current_failed_contacts))
 
         contacts = current_failed_contacts  # Update contacts to failed ones for the next attempt
         failed_contacts.extend(current_failed_contacts)  # Add to the overall failed list
 
     # Log failed contacts after all retries
     if failed_contacts:
-        print("Failed to send messages to the following contacts after retries:")
+        log.error("Failed to send messages to the following contacts after retries:")
         for contact in failed_contacts:
-            print(contact['MOBILE'])
+            log.error("%s", contact['MOBILE'], extra=app_logging.log_fields(contact, stage='retry'))
 
         # Check if the file exists
         base_path = os.path.dirname(os.path.abspath(__file__))
@@ -148,7 +160,7 @@ def retry_failed_contacts(driver, contacts, message, max_retries=3):
             failed_contacts_df = pd.DataFrame(failed_contacts)
             failed_contacts_df.to_excel(failed_contacts_file, index=False)
 
-        print(f"Failed contacts have been logged into '{failed_contacts_file}'.")
+        log.info("Failed contacts have been logged into '%s'.", failed_contacts_file)
 
     return False
 
@@ -179,20 +191,20 @@ def main():
         file_manager.delete_excel_file(failed_contacts_file, backup=True)
         file_manager.create_empty_excel(failed_contacts_file, columns=['MOBILE'])
 
-    print("All files have been reset. New empty files have been created.")
+    log.info("All files have been reset. New empty files have been created.")
 
     # Load contacts (will be empty since we just created a new file)
     contacts = load_contacts(excel_file)
 
     if not contacts:
-        print("No contacts found in the newly created Excel file.")
-        print("Please add contacts to the Excel file and run the program again.")
+        log.warning("No contacts found in the newly created Excel file.")
+        log.info("Please add contacts to the Excel file and run the program again.")
         return
 
     # Load message template
     message_template = load_message_template(message_template_file)
     if not message_template:
-        print("Error loading message template. Exiting.")
+        log.error("Error loading message template. Exiting.")
         return
 
     # Setup browser driver
@@ -203,16 +215,20 @@ def main():
         time.sleep(10)  # Wait for user to log in
 
         for i, contact in enumerate(contacts, start=1):
-            print(f"Sending message to ({i}/{len(contacts)}): {contact['MOBILE']}")
+            log.info("Sending message to (%s/%s): %s", i, len(contacts), contact['MOBILE'],
+                     extra=app_logging.log_fields(contact, stage='send'))
             message = format_message(contact, message_template)
             success = send_message(driver, contact, message)
             if not success:
-                print(f"Adding {contact['MOBILE']} to retry list")
+                log.info("Adding %s to retry list", contact['MOBILE'], extra=app_logging.log_fields(contact, stage='retry'))
                 retry_failed_contacts(driver, [contact], message)  # Retry for failed contact
             time.sleep(random.uniform(1,2))  # Short delay between messages
+        for stage, (samples, p99, timeout) in stage_timeouts.summary().items():
+            log.info("Wait '%s': %s samples, p99 %.1f s, timeout now %.1f s", stage, samples, p99, timeout)
     finally:
         driver.quit()
 
 
 if __name__ == "__main__":
+    app_logging.configure_logging()
     main()
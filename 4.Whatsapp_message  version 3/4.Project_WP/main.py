@@ -183,39 +183,95 @@ import time
 import random
 import pandas as pd
 import undetected_chromedriver as uc
+from selenium import webdriver
 from selenium.webdriver.common.by import By
+from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, WebDriverException
 import urllib.parse
 import sys
+import argparse
+import threading
+from collections import Counter, deque
 
 # Add the parent directory to sys.path to import file_manager
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 import file_manager
-
-def setup_driver():
-    chrome_options = uc.ChromeOptions()
+import scheduler
+import job_api
+import delivery_report
+import receipt_tracker
+import contact_cache
+import contact_store
+import profiling
+import adaptive_wait
+import progress
+import app_logging
+import attachments
+import session_pool
+import cdp_backend
+import incremental
+import chat_prefetch
+import driver_cache
+import transports
+from contact_utils import normalize_mobile, template_values
+from delivery_report import (SendResult, STATUS_SENT, FAILURE_TIMEOUT, FAILURE_WEBDRIVER, FAILURE_ATTACHMENT, FAILURE_API,
+                             FAILURE_TEMPLATE)
+
+log = app_logging.get_logger('main')
+
+# Wait timeouts learned per stage from observed wait times; the old fixed values are the defaults
+stage_timeouts = adaptive_wait.StageTimeouts(defaults={
+    'chat_open': 10, 'send_button': 10, 'attach_button': 10, 'file_input': 10, 'upload_preview': 10,
+    'caption_box': 10, 'message_out': 10,
+})
+
+# WhatsApp Web elements the send functions wait for
+COMPOSE_BOX_XPATH = '//div[@contenteditable="true"][@data-tab="10"]'
+SEND_ICON_XPATH = '//span[@data-icon="send"]'
+ATTACH_BUTTON_XPATH = '//button[@aria-label="Attach"]'
+FILE_INPUT_XPATH = '//input[@type="file"]'
+CAPTION_BOX_XPATH = '//div[@contenteditable="true"][@aria-label="Add a caption"]'
+
+BACKEND_WEBDRIVER = 'webdriver'
+BACKEND_CDP = 'cdp'
+
+TRANSPORT_BROWSER = 'browser'
+TRANSPORT_API = 'api'
+
+def setup_driver(remote_url=None, profile_dir=None, node=None, session_name=None):
+    """
+    Start Chrome locally with undetected_chromedriver or, with remote_url, on a Selenium Grid or
+    standalone-chrome endpoint (pinned to node). profile_dir keeps the WhatsApp login between runs.
+    """
+    # undetected_chromedriver patches a local chromedriver binary, so remote sessions use plain options
+    chrome_options = webdriver.ChromeOptions() if remote_url else uc.ChromeOptions()
     chrome_options.add_argument('--disable-blink-features=AutomationControlled')
     chrome_options.add_argument('--disable-notifications')
     chrome_options.add_argument('--start-maximized')
     chrome_options.add_argument('--disable-popup-blocking')
-    driver = uc.Chrome(options=chrome_options)
+    if remote_url:
+        if profile_dir:
+            chrome_options.add_argument(f'--user-data-dir={profile_dir}')  # Path on the node
+        return session_pool.create_remote_driver(remote_url, chrome_options, node=node, session_name=session_name)
+    # The patched chromedriver comes from the local cache instead of being fetched on every start
+    driver = driver_cache.start_chrome(chrome_options, user_data_dir=profile_dir)
     return driver
 
 def load_contacts(file_path):
     try:
-        # Reading the contacts file using pandas
-        df = pd.read_excel(file_path, engine='openpyxl')
-        df.columns = df.columns.str.strip().str.upper()  # Clean up column names
+        # Parsed and normalized contacts are cached until the workbook changes
+        df = contact_cache.read_contacts_frame(file_path)
         required_columns = {'MOBILE'}
         if required_columns.issubset(df.columns):
-            return df[['MOBILE']].to_dict(orient='records')
+            # Every column is kept so the template can use any of them, in a compact column store
+            return contact_store.ContactStore.from_frame(df)
         else:
-            print("Error: Required columns (MOBILE) are missing.")
+            log.error("Required columns (MOBILE) are missing.")
             return []
     except Exception as e:
-        print(f"Error loading contacts: {e}")
+        log.error("Error loading contacts: %s", e)
         return []
 
 def load_message_template(file_path):
@@ -225,83 +281,248 @@ def load_message_template(file_path):
             message_template = file.read()
         return message_template
     except UnicodeDecodeError as e:
-        print(f"Error: Unable to decode the message template file. {e}")
+        log.error("Unable to decode the message template file. %s", e)
         return None
     except Exception as e:
-        print(f"Error reading message template: {e}")
+        log.error("Error reading message template: %s", e)
         return None
 
 def format_message(contact, message_template):
-    return message_template.format(
-        mobile=contact['MOBILE']
-    )
-
-def send_message(driver, contact, message):
+    # Every contact column is available to the template, e.g. {mobile} or {name}
+    return message_template.format(**template_values(contact))
+
+def chat_url(contact, message=None):
+    """WhatsApp Web URL that opens the contact's chat, with the message typed in if given."""
+    phone_number = normalize_mobile(contact['MOBILE'])
+    if message is None:
+        return f"https://web.whatsapp.com/send?phone={phone_number}"
+    encoded_message = urllib.parse.quote(message)
+    return f"https://web.whatsapp.com/send?phone={phone_number}&text={encoded_message}"
+
+def can_type(text):
+    # chromedriver's send_keys only handles the Basic Multilingual Plane, so no emoji
+    return all(ord(character) <= 0xFFFF for character in text)
+
+def type_caption(element, text):
+    """Type a multi-line text in one call; Shift+Enter starts a new line where Enter would send."""
+    keys = []
+    for number, line in enumerate(text.split('\n')):
+        if number:
+            keys.extend([Keys.SHIFT, Keys.ENTER, Keys.NULL])  # NULL releases Shift again
+        if line:
+            keys.append(line)
+    element.send_keys(*keys)
+
+def open_chat(driver, contact, navigate=True):
+    """Open the contact's chat without a typed message, for sending the message as a caption."""
     try:
-        phone_number = str(contact['MOBILE']).strip().replace(" ", "").replace("-", "").replace("+", "")
-        encoded_message = urllib.parse.quote(message)
+        page = cdp_backend.page_for(driver)
+        started = None  # A pre-loaded chat is timed from now
+        if navigate:
+            url = chat_url(contact)
+            started = time.monotonic()  # The chat is timed from the navigation, pause included
+            if page:
+                page.navigate(url)
+            else:
+                driver.get(url)
+            time.sleep(random.uniform(3,10))
+
+        if page:
+            page.run_steps([('chat_open', COMPOSE_BOX_XPATH, None)], stage_timeouts, started=started)
+        else:
+            stage_timeouts.wait(driver, 'chat_open',
+                EC.presence_of_element_located((By.XPATH, COMPOSE_BOX_XPATH)), started=started
+            )
+        return SendResult(True)
+    except TimeoutException:
+        log.warning("Timeout occurred for contact: %s", contact['MOBILE'],
+                    extra=app_logging.log_fields(contact, stage='open_chat'))
+        return SendResult(False, FAILURE_TIMEOUT)
+    except WebDriverException as e:
+        log.error("Error opening chat of %s: %s", contact['MOBILE'], app_logging.short_error(e), exc_info=e,
+                  extra=app_logging.log_fields(contact, stage='open_chat'))
+        return SendResult(False, FAILURE_WEBDRIVER, e.msg)
 
-        # Navigate to the WhatsApp Web URL for the contact
-        url = f"https://web.whatsapp.com/send?phone={phone_number}&text={encoded_message}"
-        driver.get(url)
-        time.sleep(random.uniform(3,10))
+def send_message(driver, contact, message, navigate=True):
+    """Open the contact's chat (unless it was pre-loaded) and send the message."""
+    try:
+        page = cdp_backend.page_for(driver)
+        started = None  # A pre-loaded chat is timed from now
+        if navigate:
+            # Navigate to the WhatsApp Web URL for the contact
+            url = chat_url(contact, message)
+            started = time.monotonic()  # The chat is timed from the navigation, pause included
+            if page:
+                page.navigate(url)
+            else:
+                driver.get(url)
+            time.sleep(random.uniform(3,10))
 
         # Wait for the message box and send button
-        WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.XPATH, '//div[@contenteditable="true"][@data-tab="10"]'))
-        )
-        send_button = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.XPATH, '//span[@data-icon="send"]'))
-        )
-        send_button.click()
+        if page:
+            page.run_steps([('chat_open', COMPOSE_BOX_XPATH, None), ('send_button', SEND_ICON_XPATH, 'click')],
+                           stage_timeouts, started=started)
+        else:
+            stage_timeouts.wait(driver, 'chat_open',
+                EC.presence_of_element_located((By.XPATH, COMPOSE_BOX_XPATH)), started=started
+            )
+            send_button = stage_timeouts.wait(driver, 'send_button',
+                EC.presence_of_element_located((By.XPATH, SEND_ICON_XPATH))
+            )
+            send_button.click()
         time.sleep(random.uniform(1,5))
 
-        print(f"Message sent to {contact['MOBILE']}")
-        return True
+        log.info("Message sent to %s", contact['MOBILE'], extra=app_logging.log_fields(contact, stage='send_message'))
+        return SendResult(True)
     except TimeoutException:
-        print(f"Timeout occurred for contact: {contact['MOBILE']}")
-        return False
+        log.warning("Timeout occurred for contact: %s", contact['MOBILE'],
+                    extra=app_logging.log_fields(contact, stage='send_message'))
+        return SendResult(False, FAILURE_TIMEOUT)
     except WebDriverException as e:
-        print(f"Error sending message to {contact['MOBILE']}: {e}")
-        return False
+        log.error("Error sending message to %s: %s", contact['MOBILE'], app_logging.short_error(e), exc_info=e,
+                  extra=app_logging.log_fields(contact, stage='send_message'))
+        return SendResult(False, FAILURE_WEBDRIVER, e.msg)
 
-def send_photo(driver, contact, attachment_path):
+def send_photo(driver, contact, attachment_path, caption=None):
+    """Send one file, or a list of files in one upload, with an optional caption."""
+    attachment_paths = [attachment_path] if isinstance(attachment_path, str) else list(attachment_path)
     try:
+        page = cdp_backend.page_for(driver)
+
         # Click on the attachment button (paperclip icon)
-        attachment_button = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.XPATH, '//button[@aria-label="Attach"]'))
-        )
-        attachment_button.click()
+        if page:
+            page.run_steps([('attach_button', ATTACH_BUTTON_XPATH, 'click')], stage_timeouts)
+        else:
+            attachment_button = stage_timeouts.wait(driver, 'attach_button',
+                EC.presence_of_element_located((By.XPATH, ATTACH_BUTTON_XPATH))
+            )
+            attachment_button.click()
+        clicked = time.monotonic()
         time.sleep(random.uniform(1, 3))  # Short delay to allow dropdown menu to appear
 
-        # Locate the file input for attaching photos
-        file_input = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.XPATH, '//input[@type="file"]'))
-        )
-
-        file_input.send_keys(attachment_path)  # Upload the photo
+        # Locate the file input for attaching photos and upload the photo
+        if page:
+            page.run_steps([('file_input', FILE_INPUT_XPATH, None)], stage_timeouts, started=clicked)
+            page.set_file_input(FILE_INPUT_XPATH, attachment_paths)
+        else:
+            file_input = stage_timeouts.wait(driver, 'file_input',
+                EC.presence_of_element_located((By.XPATH, FILE_INPUT_XPATH)), started=clicked
+            )
+            file_input.send_keys("\n".join(attachment_paths))  # Several files are separated by newlines
+        uploaded = time.monotonic()
         time.sleep(random.uniform(2, 5))  # Wait for the file to be uploaded
 
-        # Click the send button
-        send_button = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.XPATH, '//span[@data-icon="send"]'))
-        )
-        send_button.click()
+        # Type the message into the preview's caption field
+        if caption:
+            caption_box = stage_timeouts.wait(driver, 'caption_box',
+                EC.presence_of_element_located((By.XPATH, CAPTION_BOX_XPATH)), started=uploaded
+            )
+            type_caption(caption_box, caption)
+            uploaded = None  # The preview was there before the caption was typed
+
+        # Click the send button once the upload preview is ready
+        if page:
+            page.run_steps([('upload_preview', SEND_ICON_XPATH, 'click')], stage_timeouts, started=uploaded)
+        else:
+            send_button = stage_timeouts.wait(driver, 'upload_preview',
+                EC.presence_of_element_located((By.XPATH, SEND_ICON_XPATH)), started=uploaded
+            )
+            send_button.click()
         time.sleep(random.uniform(1, 3))  # Short delay after sending the photo
 
-        print(f"Photo sent to {contact['MOBILE']}")
-        return True
+        log.info("Photo sent to %s%s", contact['MOBILE'], " with the message as caption" if caption else "",
+                 extra=app_logging.log_fields(contact, stage='send_photo'))
+        return SendResult(True)
     except TimeoutException:
-        print(f"Timeout occurred while sending photo to {contact['MOBILE']}")
-        return False
+        log.warning("Timeout occurred while sending photo to %s", contact['MOBILE'],
+                    extra=app_logging.log_fields(contact, stage='send_photo'))
+        return SendResult(False, FAILURE_TIMEOUT)
     except WebDriverException as e:
-        print(f"Error sending photo to {contact['MOBILE']}: {e}")
+        log.error("Error sending photo to %s: %s", contact['MOBILE'], app_logging.short_error(e), exc_info=e,
+                  extra=app_logging.log_fields(contact, stage='send_photo'))
+        return SendResult(False, FAILURE_WEBDRIVER, e.msg)
+
+def login(driver):
+    """Open WhatsApp Web and wait for the user to scan the QR code."""
+    driver.get("https://web.whatsapp.com")
+    input("Scan the QR code and press Enter to continue...")
+    time.sleep(10)  # Wait for user to log in
+
+def wait_for_login(driver, session_name, timeout=300):
+    """Open WhatsApp Web in a pooled session and wait until its profile shows the chat list."""
+    driver.get("https://web.whatsapp.com")
+    try:
+        WebDriverWait(driver, timeout).until(EC.presence_of_element_located((By.ID, 'pane-side')))
+        return True
+    except TimeoutException:
+        log.error("[%s] Not logged in. Scan the QR code in this session's browser within %s s.", session_name,
+                  timeout, extra=app_logging.log_fields(session=session_name))
         return False
 
-def main():
+def process_contact(driver, contact, message_template, attachment_paths, navigate=True, caption=False):
+    """
+    Send the personalized message and then the attachments to one contact. With caption, the
+    attachments are uploaded together with the message as their caption. Returns a SendResult.
+    """
+    started = time.monotonic()
+    message = format_message(contact, message_template)
+    remaining = attachment_paths
+    result = None
+
+    if caption and attachment_paths and not can_type(message):
+        log.info("Sending the message to %s as text: chromedriver cannot type its emoji into a caption",
+                 contact['MOBILE'], extra=app_logging.log_fields(contact, stage='send_photo'))
+    elif caption and attachment_paths:
+        # Text and files in one upload: one chat interaction and one send click instead of several
+        result = open_chat(driver, contact, navigate=navigate)
+        if result:
+            upload = send_photo(driver, contact, attachment_paths, caption=message)
+            if upload:
+                result.attachments.extend((os.path.basename(path), True) for path in attachment_paths)
+                remaining = []
+            else:
+                log.warning("Sending the message as caption failed for %s (%s%s); sending it as text",
+                            contact['MOBILE'], upload.failure_class, f": {upload.detail}" if upload.detail else '',
+                            extra=app_logging.log_fields(contact, stage='send_photo'))
+                result = None
+                navigate = True  # The chat is left in the upload preview
+
+    if result is None:
+        # Send text message first
+        result = send_message(driver, contact, message, navigate=navigate)
+
+    # Send photos with message if text message was sent successfully
+    if result and remaining:
+        for attachment_path in remaining:
+            photo_sent = send_photo(driver, contact, attachment_path)
+            result.attachments.append((os.path.basename(attachment_path), bool(photo_sent)))
+            if not photo_sent:
+                log.warning("Failed to send photo to %s", contact['MOBILE'],
+                            extra=app_logging.log_fields(contact, stage='send_photo'))
+    elif not result:
+        log.warning("Skipping photo upload for %s due to text message failure.", contact['MOBILE'],
+                    extra=app_logging.log_fields(contact, stage='send_photo'))
+    result.duration = time.monotonic() - started
+    return result
+
+def main(contacts_file=None, report_file=None, report_xlsx=None, shard='', track_receipts=False, profiler=None,
+         status_port=None, skip_missing_attachments=False, sessions_file=None, remote_url=None,
+         backend=BACKEND_WEBDRIVER, incremental_mode=False, campaign=None, prefetch=False, caption=False, transport=TRANSPORT_BROWSER, transport_url=None,
+         transport_token=None):
+    if transport == TRANSPORT_API:
+        # These drive the browser; the API transport would silently do without them
+        browser_only = [name for name, used in [('--caption', caption), ('--prefetch', prefetch),
+                                                ('--track-receipts', track_receipts), ('--sessions', sessions_file),
+                                                ('--backend cdp', backend == BACKEND_CDP),
+                                                ('--remote-url', remote_url)] if used]
+        if browser_only:
+            log.error("%s only apply to the browser transport, not to --transport api. Exiting.",
+                      ', '.join(browser_only))
+            return
+
     # File paths
     base_path = os.path.dirname(os.path.abspath(__file__))
-    excel_file = os.path.join(base_path, "contacts.xlsx")
+    excel_file = contacts_file or os.path.join(base_path, "contacts.xlsx")
     message_template_file = os.path.join(base_path, "Message.txt")
     failed_contacts_file = os.path.join(base_path, "Failed_Contacts.xlsx")
 
@@ -313,78 +534,522 @@ def main():
         os.path.join(base_path, "4 Form11Revised.pdf")
     ]
 
-    # Create backup and delete old Excel files
-    if os.path.exists(excel_file):
-        file_manager.delete_excel_file(excel_file, backup=True)
+    # A contacts file given on the command line (e.g. a shard) is sent as it is, and an
+    # incremental run keeps the sheet that HR has been appending to
+    if contacts_file is None and not incremental_mode:
+        # Create backup and delete old Excel files
+        if os.path.exists(excel_file):
+            file_manager.delete_excel_file(excel_file, backup=True)
 
-    # Create new empty Excel file with table structure
-    file_manager.create_empty_excel(excel_file, columns=['MOBILE'])
+        # Create new empty Excel file with table structure
+        file_manager.create_empty_excel(excel_file, columns=['MOBILE'])
 
-    # Create backup and delete old text files
-    if os.path.exists(message_template_file):
-        file_manager.delete_text_file(message_template_file, backup=True)
+        # Create backup and delete old text files
+        if os.path.exists(message_template_file):
+            file_manager.delete_text_file(message_template_file, backup=True)
 
-    # Create new empty text file
-    default_message = "Hello,\n\nThis is a message for {mobile}.\n\nRegards,\nHR Team"
-    file_manager.create_empty_text_file(message_template_file, content=default_message)
+        # Create new empty text file
+        default_message = "Hello,\n\nThis is a message for {mobile}.\n\nRegards,\nHR Team"
+        file_manager.create_empty_text_file(message_template_file, content=default_message)
 
-    # Delete old failed contacts file if it exists
-    if os.path.exists(failed_contacts_file):
-        file_manager.delete_excel_file(failed_contacts_file, backup=True)
-        file_manager.create_empty_excel(failed_contacts_file, columns=['MOBILE'])
+        # Delete old failed contacts file if it exists
+        if os.path.exists(failed_contacts_file):
+            file_manager.delete_excel_file(failed_contacts_file, backup=True)
+            file_manager.create_empty_excel(failed_contacts_file, columns=['MOBILE'])
 
-    # Handle PDF files - backup existing ones
-    for pdf_file in pdf_files:
-        if os.path.exists(pdf_file):
-            file_manager.handle_pdf_file(pdf_file, action="backup")
+        # Handle PDF files - backup existing ones
+        for pdf_file in pdf_files:
+            if os.path.exists(pdf_file):
+                file_manager.handle_pdf_file(pdf_file, action="backup")
 
-    print("All files have been reset. New empty files have been created.")
+        log.info("All files have been reset. New empty files have been created.")
 
-    # Set the attachment paths for sending
+    # Set the attachment paths for sending; rows with an ATTACHMENTS cell get their own files instead
     attachment_paths = [pdf_file for pdf_file in pdf_files if os.path.exists(pdf_file)]
 
-    # Load contacts (will be empty since we just created a new file)
+    # Load contacts (will be empty if we just created a new file)
     contacts = load_contacts(excel_file)
+    if profiler:
+        profiler.checkpoint("after load_contacts")
     if not contacts:
-        print("No contacts found in the newly created Excel file.")
-        print("Please add contacts to the Excel file and run the program again.")
+        log.warning("No contacts found in %s.", excel_file)
+        log.info("Please add contacts to the Excel file and run the program again.")
         return
 
     # Load message template
     message_template = load_message_template(message_template_file)
     if not message_template:
-        print("Error loading message template. Exiting.")
+        log.error("Error loading message template. Exiting.")
+        return
+
+    # Incremental mode: only rows added or changed since the last run of this campaign
+    sent_index = None
+    if incremental_mode:
+        campaign = campaign or os.path.splitext(os.path.basename(excel_file))[0]
+        sent_index = incremental.FingerprintIndex(incremental.index_path(excel_file, campaign))
+        row_diff = sent_index.diff(contacts, incremental.template_columns(message_template, contacts.columns))
+        log.info("Campaign '%s': %s new, %s changed, %s already sent", campaign, row_diff.new, row_diff.changed,
+                 row_diff.unchanged, extra=app_logging.log_fields(campaign=campaign))
+        if not row_diff.positions:
+            log.info("Nothing new to send.")
+            return
+        contacts = contacts.take(row_diff.positions)
+
+    # Check every per-contact attachment before the first message goes out
+    attachment_plan = attachments.build_attachment_plan(contacts, attachment_paths,
+                                                        base_dir=os.path.dirname(os.path.abspath(excel_file)))
+    if attachments.report_problems(attachment_plan) and not skip_missing_attachments:
+        log.error("Fix the attachment paths above or run with --skip-missing-attachments. Exiting.")
         return
 
-    # Setup browser driver
-    driver = setup_driver()
+    # Outcomes are streamed to a delivery report that sharding.py can merge across machines
+    report_writer = delivery_report.DeliveryReportWriter(report_file, shard) if report_file else None
+    if report_writer:
+        for position, mobile, missing in attachment_plan.problems:
+            report_writer.record(contacts[position],
+                                 SendResult(False, FAILURE_ATTACHMENT, f"Missing attachments: {', '.join(missing)}"))
+    tracker = receipt_tracker.ReceiptTracker(report_writer) if track_receipts else None
+    run_progress = progress.ProgressTracker(total=len(attachment_plan))
+    status_server = progress.start_status_server(run_progress, port=status_port) if status_port else None
+
+    driver = None
+    try:
+        if transport == TRANSPORT_API:
+            # The campaign name is part of every message's idempotency key
+            api_transport = transports.HttpApiTransport(
+                transport_url, token=transport_token,
+                campaign=campaign or os.path.splitext(os.path.basename(excel_file))[0])
+            try:
+                run_transport_campaign(api_transport, attachment_plan, message_template, report_writer=report_writer,
+                                       progress=run_progress, sent_index=sent_index)
+            finally:
+                api_transport.close()
+        elif sessions_file:
+            run_session_pool(session_pool.load_session_specs(sessions_file), attachment_plan, message_template,
+                             report_writer=report_writer, progress=run_progress, backend=backend,
+                             sent_index=sent_index, caption=caption)
+        else:
+            # Setup browser driver
+            driver = setup_driver(remote_url=remote_url)
+            if profiler:
+                profiler.instrument_driver(driver)
+            run_progress.set_session_state('main', 'logging in')
+            login(driver)
+            if backend == BACKEND_CDP:
+                cdp_backend.attach(driver)
+
+            run_campaign(driver, contacts, message_template, attachment_paths,
+                         report_writer=report_writer, tracker=tracker, profiler=profiler, progress=run_progress,
+                         attachment_plan=attachment_plan, sent_index=sent_index, prefetch=prefetch,
+                         caption=caption)
+    finally:
+        log.info("%s", run_progress.status_line(), extra=app_logging.log_fields(stage='progress'))
+        if status_server:
+            status_server.shutdown()
+        if sent_index:
+            sent_index.close()
+        if report_writer:
+            report_writer.close()
+            if report_xlsx:
+                delivery_report.convert_to_xlsx(report_file, report_xlsx)
+        if driver:
+            try:
+                cdp_backend.detach(driver)  # Close the DevTools WebSocket before the browser goes away
+                driver.quit()
+            except Exception as e:
+                log.error("Error during driver quit: %s", e)
+
+def run_session_pool(session_specs, attachment_plan, message_template, report_writer=None, progress=None,
+                     backend=BACKEND_WEBDRIVER, sent_index=None, caption=False):
+    """
+    Send the plan through several logged-in sessions at once (local or on Selenium Grid nodes).
+    Contacts of a session whose node is lost are picked up by the other sessions.
+    """
+    def start_session(spec):
+        if progress:
+            progress.set_session_state(spec.name, 'logging in')
+        driver = setup_driver(remote_url=spec.remote_url, profile_dir=spec.profile_dir, node=spec.node,
+                              session_name=spec.name)
+        if not wait_for_login(driver, spec.name):
+            driver.quit()
+            raise RuntimeError("session is not logged in")
+        if backend == BACKEND_CDP:
+            cdp_backend.attach(driver)
+        return driver
+
+    attempts = Counter()  # Sends per number, including those lost with a session and requeued
+    attempts_lock = threading.Lock()
+
+    def send(session_name, driver, item):
+        contact, contact_attachments = item
+        mobile = normalize_mobile(contact['MOBILE'])
+        with attempts_lock:
+            attempts[mobile] += 1
+            attempt = attempts[mobile]
+        log.info("[%s] Sending message to %s", session_name, contact['MOBILE'],
+                 extra=app_logging.log_fields(contact, stage='send', session=session_name))
+        result = process_contact(driver, contact, message_template, contact_attachments, caption=caption)
+        result.attempts = attempt
+        time.sleep(random.uniform(3, 5))  # Short delay between messages
+        return result
+
+    def on_result(session_name, item, result):
+        if result is None:
+            result = SendResult(False, FAILURE_WEBDRIVER, "Unexpected error")
+        if report_writer:
+            report_writer.record(item[0], result)
+        if sent_index and result.status == STATUS_SENT:
+            sent_index.mark_sent(item[0])
+        if progress:
+            progress.record(result, session=session_name)
+
+    pool = session_pool.SessionPool(session_specs, start_session, progress=progress,
+                                    lost_failure_classes=(FAILURE_WEBDRIVER,), stop_session=cdp_backend.detach)
+    unsent = pool.run(attachment_plan, send, on_result)
+    if unsent:
+        log.error("%s contacts were not sent because no session was left", len(unsent))
+        if report_writer:
+            for contact, _ in unsent:
+                report_writer.record(contact, SendResult(False, FAILURE_WEBDRIVER, "No session left"))
+
+def run_transport_campaign(transport, attachment_plan, message_template, report_writer=None, progress=None,
+                           sent_index=None, retries=1):
+    """
+    Send the plan through a transport other than the browser (see transports.py). Messages are
+    formatted as for the browser; contacts that failed with a transient API error are sent
+    again, up to retries times, once the rest of the plan is through.
+    """
+    def prepared(plan_items):
+        for contact, contact_attachments in plan_items:
+            yield contact, format_message(contact, message_template), contact_attachments
+
+    pending = attachment_plan
+    for attempt in range(1, retries + 2):
+        failed = []
+        if progress:
+            progress.set_session_state(transport.name, 'sending')
+        for (contact, _, contact_attachments), result in transport.send(prepared(pending)):
+            result.attempts = attempt
+            if result.failure_class == FAILURE_API and attempt <= retries:
+                failed.append((contact, contact_attachments))
+                continue
+            if not result:
+                log.warning("Failed to send to %s: %s", contact['MOBILE'], result.detail,
+                            extra=app_logging.log_fields(contact, stage='send', session=transport.name))
+            if report_writer:
+                report_writer.record(contact, result)
+            if sent_index and result.status == STATUS_SENT:
+                sent_index.mark_sent(contact)
+            if progress:
+                progress.record(result, session=transport.name)
+        if not failed:
+            break
+        log.warning("Sending %s contacts again after API errors", len(failed),
+                    extra=app_logging.log_fields(session=transport.name))
+        pending = failed
+    if progress:
+        progress.set_session_state(transport.name, 'done')
+
+def run_campaign(driver, contacts, message_template, attachment_paths, report_writer=None, tracker=None,
+                 profiler=None, progress=None, attachment_plan=None, sent_index=None, prefetch=False, caption=False):
+    """
+    Send to every contact in turn, plus re-sends queued by the receipt tracker. Contacts are
+    sent grouped by attachment set (see attachments.build_attachment_plan). With prefetch the
+    next contact's chat loads during the delay after a send (see chat_prefetch).
+    """
+    if attachment_plan is None:
+        attachment_plan = attachments.build_attachment_plan(contacts, attachment_paths)
+    resends = deque()
+    attempts = Counter()  # Sends per number, so a receipt re-send is reported as attempt 2
+    contact_iter = iter(attachment_plan)
+    total = len(attachment_plan)
+    i = 0
+
+    def next_contact():
+        if resends:
+            contact = resends.popleft()
+            return contact, attachment_plan.paths_for(contact)
+        return next(contact_iter, None)
+
+    def chat_url_for(item):
+        contact, contact_attachments = item
+        message = format_message(contact, message_template)
+        if caption and contact_attachments and can_type(message):
+            return chat_url(contact)  # The message is typed as the caption later
+        return chat_url(contact, message)
+
+    prefetcher = chat_prefetch.ChatPrefetcher(driver, stage_timeouts) if prefetch else None
+    item = next_contact()
+    preloaded = prefetcher is not None and item is not None and prefetcher.load(chat_url_for(item))
+
+    while item is not None:
+        contact, contact_attachments = item
+        i += 1
+        log.info("Sending message to (%s/%s): %s", i, total, contact['MOBILE'],
+                 extra=app_logging.log_fields(contact, stage='send', session='main'))
+        if progress:
+            progress.set_session_state('main', 'sending')
+        if profiler:
+            profiler.begin_contact()
+        result = process_contact(driver, contact, message_template, contact_attachments, navigate=not preloaded,
+                                 caption=caption)
+        mobile = normalize_mobile(contact['MOBILE'])
+        attempts[mobile] += 1
+        result.attempts = attempts[mobile]
+        if profiler:
+            profiler.end_contact()
+        if report_writer:
+            report_writer.record(contact, result)
+        if sent_index and result.status == STATUS_SENT:
+            # Only complete sends count; failed and partial contacts go out again next run
+            sent_index.mark_sent(contact)
+        if progress:
+            progress.record(result)
+            progress.set_session_state('main', 'waiting')
+
+        resume_at = time.monotonic() + random.uniform(3, 5)  # Short delay between messages
+        if tracker:
+            if result:
+                tracker.track(contact)
+            # Receipts are read at the start of the delay, so tracking costs no extra time
+            tracker.poll(driver)
+            # Give the last messages a chance to leave the pending state before quitting
+            waited = 0
+            while (i >= total and not tracker.has_resends() and tracker.has_pending()
+                   and waited < tracker.pending_timeout):
+                tracker.idle(driver, 10)
+                waited += 10
+            new_resends = tracker.take_resends()
+            resends.extend(new_resends)
+            total += len(new_resends)
+            if progress and new_resends:
+                progress.add_total(len(new_resends))
+
+        item = next_contact()
+        # The next chat loads during the rest of the delay instead of after it
+        preloaded = prefetcher is not None and item is not None and prefetcher.load(chat_url_for(item))
+        remaining = resume_at - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+
+    if prefetcher:
+        log.info("Chats pre-loaded: %s", prefetcher.counts)
+    if tracker:
+        log.info("Receipts: %s", dict(tracker.counts))
+    for stage, (samples, p99, timeout) in stage_timeouts.summary().items():
+        log.info("Wait '%s': %s samples, p99 %.1f s, timeout now %.1f s", stage, samples, p99, timeout)
+
+def run_daemon(config_file=None, poll_interval=30, keepalive_interval=600, api_port=None, api_token=None,
+               report_file=None, profiler=None, status_port=None, remote_url=None, backend=BACKEND_WEBDRIVER,
+               caption=False):
+    """
+    Keep one logged-in session open and work through the campaigns in config_file and,
+    when api_port is given, the jobs submitted through the local job API.
+    """
+    campaign_scheduler = scheduler.CampaignScheduler()
+    # Relative ATTACHMENTS paths of campaigns and jobs are resolved against the config file's folder
+    base_dir = os.path.dirname(os.path.abspath(config_file)) if config_file else None
+    job_registry = job_api.JobRegistry(campaign_scheduler, base_dir=base_dir)
+    report_writer = delivery_report.DeliveryReportWriter(report_file) if report_file else None
+    run_progress = progress.ProgressTracker()
+    attachment_resolvers = {}
+    config_mtime = None
+    last_activity = time.time()
+
+    def reload_campaigns():
+        nonlocal config_mtime
+        if not config_file:
+            return
+        # Pick up campaigns added to the config file while the daemon is running
+        try:
+            mtime = os.path.getmtime(config_file)
+        except OSError as e:
+            log.error("Error reading campaign config: %s", e)
+            return
+        if mtime == config_mtime:
+            return
+        config_mtime = mtime
+        campaigns = scheduler.load_campaigns(config_file, load_contacts, load_message_template,
+                                             skip_names=campaign_scheduler.campaigns)
+        for campaign in campaigns:
+            campaign_scheduler.add_campaign(campaign)
+
+    def contact_attachments(campaign, contact):
+        # Per-contact ATTACHMENTS cells are resolved once per distinct cell and campaign
+        resolver = attachment_resolvers.get(campaign.name)
+        if resolver is None:
+            resolver = attachment_resolvers[campaign.name] = attachments.AttachmentResolver(
+                campaign.attachment_paths or (), base_dir=base_dir)
+        return resolver.resolve_contact(contact)
+
+    def send_contact(campaign, contact):
+        log.info("[%s] Sending message to (%s/%s): %s", campaign.name, campaign.position, len(campaign.contacts),
+                 contact['MOBILE'], extra=app_logging.log_fields(contact, stage='send', session='main',
+                                                                 campaign=campaign.name))
+        # Campaigns and jobs are added while the daemon runs, so the total follows the scheduler
+        run_progress.set_total(campaign_scheduler.total_contacts())
+        run_progress.set_session_state('main', 'sending')
+        paths, missing = contact_attachments(campaign, contact)
+        if missing:
+            log.error("Missing attachments for %s: %s", contact['MOBILE'], ', '.join(missing),
+                      extra=app_logging.log_fields(contact, stage='attachments', campaign=campaign.name))
+            result = SendResult(False, FAILURE_ATTACHMENT, f"Missing attachments: {', '.join(missing)}")
+        else:
+            if profiler:
+                profiler.begin_contact()
+            try:
+                result = process_contact(driver, contact, campaign.message_template, paths, caption=caption)
+            except (KeyError, IndexError, ValueError) as e:
+                # A placeholder this contact has no column for, or a stray brace in the template
+                log.error("Template error for %s: %s", contact['MOBILE'], e,
+                          extra=app_logging.log_fields(contact, stage='format', campaign=campaign.name))
+                result = SendResult(False, FAILURE_TEMPLATE, f"Template error: {type(e).__name__}: {e}")
+            finally:
+                if profiler:
+                    profiler.end_contact()
+        record_result(campaign, contact, result)
+        time.sleep(random.uniform(3, 5))  # Short delay between messages
+        return result
+
+    def record_result(campaign, contact, result):
+        nonlocal last_activity
+        job_registry.record_result(campaign.name, contact, result)
+        if report_writer:
+            report_writer.record(contact, result, campaign=campaign.name)
+        run_progress.record(result)
+        run_progress.set_session_state('main', 'waiting')
+        last_activity = time.time()
+
+    def on_send_error(campaign, contact, error):
+        record_result(campaign, contact, SendResult(False, FAILURE_WEBDRIVER, app_logging.short_error(error)))
+
+    def on_idle():
+        nonlocal last_activity
+        run_progress.set_session_state('main', 'idle')
+        reload_campaigns()
+        # Reload WhatsApp Web now and then so the session stays warm between campaigns
+        if time.time() - last_activity > keepalive_interval:
+            try:
+                driver.get("https://web.whatsapp.com")
+            except WebDriverException as e:
+                log.error("Error refreshing WhatsApp Web: %s", app_logging.short_error(e), exc_info=e)
+            last_activity = time.time()
+
+    reload_campaigns()
+
+    # Setup browser driver once for the whole day
+    driver = setup_driver(remote_url=remote_url)
+    if profiler:
+        profiler.instrument_driver(driver)
+    job_server = None
+    status_server = None
     try:
-        driver.get("https://web.whatsapp.com")
-        input("Scan the QR code and press Enter to continue...")
-        time.sleep(10)  # Wait for user to log in
-
-        for i, contact in enumerate(contacts, start=1):
-            print(f"Sending message to ({i}/{len(contacts)}): {contact['MOBILE']}")
-            message = format_message(contact, message_template)
-
-            # Send text message first
-            message_sent = send_message(driver, contact, message)
-
-            # Send photos with message if text message was sent successfully
-            if message_sent and attachment_paths:
-                for attachment_path in attachment_paths:
-                    photo_sent = send_photo(driver, contact, attachment_path)
-                    if not photo_sent:
-                        print(f"Failed to send photo to {contact['MOBILE']}")
-            elif not message_sent:
-                print(f"Skipping photo upload for {contact['MOBILE']} due to text message failure.")
-
-            time.sleep(random.uniform(3, 5))  # Short delay between messages
+        run_progress.set_session_state('main', 'logging in')
+        login(driver)
+        if backend == BACKEND_CDP:
+            cdp_backend.attach(driver)
+        if api_port:
+            job_server = job_api.start_job_server(job_registry, port=api_port, token=api_token)
+        if status_port:
+            status_server = progress.start_status_server(run_progress, port=status_port)
+        campaign_scheduler.run(send_contact, on_idle=on_idle, poll_interval=poll_interval, on_error=on_send_error)
+    except KeyboardInterrupt:
+        log.info("Daemon stopped.")
     finally:
+        if job_server:
+            job_server.shutdown()
+        if status_server:
+            status_server.shutdown()
+        if report_writer:
+            report_writer.close()
         try:
+            cdp_backend.detach(driver)  # Close the DevTools WebSocket before the browser goes away
             driver.quit()
         except Exception as e:
-            print(f"Error during driver quit: {e}")
+            log.error("Error during driver quit: %s", e)
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Send WhatsApp messages and attachments to a list of contacts.")
+    parser.add_argument('--daemon', metavar='CAMPAIGNS_JSON',
+                        help="Run as a long-lived daemon sending the campaigns described in this JSON file.")
+    parser.add_argument('--api-port', type=int,
+                        help="Run as a daemon and accept jobs on this local port (POST /jobs).")
+    parser.add_argument('--api-token',
+                        help="Require 'Authorization: Bearer <token>' on job API requests.")
+    parser.add_argument('--contacts',
+                        help="Send to this contacts file as it is instead of resetting contacts.xlsx (e.g. a shard).")
+    parser.add_argument('--report',
+                        help="Stream one row per contact to this delivery report (.csv or .jsonl).")
+    parser.add_argument('--report-xlsx',
+                        help="Convert the delivery report to this Excel file when the run ends.")
+    parser.add_argument('--shard', default='',
+                        help="Shard label written to the delivery report.")
+    parser.add_argument('--track-receipts', action='store_true',
+                        help="Follow delivered/read ticks between sends and re-send messages stuck pending.")
+    parser.add_argument('--profile', nargs='?', const=profiling.MODE_CPROFILE,
+                        choices=[profiling.MODE_CPROFILE, profiling.MODE_SAMPLE],
+                        help="Profile the run (cProfile by default, or 'sample') and write a report next to main.py.")
+    parser.add_argument('--profile-memory-every', type=int, default=500,
+                        help="Take a tracemalloc checkpoint every N contacts when profiling.")
+    parser.add_argument('--status-port', type=int,
+                        help="Serve live progress on this local port (GET /status as JSON, GET /metrics for Prometheus).")
+    parser.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                        help="Lowest level to log (DEBUG also prints WebDriver stack traces on the console).")
+    parser.add_argument('--log-file',
+                        help="Also write JSON log records to this file (rotated at 10 MB, 5 files kept).")
+    parser.add_argument('--log-json', action='store_true',
+                        help="Print JSON log records on the console instead of plain messages.")
+    parser.add_argument('--skip-missing-attachments', action='store_true',
+                        help="Send to the other contacts when some ATTACHMENTS files are missing (default: stop).")
+    parser.add_argument('--sessions', metavar='SESSIONS_JSON',
+                        help="Send through several sessions at once (local or Selenium Grid nodes) listed in this file.")
+    parser.add_argument('--remote-url',
+                        help="Start the browser on this remote WebDriver endpoint (Selenium Grid or standalone-chrome).")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Send only to rows added or changed since the last run of this campaign.")
+    parser.add_argument('--campaign',
+                        help="Campaign name of the incremental index (default: the contacts file name).")
+    parser.add_argument('--prefetch', action='store_true',
+                        help="Load the next contact's chat during the delay after each send.")
+    parser.add_argument('--caption', action='store_true',
+                        help="Upload the attachments together, with the message as caption, instead of sending them separately.")
+    parser.add_argument('--backend', default=BACKEND_WEBDRIVER, choices=[BACKEND_WEBDRIVER, BACKEND_CDP],
+                        help="Drive the page through WebDriver calls or directly over the DevTools protocol (cdp).")
+    parser.add_argument('--transport', default=TRANSPORT_BROWSER, choices=[TRANSPORT_BROWSER, TRANSPORT_API],
+                        help="Send through WhatsApp Web in the browser or through the batched HTTP messaging API.")
+    parser.add_argument('--transport-url', default='http://127.0.0.1:8780',
+                        help="Base URL of the messaging API (default: the local mock_api_server.py).")
+    parser.add_argument('--transport-token',
+                        help=f"Bearer token of the messaging API (default: the {transports.TOKEN_ENV} environment variable).")
+    args = parser.parse_args()
+    if (args.daemon or args.api_port) and args.transport != TRANSPORT_BROWSER:
+        parser.error("the daemon sends through the browser; --transport api is only for a single campaign run")
+    if args.sessions:
+        # The session pool sends from several threads with a driver each; these need the single driver
+        single_driver_only = [option for option, used in [('--track-receipts', args.track_receipts),
+                                                          ('--profile', args.profile), ('--prefetch', args.prefetch),
+                                                          ('--remote-url', args.remote_url)] if used]
+        if single_driver_only:
+            parser.error(f"{', '.join(single_driver_only)} cannot be used with --sessions")
+    app_logging.configure_logging(args.log_level, log_file=args.log_file, json_console=args.log_json, session='main')
+
+    run_profiler = None
+    if args.profile:
+        run_profiler = profiling.RunProfiler(os.path.dirname(os.path.abspath(__file__)), mode=args.profile,
+                                             memory_every=args.profile_memory_every)
+        run_profiler.start()
+    try:
+        if args.daemon or args.api_port:
+            run_daemon(args.daemon, api_port=args.api_port, api_token=args.api_token, report_file=args.report,
+                       profiler=run_profiler, status_port=args.status_port, remote_url=args.remote_url,
+                       backend=args.backend, caption=args.caption)
+        else:
+            main(contacts_file=args.contacts, report_file=args.report, report_xlsx=args.report_xlsx, shard=args.shard,
+                 track_receipts=args.track_receipts, profiler=run_profiler, status_port=args.status_port,
+                 skip_missing_attachments=args.skip_missing_attachments, sessions_file=args.sessions,
+                 remote_url=args.remote_url, backend=args.backend, incremental_mode=args.incremental,
+                 campaign=args.campaign, prefetch=args.prefetch, caption=args.caption,
+                 transport=args.transport, transport_url=args.transport_url, transport_token=args.transport_token)
+    finally:
+        if run_profiler:
+            run_profiler.stop()
@@ -0,0 +1,120 @@
+"""
+Adaptive Wait Module for WhatsApp Sender Application
+
+This module replaces the fixed WebDriverWait timeouts (10 s, 20 s, ...) with timeouts learned
+from the run itself. For every stage of a send (chat open, compose box, upload preview, send
+confirmation, ...) it keeps a rolling window of how long the wait actually took and sets the
+timeout to a multiple of the recent 99th percentile, bounded by a floor and a ceiling.
+
+A stage is timed from the action that starts it (the navigation, click or upload) when the
+caller passes that moment as started, so fixed pauses between the action and the wait are part
+of the measured time and of the timeout, instead of hiding the real latency.
+
+On a healthy connection the timeouts shrink, so real failures are detected quickly. Only
+successful waits are sampled, so a few invalid numbers do not inflate the estimate; instead every
+timeout of a stage doubles its next timeout (up to the ceiling), and each later wait that is no
+slower than the recent 99th percentile halves it again. When the network slows down the
+timeouts widen within a few contacts and come back down over several fast waits, not at the
+first one.
+"""
+
+import time
+import threading
+from collections import deque
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import TimeoutException
+
+
+class StageTimeouts:
+    """
+    Rolling per-stage timeout estimates.
+
+    defaults: timeout per stage until min_samples observations are collected (the old fixed
+    values); unknown stages use default_timeout.
+    """
+
+    def __init__(self, defaults=None, default_timeout=10.0, multiplier=3.0, floor=2.0, ceiling=60.0,
+                 window=200, min_samples=20):
+        self.defaults = defaults or {}
+        self.default_timeout = default_timeout
+        self.multiplier = multiplier
+        self.floor = floor
+        self.ceiling = ceiling
+        self.window = window
+        self.min_samples = min_samples
+        self._samples = {}
+        self._backoff = {}  # Doublings of the timeout still owed to recent timeouts
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            samples = self._samples.get(stage)
+            if samples is None:
+                samples = self._samples[stage] = deque(maxlen=self.window)
+            backoff = self._backoff.get(stage, 0)
+            if backoff and (len(samples) < self.min_samples or seconds <= _percentile(samples, 0.99)):
+                self._backoff[stage] = backoff - 1  # One fast wait undoes one doubling
+            samples.append(seconds)
+
+    def record_timeout(self, stage):
+        with self._lock:
+            self._backoff[stage] = min(self._backoff.get(stage, 0) + 1, 6)
+
+    def percentile(self, stage, fraction=0.99):
+        with self._lock:
+            return _percentile(self._samples.get(stage, ()), fraction)
+
+    def timeout(self, stage):
+        """Return the timeout to use for the next wait of this stage."""
+        with self._lock:
+            count = len(self._samples.get(stage, ()))
+            backoff = 2 ** self._backoff.get(stage, 0)
+        if count < self.min_samples:
+            timeout = self.defaults.get(stage, self.default_timeout)
+        else:
+            timeout = max(self.floor, self.percentile(stage) * self.multiplier)
+        return min(self.ceiling, timeout * backoff)
+
+    def remaining(self, stage, started=None):
+        """
+        Seconds left to wait for a stage whose action happened at started (time.monotonic()).
+        Until the stage has min_samples observations its default is counted from now, as the
+        old fixed timeouts were.
+        """
+        timeout = self.timeout(stage)
+        if started is None:
+            return timeout
+        with self._lock:
+            learned = len(self._samples.get(stage, ())) >= self.min_samples
+        if not learned:
+            return timeout
+        return max(0.0, timeout - (time.monotonic() - started))
+
+    def wait(self, driver, stage, condition, started=None):
+        """
+        WebDriverWait(driver, <learned timeout>).until(condition), recording how long the stage
+        took since started (the action that began it; now if not given).
+        """
+        timeout = self.remaining(stage, started)
+        started = time.monotonic() if started is None else started
+        try:
+            value = WebDriverWait(driver, timeout).until(condition)
+        except TimeoutException:
+            self.record_timeout(stage)
+            raise
+        self.record(stage, time.monotonic() - started)
+        return value
+
+    def summary(self):
+        """Return {stage: (samples, p99, current timeout)} for logging."""
+        with self._lock:
+            stages = list(self._samples)
+        return {stage: (len(self._samples[stage]), self.percentile(stage), self.timeout(stage))
+                for stage in stages}
+
+
+def _percentile(samples, fraction):
+    samples = sorted(samples)
+    if not samples:
+        return None
+    return samples[min(len(samples) - 1, int(fraction * len(samples)))]
@@ -0,0 +1,145 @@
+"""
+Logging Module for WhatsApp Sender Application
+
+This module sets up the logging used by the sender scripts and the helper modules in place of
+print(). Records are put on a queue by the sending thread and formatted and written by a
+background listener thread, so a verbose log does not slow sending down.
+
+- The console shows the plain messages the scripts used to print, at the chosen level.
+- An optional log file gets one JSON object per record with the time, level, message and the
+  contact, stage, session and campaign fields, plus the full exception. The file is rotated
+  by size.
+
+    log = app_logging.get_logger('main')
+    log.info("Sending message to %s", mobile, extra=app_logging.log_fields(contact, stage='send_message'))
+"""
+
+import sys
+import json
+import queue
+import atexit
+import logging
+import datetime
+import logging.handlers
+
+LOGGER_NAME = 'whatsapp_sender'
+RECORD_FIELDS = ('contact', 'stage', 'session', 'campaign')
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 5
+
+_listener = None
+
+
+def get_logger(name):
+    """Return the logger for one part of the application, e.g. get_logger('file_manager')."""
+    return logging.getLogger(f"{LOGGER_NAME}.{name}")
+
+
+def log_fields(contact=None, stage=None, session=None, campaign=None):
+    """Build the extra= fields of a record. contact may be a contact row or a mobile number."""
+    fields = {}
+    if contact is not None:
+        fields['contact'] = contact['MOBILE'] if hasattr(contact, 'keys') else contact
+    if stage is not None:
+        fields['stage'] = stage
+    if session is not None:
+        fields['session'] = session
+    if campaign is not None:
+        fields['campaign'] = campaign
+    return fields
+
+
+def short_error(error):
+    """First line of an exception message; WebDriverException text carries a whole stack trace."""
+    text = str(error).strip()
+    return text.splitlines()[0] if text else type(error).__name__
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record."""
+
+    def __init__(self, session=None):
+        super().__init__()
+        self.session = session
+
+    def format(self, record):
+        entry = {
+            'time': datetime.datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for field in RECORD_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = str(value)
+        if 'session' not in entry and self.session:
+            entry['session'] = self.session
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class ConsoleFormatter(logging.Formatter):
+    """Plain messages as the scripts used to print them; tracebacks only at DEBUG level."""
+
+    def __init__(self, show_tracebacks=False):
+        super().__init__('%(message)s')
+        self.show_tracebacks = show_tracebacks
+
+    def formatException(self, exc_info):
+        return super().formatException(exc_info) if self.show_tracebacks else ''
+
+    def format(self, record):
+        return super().format(record).rstrip()
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves all formatting to the listener thread."""
+
+    def prepare(self, record):
+        # The stock prepare() formats the message on the calling thread. Log arguments here are
+        # numbers and strings, so the record can be handed over as it is.
+        return record
+
+
+def configure_logging(level='INFO', log_file=None, json_console=False, max_bytes=DEFAULT_MAX_BYTES,
+                      backup_count=DEFAULT_BACKUP_COUNT, session=None, console=True):
+    """
+    Route all application logging through a queue to the console (unless console is False) and,
+    optionally, a rotating JSON log file. Safe to call more than once; the last configuration wins.
+    """
+    global _listener
+    level = logging.getLevelName(level.upper()) if isinstance(level, str) else level
+    if _listener:
+        _listener.stop()
+
+    handlers = []
+    if console:
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(JsonFormatter(session) if json_console else ConsoleFormatter(level <= logging.DEBUG))
+        handlers.append(console_handler)
+    if log_file:
+        file_handler = logging.handlers.RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count,
+                                                            encoding='utf-8')
+        file_handler.setFormatter(JsonFormatter(session))
+        handlers.append(file_handler)
+
+    log_queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=False)
+    _listener.start()
+
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.handlers[:] = [DeferredQueueHandler(log_queue)]
+    logger.setLevel(level)
+    logger.propagate = False
+    atexit.register(stop_logging)
+    return _listener
+
+
+def stop_logging():
+    """Write out queued records and stop the listener thread."""
+    global _listener
+    if _listener:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,164 @@
+"""
+Attachments Module for WhatsApp Sender Application
+
+This module adds per-contact attachments. The contacts sheet may have an ATTACHMENTS column
+with one or more file paths or glob patterns per row, separated by ';', '|' or line breaks:
+
+    MOBILE        NAME   ATTACHMENTS
+    919999999999  Ravi   payslips/ravi_*.pdf; forms/UAN_Form.pdf
+    918888888888  Asha
+
+Relative paths are resolved against the folder of the contacts file. Rows with an empty cell
+get the default attachments of the script.
+
+build_attachment_plan() resolves every distinct cell once, checks that all files exist before
+the first message is sent, and groups the contacts by their resolved attachment set. The send
+loop then works through one group after the other, and the globbing and file checks of a set
+are done once per distinct set instead of once per contact.
+"""
+
+import os
+import re
+import glob
+import math
+from array import array
+
+import app_logging
+
+log = app_logging.get_logger('attachments')
+
+ATTACHMENTS_COLUMN = 'ATTACHMENTS'
+NO_GROUP = 0xFFFFFFFF  # Group id of contacts left out of the plan because of missing files
+
+_SEPARATORS = re.compile(r'[;|\r\n]+')
+
+
+def split_attachment_cell(value):
+    """Return the paths or glob patterns in one ATTACHMENTS cell."""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return []
+    return [pattern.strip().strip('"') for pattern in _SEPARATORS.split(str(value)) if pattern.strip()]
+
+
+def resolve_patterns(patterns, base_dir=None):
+    """
+    Resolve paths and glob patterns to absolute file paths.
+    Returns (paths, missing) where missing lists the patterns that matched no readable file.
+    """
+    paths, missing = [], []
+    for pattern in patterns:
+        expanded = os.path.expandvars(os.path.expanduser(pattern))
+        if base_dir and not os.path.isabs(expanded):
+            expanded = os.path.join(base_dir, expanded)
+        if glob.has_magic(expanded):
+            matches = sorted(path for path in glob.glob(expanded) if os.path.isfile(path))
+        else:
+            matches = [expanded] if os.path.isfile(expanded) else []
+        matches = [os.path.abspath(path) for path in matches if os.access(path, os.R_OK)]
+        if not matches:
+            missing.append(pattern)
+        for path in matches:
+            if path not in paths:
+                paths.append(path)
+    return paths, missing
+
+
+class AttachmentResolver:
+    """Resolves ATTACHMENTS cells, caching the result per distinct cell text."""
+
+    def __init__(self, default_paths=(), base_dir=None, column=ATTACHMENTS_COLUMN):
+        self.default_paths = tuple(default_paths)
+        self.base_dir = base_dir
+        self.column = column
+        self._cache = {}
+
+    def resolve_contact(self, contact):
+        """Return (paths, missing) for one contact."""
+        patterns = split_attachment_cell(contact.get(self.column))
+        if not patterns:
+            return self.default_paths, []
+        key = '\n'.join(patterns)
+        resolved = self._cache.get(key)
+        if resolved is None:
+            paths, missing = resolve_patterns(patterns, self.base_dir)
+            resolved = self._cache[key] = (tuple(paths), missing)
+        return resolved
+
+
+class AttachmentGroup:
+    """Contacts (by position) sharing one resolved attachment set."""
+
+    __slots__ = ('paths', 'indices')
+
+    def __init__(self, paths, indices):
+        self.paths = paths
+        self.indices = indices
+
+
+class AttachmentPlan:
+    """
+    Send order of a contact list grouped by attachment set. Iterating yields (contact, paths);
+    contacts listed in problems (missing files) are not part of the plan.
+    """
+
+    def __init__(self, contacts, groups, group_ids, problems):
+        self.contacts = contacts
+        self.groups = groups
+        self.problems = problems
+        self._group_ids = group_ids
+
+    def __len__(self):
+        return sum(len(group.indices) for group in self.groups)
+
+    def __iter__(self):
+        for group in self.groups:
+            for index in group.indices:
+                yield self.contacts[index], group.paths
+
+    def paths_for(self, contact, position=None):
+        """Attachment set of a planned contact (by ContactRow index or list position)."""
+        index = getattr(contact, 'index', position)
+        group_id = self._group_ids[index] if self._group_ids is not None else 0
+        return self.groups[group_id].paths if group_id != NO_GROUP else ()
+
+
+def build_attachment_plan(contacts, default_paths=(), base_dir=None, column=ATTACHMENTS_COLUMN):
+    """Validate the attachments of all contacts and group the contacts by attachment set."""
+    default_paths = tuple(default_paths)
+    first = contacts[0] if len(contacts) else None
+    if first is None or column not in first:
+        # No per-contact attachments: one group in the original order, no index arrays needed
+        return AttachmentPlan(contacts, [AttachmentGroup(default_paths, range(len(contacts)))], None, [])
+
+    resolver = AttachmentResolver(default_paths, base_dir, column)
+    group_by_paths = {}
+    groups = []
+    group_ids = array('I', bytes(4 * len(contacts)))
+    problems = []
+    for position in range(len(contacts)):
+        contact = contacts[position]
+        paths, missing = resolver.resolve_contact(contact)
+        if missing:
+            problems.append((position, contact['MOBILE'], missing))
+            group_ids[position] = NO_GROUP
+            continue
+        group_id = group_by_paths.get(paths)
+        if group_id is None:
+            group_id = group_by_paths[paths] = len(groups)
+            groups.append(AttachmentGroup(paths, array('I')))
+        groups[group_id].indices.append(position)
+        group_ids[position] = group_id
+
+    log.info("%s contacts in %s attachment groups (%s distinct cells resolved)",
+             len(contacts) - len(problems), len(groups), len(resolver._cache))
+    return AttachmentPlan(contacts, groups, group_ids, problems)
+
+
+def report_problems(plan, limit=50):
+    """Log the contacts whose attachments are missing. Returns True if there were any."""
+    for position, mobile, missing in plan.problems[:limit]:
+        log.error("Missing attachments for %s (contact #%s): %s", mobile, position + 1, ', '.join(missing),
+                  extra=app_logging.log_fields(mobile, stage='attachments'))
+    if len(plan.problems) > limit:
+        log.error("... and %s more contacts with missing attachments", len(plan.problems) - limit)
+    return bool(plan.problems)
@@ -0,0 +1,215 @@
+"""
+CDP Backend Module for WhatsApp Sender Application
+
+With the WebDriver backend every wait poll, find_element, click and send_keys is a separate
+HTTP round trip through chromedriver, and one message costs dozens of them. This module talks
+to Chrome directly over the Chrome DevTools Protocol (CDP) on one persistent WebSocket:
+
+- the waits and clicks of a step sequence run as one Runtime.evaluate call, waiting on DOM
+  mutations (MutationObserver) instead of polling
+- file inputs are filled with DOM.setFileInputFiles
+- navigation uses Page.navigate
+
+A message then takes three round trips and a photo three more. The send functions use the
+CDP page when one is attached to the driver (attach()) and fall back to WebDriver calls
+otherwise, or when the CDP connection is lost.
+
+The WebSocket connects to the browser endpoint (debuggerAddress of a local Chrome, or se:cdp
+of a Selenium Grid session) and attaches to the driver's tab, so the same code works for both.
+"""
+
+import json
+import time
+import threading
+import itertools
+import urllib.request
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from websockets.sync.client import connect
+from websockets.exceptions import ConnectionClosed
+
+import app_logging
+
+log = app_logging.get_logger('cdp_backend')
+
+# Waits for each step's XPath with a MutationObserver and performs its action, all in the page.
+# Resolves to {ok, timings} or {ok: false, stage, timings} when a step runs into its timeout.
+STEPS_SCRIPT = """
+(async (steps) => {
+  const find = (xpath) => document.evaluate(xpath, document, null,
+      XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+  const waitFor = (xpath, timeoutMs) => new Promise((resolve) => {
+    const found = find(xpath);
+    if (found) { resolve(found); return; }
+    const observer = new MutationObserver(() => {
+      const element = find(xpath);
+      if (element) { observer.disconnect(); clearTimeout(timer); resolve(element); }
+    });
+    observer.observe(document, {childList: true, subtree: true, attributes: true});
+    const timer = setTimeout(() => { observer.disconnect(); resolve(null); }, timeoutMs);
+  });
+  const timings = {};
+  for (const [stage, xpath, action, timeoutMs] of steps) {
+    const started = performance.now();
+    const element = await waitFor(xpath, timeoutMs);
+    timings[stage] = (performance.now() - started) / 1000;
+    if (!element) { return {ok: false, stage: stage, timings: timings}; }
+    if (action === 'click') { element.click(); }
+  }
+  return {ok: true, timings: timings};
+})
+"""
+
+FIND_SCRIPT = """document.evaluate(%s, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue"""
+
+
+class CDPError(WebDriverException):
+    """A CDP command failed or the connection was lost. Handled like any WebDriver error."""
+
+
+class CDPConnection:
+    """One WebSocket to the browser, with a flat CDP session attached to one tab."""
+
+    def __init__(self, browser_ws_url, target_id, timeout=30):
+        self.timeout = timeout
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._socket = connect(browser_ws_url, max_size=None, open_timeout=timeout)
+        self.closed = False
+        self.session_id = None
+        self.session_id = self.send('Target.attachToTarget', {'targetId': target_id, 'flatten': True})['sessionId']
+
+    def send(self, method, params=None, timeout=None):
+        """Send one command on the tab's session and return its result."""
+        message = {'id': next(self._ids), 'method': method, 'params': params or {}}
+        if self.session_id:
+            message['sessionId'] = self.session_id
+        deadline = time.monotonic() + (timeout or self.timeout)
+        with self._lock:
+            try:
+                self._socket.send(json.dumps(message))
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError
+                    reply = json.loads(self._socket.recv(timeout=remaining))
+                    if reply.get('id') == message['id']:
+                        break
+                    # Everything else is an event; the backend does not subscribe to any
+            except TimeoutError:
+                # A late reply is skipped by its id on the next command
+                raise TimeoutException(f"CDP command {method} timed out")
+            except (ConnectionClosed, OSError) as e:
+                self.closed = True
+                raise CDPError(f"CDP connection lost: {e}")
+        if 'error' in reply:
+            raise CDPError(f"{method}: {reply['error'].get('message')}")
+        return reply.get('result', {})
+
+    def close(self):
+        self.closed = True
+        try:
+            self._socket.close()
+        except Exception:
+            pass
+
+
+class CDPPage:
+    """Page operations for the send functions, each one or a few CDP round trips."""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    @property
+    def usable(self):
+        return not self.connection.closed
+
+    def navigate(self, url):
+        result = self.connection.send('Page.navigate', {'url': url})
+        if result.get('errorText'):
+            raise CDPError(f"Navigation failed: {result['errorText']}")
+
+    def evaluate(self, expression, timeout=None, by_value=True):
+        params = {'expression': expression, 'awaitPromise': True, 'returnByValue': by_value}
+        try:
+            result = self.connection.send('Runtime.evaluate', params, timeout=timeout)
+        except CDPError as e:
+            # A navigation may still be replacing the document; evaluate again in the new one
+            if self.connection.closed or 'context' not in str(e).lower():
+                raise
+            time.sleep(0.5)
+            result = self.connection.send('Runtime.evaluate', params, timeout=timeout)
+        details = result.get('exceptionDetails')
+        if details:
+            raise CDPError(f"Script error: {details.get('exception', {}).get('description') or details.get('text')}")
+        return result['result'].get('value') if by_value else result['result']
+
+    def run_steps(self, steps, stage_timeouts, started=None):
+        """
+        Run (stage, xpath, action) steps in one evaluation. Waits use the learned stage timeouts
+        and their timings are fed back; a step that times out raises TimeoutException. started
+        is when the action that began the first step happened (see StageTimeouts.remaining).
+        """
+        payload = [[stage, xpath, action, int(stage_timeouts.remaining(stage, started if number == 0 else None) * 1000)]
+                   for number, (stage, xpath, action) in enumerate(steps)]
+        total_timeout = sum(step[3] for step in payload) / 1000 + self.connection.timeout
+        before = time.monotonic() - started if started is not None else 0.0
+        outcome = self.evaluate(f"{STEPS_SCRIPT}({json.dumps(payload)})", timeout=total_timeout)
+        for stage, seconds in outcome['timings'].items():
+            if stage == steps[0][0]:
+                seconds += before  # The pause between the action and this call is part of the stage
+            if outcome['ok'] or stage != outcome['stage']:
+                stage_timeouts.record(stage, seconds)
+        if not outcome['ok']:
+            stage_timeouts.record_timeout(outcome['stage'])
+            raise TimeoutException(f"Timed out waiting for {outcome['stage']}")
+
+    def set_file_input(self, xpath, paths):
+        """Put files on the file input matching xpath."""
+        element = self.evaluate(FIND_SCRIPT % json.dumps(xpath), by_value=False)
+        if 'objectId' not in element:
+            raise CDPError(f"File input not found: {xpath}")
+        self.connection.send('DOM.setFileInputFiles', {'files': list(paths), 'objectId': element['objectId']})
+
+
+def _browser_ws_url(driver):
+    capabilities = driver.capabilities
+    if capabilities.get('se:cdp'):
+        return capabilities['se:cdp']  # Selenium Grid proxies the browser endpoint
+    debugger_address = capabilities.get('goog:chromeOptions', {}).get('debuggerAddress')
+    if not debugger_address:
+        raise CDPError("The browser does not expose a DevTools address")
+    with urllib.request.urlopen(f"http://{debugger_address}/json/version", timeout=10) as response:
+        return json.load(response)['webSocketDebuggerUrl']
+
+
+def attach(driver, timeout=30):
+    """
+    Connect a CDPPage to the driver's current tab and keep it on the driver. Returns the page,
+    or None (the send functions then keep using WebDriver) if CDP is not reachable.
+    """
+    try:
+        # chromedriver window handles are the CDP target ids of the tabs
+        target_id = driver.current_window_handle.replace('CDwindow-', '')
+        page = CDPPage(CDPConnection(_browser_ws_url(driver), target_id, timeout))
+    except Exception as e:
+        log.warning("CDP backend not available, using WebDriver: %s", app_logging.short_error(e))
+        return None
+    driver._cdp_page = page
+    log.info("CDP backend attached to tab %s", target_id)
+    return page
+
+
+def page_for(driver):
+    """The attached CDPPage of a driver, or None to use WebDriver calls."""
+    page = getattr(driver, '_cdp_page', None)
+    if page is not None and not page.usable:
+        log.warning("CDP connection lost, falling back to WebDriver")
+        driver._cdp_page = page = None
+    return page
+
+
+def detach(driver):
+    page = getattr(driver, '_cdp_page', None)
+    if page is not None:
+        page.connection.close()
+        driver._cdp_page = None
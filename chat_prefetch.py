@@ -0,0 +1,63 @@
+"""
+Chat Prefetch Module for WhatsApp Sender Application
+
+This module hides chat-load latency behind the pause between contacts. Normally the next
+contact's chat only starts loading after the 3-5 second delay that follows a send, and the
+send then waits for the page on top of that. The ChatPrefetcher starts loading the next chat
+as soon as the previous message has left, so the page loads during the delay.
+
+Everything happens in the one tab of the session. WhatsApp Web keeps a single tab of a login
+active: when one tab takes over ("Use here"), every other tab is replaced by the takeover
+screen, so chats cannot be pre-loaded in extra tabs.
+
+Leaving a chat while its last message still shows the clock icon can lose that message, so a
+load only starts once no outgoing message is pending. If one stays pending, nothing is
+pre-loaded and the next contact opens its chat the usual way.
+
+Loads are started without waiting for them: by assigning window.location (one script call),
+or with Page.navigate when the CDP backend is attached.
+"""
+
+from selenium.webdriver.common.by import By
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+import cdp_backend
+import app_logging
+
+log = app_logging.get_logger('chat_prefetch')
+
+PENDING_XPATH = '//div[@id="main"]//span[@data-icon="msg-time"]'
+LOAD_SCRIPT = "window.location.href = arguments[0];"
+
+
+class ChatPrefetcher:
+    """Starts loading the next contact's chat in the current tab while the send loop pauses."""
+
+    def __init__(self, driver, stage_timeouts, pending_xpath=PENDING_XPATH):
+        self.driver = driver
+        self.stage_timeouts = stage_timeouts
+        self.pending_xpath = pending_xpath
+        self.counts = {'preloaded': 0, 'skipped': 0}
+
+    def load(self, url):
+        """Start loading url once the last message has left. Returns False if nothing was loaded."""
+        try:
+            self.stage_timeouts.wait(self.driver, 'message_out',
+                                     lambda driver: not driver.find_elements(By.XPATH, self.pending_xpath))
+            page = cdp_backend.page_for(self.driver)
+            if page is not None and page.usable:
+                page.navigate(url)
+            else:
+                self.driver.execute_script(LOAD_SCRIPT, url)
+        except TimeoutException:
+            self.counts['skipped'] += 1
+            log.warning("The last message is still pending; the next chat is opened after the delay instead",
+                        extra=app_logging.log_fields(stage='prefetch'))
+            return False
+        except WebDriverException as e:
+            self.counts['skipped'] += 1
+            log.error("Error pre-loading the next chat: %s", app_logging.short_error(e),
+                      extra=app_logging.log_fields(stage='prefetch'))
+            return False
+        self.counts['preloaded'] += 1
+        return True
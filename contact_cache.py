@@ -0,0 +1,121 @@
+"""
+Contact Cache Module for WhatsApp Sender Application
+
+This module caches parsed contact workbooks. Parsing a large .xlsx file with openpyxl is one of
+the slowest parts of startup, so the parsed and normalized contacts are stored in a binary
+cache next to the workbook (Parquet when pyarrow is installed, a pandas pickle otherwise).
+
+A cache entry is keyed by the workbook's size, modification time and SHA-1 hash. When size and
+modification time are unchanged the cache is used straight away; when only the modification
+time changed (e.g. the file was copied) the hash decides; otherwise the workbook is parsed again.
+"""
+
+import os
+import json
+import hashlib
+import pandas as pd
+
+from contact_utils import normalize_mobile
+import app_logging
+
+log = app_logging.get_logger('contact_cache')
+
+CACHE_FOLDER = ".contact_cache"
+CACHE_VERSION = 1  # Bump when the normalization below changes
+
+
+def file_sha1(file_path, chunk_size=1024 * 1024):
+    """Return the SHA-1 hex digest of a file."""
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def parse_contacts_file(file_path):
+    """Parse a contacts workbook and normalize column names and mobile numbers."""
+    df = pd.read_excel(file_path, engine='openpyxl')
+    df.columns = df.columns.astype(str).str.strip().str.upper()  # Normalize column names
+    if 'MOBILE' in df.columns:
+        df = df.dropna(subset=['MOBILE'])
+        df['MOBILE'] = df['MOBILE'].map(normalize_mobile)
+    return df.reset_index(drop=True)
+
+
+def _cache_paths(file_path, cache_dir):
+    source = os.path.abspath(file_path)
+    cache_dir = cache_dir or os.path.join(os.path.dirname(source), CACHE_FOLDER)
+    key = hashlib.sha1(source.encode('utf-8')).hexdigest()[:16]
+    base_name = os.path.splitext(os.path.basename(source))[0]
+    entry = os.path.join(cache_dir, f"{base_name}_{key}")
+    return cache_dir, entry + ".json", entry + ".cache"
+
+
+def _read_manifest(manifest_path):
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_manifest(manifest_path, manifest):
+    temp_path = manifest_path + ".tmp"
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump(manifest, file)
+    os.replace(temp_path, manifest_path)
+
+
+def _load_frame(data_path, cache_format):
+    if cache_format == 'parquet':
+        return pd.read_parquet(data_path)
+    return pd.read_pickle(data_path)
+
+
+def _save_frame(df, data_path):
+    """Save the frame as Parquet if possible, otherwise as a pickle. Returns the format used."""
+    temp_path = data_path + ".tmp"
+    try:
+        df.to_parquet(temp_path, index=False)
+        cache_format = 'parquet'
+    except Exception:
+        # pyarrow is optional, and columns with mixed types cannot always be stored as Parquet
+        df.to_pickle(temp_path)
+        cache_format = 'pickle'
+    os.replace(temp_path, data_path)
+    return cache_format
+
+
+def read_contacts_frame(file_path, cache_dir=None):
+    """Return the normalized contacts DataFrame for file_path, using the cache when it is valid."""
+    stat = os.stat(file_path)
+    cache_dir, manifest_path, data_path = _cache_paths(file_path, cache_dir)
+    manifest = _read_manifest(manifest_path)
+
+    if manifest and manifest.get('version') == CACHE_VERSION and os.path.exists(data_path):
+        try:
+            if manifest['size'] == stat.st_size and manifest['mtime_ns'] == stat.st_mtime_ns:
+                return _load_frame(data_path, manifest['format'])
+            if manifest['size'] == stat.st_size and manifest['sha1'] == file_sha1(file_path):
+                manifest['mtime_ns'] = stat.st_mtime_ns
+                _write_manifest(manifest_path, manifest)
+                return _load_frame(data_path, manifest['format'])
+        except Exception as e:
+            log.error("Error reading contact cache, parsing the workbook again: %s", e)
+
+    df = parse_contacts_file(file_path)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        cache_format = _save_frame(df, data_path)
+        _write_manifest(manifest_path, {
+            'version': CACHE_VERSION,
+            'source': os.path.abspath(file_path),
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha1': file_sha1(file_path),
+            'format': cache_format,
+        })
+    except Exception as e:
+        log.error("Error writing contact cache: %s", e)
+    return df
@@ -0,0 +1,187 @@
+"""
+Contact Store Module for WhatsApp Sender Application
+
+This module keeps large contact lists in a compact, column-oriented form. Loading contacts as
+one Python dict per row costs several hundred bytes per contact; at a million contacts that is
+gigabytes. The ContactStore keeps every column in one flat buffer instead:
+
+- columns that only hold whole numbers (such as normalized mobile numbers) in an array of
+  64-bit integers
+- all other columns as UTF-8 text in one bytearray with an offsets array
+
+Indexing the store returns a ContactRow, a small __slots__ view that behaves like the old
+dict (contact['MOBILE'], contact.get('NAME'), contact.items()), so the send functions, the
+retry queue and the failed-contacts writer work on it unchanged.
+"""
+
+import sys
+import math
+from array import array
+import pandas as pd
+
+
+def _is_missing(value):
+    return value is None or (isinstance(value, float) and math.isnan(value)) or value is pd.NaT
+
+
+class IntColumn:
+    """Column of whole numbers stored as 64-bit integers."""
+
+    def __init__(self, values=()):
+        self._values = array('q', values)
+
+    def append(self, value):
+        self._values.append(int(value))
+
+    def __getitem__(self, index):
+        return self._values[index]
+
+    def __len__(self):
+        return len(self._values)
+
+    @staticmethod
+    def accepts(values):
+        """Check whether all values can be stored (and printed back) as integers."""
+        for value in values:
+            if isinstance(value, bool):
+                return False
+            if isinstance(value, int):
+                continue
+            text = str(value)
+            # Leading zeros or signs would be lost when stored as a number
+            if not text.isdigit() or (len(text) > 1 and text[0] == '0') or len(text) > 18:
+                return False
+        return True
+
+
+class TextColumn:
+    """Column of strings stored back to back in one UTF-8 buffer."""
+
+    def __init__(self, values=()):
+        self._buffer = bytearray()
+        self._offsets = array('I', [0])  # 4 GB of text per column is plenty
+        for value in values:
+            self.append(value)
+
+    def append(self, value):
+        if not _is_missing(value):
+            self._buffer += str(value).encode('utf-8')
+        self._offsets.append(len(self._buffer))
+
+    def __getitem__(self, index):
+        return self._buffer[self._offsets[index]:self._offsets[index + 1]].decode('utf-8')
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+
+class ContactRow:
+    """Read-only view of one contact in a ContactStore. Behaves like a dict of column values."""
+
+    __slots__ = ('_store', '_index')
+
+    def __init__(self, store, index):
+        self._store = store
+        self._index = index
+
+    def __getitem__(self, column):
+        return self._store.value(self._index, column)
+
+    def get(self, column, default=None):
+        if column not in self._store.column_index:
+            return default
+        return self._store.value(self._index, column)
+
+    def __contains__(self, column):
+        return column in self._store.column_index
+
+    def keys(self):
+        return self._store.columns
+
+    def items(self):
+        return [(column, self._store.value(self._index, column)) for column in self._store.columns]
+
+    def to_dict(self):
+        return dict(self.items())
+
+    @property
+    def index(self):
+        return self._index
+
+    def __repr__(self):
+        return f"ContactRow({self.to_dict()!r})"
+
+
+class ContactStore:
+    """Column-oriented store of contacts. Supports len(), indexing and iteration like a list."""
+
+    def __init__(self, columns, data):
+        # Interned column names are shared by every lookup instead of being copied per row
+        self.columns = tuple(sys.intern(str(column)) for column in columns)
+        self.column_index = {column: position for position, column in enumerate(self.columns)}
+        self._data = list(data)
+        self._length = len(self._data[0]) if self._data else 0
+
+    @classmethod
+    def from_columns(cls, columns):
+        """Build a store from a mapping of column name to a sequence of values."""
+        data = []
+        for values in columns.values():
+            values = list(values)
+            if values and not any(_is_missing(value) for value in values) and IntColumn.accepts(values):
+                data.append(IntColumn(int(value) for value in values))
+            else:
+                data.append(TextColumn(values))
+        return cls(columns.keys(), data)
+
+    @classmethod
+    def from_frame(cls, df):
+        return cls.from_columns({column: df[column].tolist() for column in df.columns})
+
+    @classmethod
+    def from_records(cls, records):
+        records = list(records)
+        columns = list(records[0].keys()) if records else ['MOBILE']
+        return cls.from_columns({column: [record.get(column) for record in records] for column in columns})
+
+    def value(self, index, column):
+        return self._data[self.column_index[column]][index]
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [ContactRow(self, position) for position in range(*index.indices(self._length))]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("contact index out of range")
+        return ContactRow(self, index)
+
+    def __iter__(self):
+        for index in range(self._length):
+            yield ContactRow(self, index)
+
+    def __bool__(self):
+        return self._length > 0
+
+    def take(self, indices):
+        """Return a new store with only the given row indices, in that order."""
+        return ContactStore(self.columns, [type(column)(column[index] for index in indices) for column in self._data])
+
+    def to_frame(self, indices=None):
+        """Return the contacts (or only the given row indices) as a DataFrame."""
+        indices = range(self._length) if indices is None else indices
+        return pd.DataFrame({column: [self._data[position][index] for index in indices]
+                             for position, column in enumerate(self.columns)})
+
+
+def rows_to_frame(rows):
+    """Build a DataFrame from ContactRow views or plain dicts, e.g. for the failed-contacts file."""
+    rows = list(rows)
+    if rows and isinstance(rows[0], ContactRow):
+        store = rows[0]._store
+        if all(row._store is store for row in rows):
+            return store.to_frame([row.index for row in rows])
+    return pd.DataFrame([row.to_dict() if isinstance(row, ContactRow) else row for row in rows])
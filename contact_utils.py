@@ -0,0 +1,20 @@
+"""
+Contact Utilities Module for WhatsApp Sender Application
+
+This module holds small helpers shared by the sender scripts and the campaign tools for
+working with contact rows, such as normalizing mobile numbers.
+"""
+
+
+def normalize_mobile(mobile):
+    """Return the mobile number as the digit string used in WhatsApp Web URLs."""
+    number = str(mobile).strip()
+    # Numbers read from Excel as floats come back as e.g. '919999999999.0'
+    if number.endswith('.0') and number[:-2].isdigit():
+        number = number[:-2]
+    return number.replace(" ", "").replace("-", "").replace("+", "")
+
+
+def template_values(contact):
+    """Placeholder values of a contact for a message template: every column, lower-cased."""
+    return {str(column).lower(): value for column, value in contact.items()}
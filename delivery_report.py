@@ -0,0 +1,153 @@
+"""
+Delivery Report Module for WhatsApp Sender Application
+
+This module streams the outcome of every contact to a delivery report while a campaign runs.
+Rows are appended to a CSV or JSON Lines file (chosen by the file extension) and flushed
+straight away, so nothing is kept in memory and nothing is lost if the run is interrupted.
+Receipt updates (delivered, read) found later are appended as extra rows for the same number,
+with the status 'receipt' so they are never taken for the outcome of a send.
+A finished report can be converted to an Excel workbook with openpyxl's write-only mode.
+"""
+
+import os
+import csv
+import json
+import datetime
+import threading
+from openpyxl import Workbook
+
+from contact_utils import normalize_mobile
+import app_logging
+
+log = app_logging.get_logger('delivery_report')
+
+STATUS_SENT = 'sent'
+STATUS_PARTIAL = 'partial'  # Text sent, but at least one attachment failed
+STATUS_FAILED = 'failed'
+STATUS_RECEIPT = 'receipt'  # Receipt update of an earlier send, not a send outcome
+
+FAILURE_TIMEOUT = 'timeout'
+FAILURE_WEBDRIVER = 'webdriver_error'
+FAILURE_ATTACHMENT = 'attachment_failed'
+FAILURE_TEMPLATE = 'template_error'  # The template uses a placeholder the contact does not have
+FAILURE_API = 'api_error'  # The messaging API could not be reached or failed; worth retrying
+FAILURE_REJECTED = 'rejected'  # The messaging API refused the message, e.g. an invalid number
+
+REPORT_COLUMNS = ['MOBILE', 'STATUS', 'FAILURE_CLASS', 'ATTEMPTS', 'TIMESTAMP',
+                  'DURATION_SECONDS', 'ATTACHMENTS', 'CAMPAIGN', 'SHARD', 'RECEIPT']
+
+
+class SendResult:
+    """
+    Outcome of sending to one contact.
+
+    Behaves like a bool (True when the send succeeded), so callers that only check
+    success keep working.
+    """
+
+    def __init__(self, success, failure_class=None, detail=None):
+        self.success = success
+        self.failure_class = failure_class
+        self.detail = detail
+        self.attempts = 1
+        self.duration = None
+        self.attachments = []  # (file name, sent) pairs
+
+    def __bool__(self):
+        return bool(self.success)
+
+    @property
+    def status(self):
+        if not self.success:
+            return STATUS_FAILED
+        if any(not sent for _, sent in self.attachments):
+            return STATUS_PARTIAL
+        return STATUS_SENT
+
+
+class DeliveryReportWriter:
+    """Appends one row per contact outcome to a .csv or .jsonl delivery report."""
+
+    def __init__(self, file_path, shard=''):
+        self.file_path = file_path
+        self.shard = shard
+        self.jsonl = os.path.splitext(file_path)[1].lower() in ('.jsonl', '.json')
+        write_header = not os.path.exists(file_path) or os.path.getsize(file_path) == 0
+        self._file = open(file_path, 'a', newline='', encoding='utf-8')
+        self._writer = None
+        self._lock = threading.Lock()  # Sessions of a session pool share one writer
+        if not self.jsonl:
+            self._writer = csv.writer(self._file)
+            if write_header:
+                self._writer.writerow(REPORT_COLUMNS)
+
+    def record(self, contact, result, campaign=''):
+        failure_class = result.failure_class
+        if failure_class is None and result.status == STATUS_PARTIAL:
+            failure_class = FAILURE_ATTACHMENT
+        row = [
+            normalize_mobile(contact['MOBILE']),
+            result.status,
+            failure_class or '',
+            result.attempts,
+            datetime.datetime.now().isoformat(timespec='seconds'),
+            '' if result.duration is None else round(result.duration, 3),
+            ';'.join(f"{name}={'sent' if sent else 'failed'}" for name, sent in result.attachments),
+            campaign,
+            self.shard,
+            '',
+        ]
+        self._write(row)
+
+    def record_receipt(self, contact, receipt, campaign=''):
+        """Append a row with the latest receipt state (pending/sent/delivered/read) of a sent message."""
+        self._write([
+            normalize_mobile(contact['MOBILE']),
+            STATUS_RECEIPT,
+            '',
+            '',
+            datetime.datetime.now().isoformat(timespec='seconds'),
+            '',
+            '',
+            campaign,
+            self.shard,
+            receipt,
+        ])
+
+    def _write(self, row):
+        with self._lock:
+            if self.jsonl:
+                self._file.write(json.dumps(dict(zip(REPORT_COLUMNS, row)), ensure_ascii=False) + '\n')
+            else:
+                self._writer.writerow(row)
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def read_report(file_path):
+    """Yield the rows of a .csv or .jsonl delivery report as dicts."""
+    with open(file_path, 'r', newline='', encoding='utf-8') as file:
+        if os.path.splitext(file_path)[1].lower() in ('.jsonl', '.json'):
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(file)
+
+
+def convert_to_xlsx(report_path, xlsx_path):
+    """Convert a delivery report to an Excel workbook, one row at a time."""
+    try:
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet('Delivery Report')
+        sheet.append(REPORT_COLUMNS)
+        for row in read_report(report_path):
+            sheet.append([row.get(column, '') for column in REPORT_COLUMNS])
+        workbook.save(xlsx_path)
+        log.info("Delivery report converted: %s", xlsx_path)
+        return True
+    except Exception as e:
+        log.error("Error converting delivery report: %s", e)
+        return False
@@ -0,0 +1,318 @@
+"""
+Driver Cache Module for WhatsApp Sender Application
+
+This module provides the chromedriver binary for undetected_chromedriver from a local cache.
+Left to itself, uc.Chrome() fetches and patches a chromedriver when it starts (and the bundled
+version can only fetch drivers up to Chrome 114), which costs seconds on every start and
+again every time a session is recycled.
+
+Here a driver is downloaded and patched once per Chrome major version and kept in a
+versioned cache folder:
+
+    ~/.cache/whatsapp_sender/chromedriver/120/chromedriver     (%LOCALAPPDATA%\\whatsapp_sender\\... on Windows)
+
+Processes share the cache safely: a driver is provisioned under a file lock and moved into
+place in one step, so other processes either see a complete patched binary or wait for it.
+After that, starting a browser only costs the browser launch. Set the WA_DRIVER_CACHE
+environment variable to move the cache folder.
+
+uc's Patcher.auto() starts any patched driver it finds in uc's own data folder before the
+driver it is given, so the drivers uc left there are removed whenever the cache is used, and
+start_chrome() checks that the started driver belongs to the installed Chrome version.
+
+Pre-warm the cache after installing or updating Chrome:
+
+    python driver_cache.py
+"""
+
+import io
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import pathlib
+import zipfile
+import argparse
+import tempfile
+import subprocess
+import urllib.request
+
+import app_logging
+
+log = app_logging.get_logger('driver_cache')
+
+CACHE_ENV = 'WA_DRIVER_CACHE'
+LEGACY_URL = "https://chromedriver.storage.googleapis.com"
+CFT_URL = "https://googlechromelabs.github.io/chrome-for-testing/latest-versions-per-milestone-with-downloads.json"
+FIRST_CFT_VERSION = 115  # Drivers from Chrome 115 on are published through Chrome for Testing
+EXE_NAME = "chromedriver.exe" if sys.platform.startswith('win') else "chromedriver"
+LOCK_TIMEOUT = 300
+
+_detected_versions = {}
+
+
+def default_cache_dir():
+    if os.environ.get(CACHE_ENV):
+        return os.environ[CACHE_ENV]
+    if sys.platform.startswith('win'):
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'whatsapp_sender', 'chromedriver')
+
+
+def _windows_chrome_version():
+    import winreg
+    for root in (winreg.HKEY_CURRENT_USER, winreg.HKEY_LOCAL_MACHINE):
+        try:
+            with winreg.OpenKey(root, r"Software\Google\Chrome\BLBeacon") as key:
+                return winreg.QueryValueEx(key, 'version')[0]
+        except OSError:
+            continue
+    return None
+
+
+def chrome_major_version(browser_path=None):
+    """Major version of the installed Chrome, e.g. 120. Detected once per process."""
+    if browser_path in _detected_versions:
+        return _detected_versions[browser_path]
+    text = None
+    if browser_path is None and sys.platform.startswith('win'):
+        # chrome.exe --version prints nothing on Windows; the updater records the version instead
+        text = _windows_chrome_version()
+    if text is None:
+        import undetected_chromedriver as uc
+        executable = browser_path or uc.find_chrome_executable()
+        if not executable:
+            raise RuntimeError("Chrome is not installed or could not be found.")
+        output = subprocess.run([executable, '--version'], capture_output=True, text=True, timeout=30)
+        text = output.stdout
+    match = re.search(r'(\d+)\.\d+\.\d+\.\d+', text or '')
+    if not match:
+        raise RuntimeError(f"Could not read the Chrome version from {text!r}")
+    _detected_versions[browser_path] = int(match.group(1))
+    return _detected_versions[browser_path]
+
+
+def _platform():
+    """(Chrome for Testing platform, legacy zip name) of this machine."""
+    if sys.platform.startswith('win'):
+        return ('win64' if sys.maxsize > 2 ** 32 else 'win32'), 'chromedriver_win32.zip'
+    if sys.platform == 'darwin':
+        import platform
+        return ('mac-arm64' if platform.machine() == 'arm64' else 'mac-x64'), 'chromedriver_mac64.zip'
+    return 'linux64', 'chromedriver_linux64.zip'
+
+
+def _read_url(url):
+    with urllib.request.urlopen(url, timeout=60) as response:
+        return response.read()
+
+
+def _driver_download(major):
+    """(full version, zip URL) of the newest chromedriver for a Chrome major version."""
+    cft_platform, legacy_zip = _platform()
+    if major >= FIRST_CFT_VERSION:
+        milestones = json.loads(_read_url(CFT_URL))['milestones']
+        milestone = milestones.get(str(major))
+        if not milestone:
+            raise RuntimeError(f"No chromedriver published for Chrome {major}.")
+        for download in milestone['downloads'].get('chromedriver', []):
+            if download['platform'] == cft_platform:
+                return milestone['version'], download['url']
+        raise RuntimeError(f"No chromedriver for Chrome {major} on {cft_platform}.")
+    version = _read_url(f"{LEGACY_URL}/LATEST_RELEASE_{major}").decode().strip()
+    return version, f"{LEGACY_URL}/{version}/{legacy_zip}"
+
+
+def _extract_driver(zip_bytes, target_path):
+    with zipfile.ZipFile(io.BytesIO(zip_bytes)) as archive:
+        # Chrome for Testing zips keep the binary in a platform folder
+        member = next((name for name in archive.namelist() if os.path.basename(name) == EXE_NAME), None)
+        if member is None:
+            raise RuntimeError("The chromedriver download does not contain the driver.")
+        with archive.open(member) as source, open(target_path, 'wb') as target:
+            shutil.copyfileobj(source, target)
+    os.chmod(target_path, 0o755)
+
+
+def _patch(driver_path):
+    import undetected_chromedriver as uc
+    patcher = uc.Patcher(executable_path=driver_path)
+    if os.path.normcase(patcher.executable_path) != os.path.normcase(driver_path):
+        # uc appends '.exe' on Windows to paths that lack it and would patch another file
+        raise RuntimeError(f"uc would patch {patcher.executable_path} instead of {driver_path}.")
+    patcher.patch_exe()
+    if not patcher.is_binary_patched(driver_path):
+        raise RuntimeError("Patching the chromedriver binary failed.")
+
+
+class FileLock:
+    """Exclusive lock on a file shared between processes (fcntl on POSIX, msvcrt on Windows)."""
+
+    def __init__(self, path, timeout=LOCK_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self._file = None
+
+    def _try_lock(self):
+        if sys.platform.startswith('win'):
+            import msvcrt
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def __enter__(self):
+        self._file = open(self.path, 'a+b')
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                self._try_lock()
+                return self
+            except OSError:
+                if time.monotonic() > deadline:
+                    self._file.close()
+                    raise TimeoutError(f"Timed out waiting for {self.path}")
+                time.sleep(0.2)
+
+    def __exit__(self, *exc_info):
+        try:
+            if sys.platform.startswith('win'):
+                import msvcrt
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        finally:
+            self._file.close()
+
+
+def patched_driver(major=None, cache_dir=None):
+    """
+    Return the path of a patched chromedriver for Chrome major (the installed one by default),
+    downloading and patching it first if the cache does not have it yet.
+    """
+    major = major or chrome_major_version()
+    cache_dir = cache_dir or default_cache_dir()
+    version_dir = os.path.join(cache_dir, str(major))
+    driver_path = os.path.join(version_dir, EXE_NAME)
+    if os.path.exists(driver_path):
+        return driver_path  # Only complete, patched binaries are ever moved to this path
+
+    os.makedirs(version_dir, exist_ok=True)
+    with FileLock(os.path.join(cache_dir, f"{major}.lock")):
+        if os.path.exists(driver_path):
+            return driver_path  # Another process provisioned it while we waited
+        started = time.monotonic()
+        version, url = _driver_download(major)
+        log.info("Downloading chromedriver %s for Chrome %s...", version, major)
+        # The temporary name ends in the executable name (chromedriver.exe on Windows) for uc's Patcher
+        file_descriptor, temp_path = tempfile.mkstemp(prefix='.download-', suffix='-' + EXE_NAME, dir=version_dir)
+        os.close(file_descriptor)
+        try:
+            _extract_driver(_read_url(url), temp_path)
+            _patch(temp_path)
+            os.replace(temp_path, driver_path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        with open(os.path.join(version_dir, 'version.txt'), 'w', encoding='utf-8') as file:
+            file.write(version)
+        log.info("Cached patched chromedriver %s in %s (%.1f s)", version, version_dir, time.monotonic() - started)
+    return driver_path
+
+
+def clear_uc_drivers():
+    """
+    Remove the patched drivers in uc's own data folder. uc 3.5's Patcher.auto() uses the first
+    patched driver it finds there and ignores driver_executable_path, so a driver left by an
+    earlier uc run (or by the fallback below) would be started after Chrome has updated.
+    """
+    import undetected_chromedriver as uc
+    for path in pathlib.Path(uc.Patcher.data_path).rglob('*chromedriver*'):
+        if not path.is_file():
+            continue
+        try:
+            path.unlink()
+            log.debug("Removed uc's driver %s", path)
+        except OSError as e:
+            # Still running in another session; start_chrome() catches it if uc picks it
+            log.warning("Could not remove uc's driver %s: %s", path, app_logging.short_error(e))
+
+
+def chrome_kwargs(browser_path=None):
+    """
+    Arguments for uc.Chrome() that use the cached driver. Returns {} (uc then provisions the
+    driver itself, as before) if the cache cannot be filled, e.g. without network access.
+    """
+    try:
+        major = chrome_major_version(browser_path)
+        driver_path = patched_driver(major)
+        clear_uc_drivers()
+        return {'driver_executable_path': driver_path, 'version_main': major}
+    except Exception as e:
+        log.warning("Driver cache not available, chromedriver is provisioned by uc on every start: %s",
+                    app_logging.short_error(e), exc_info=e)
+        return {}
+
+
+def _major(version):
+    match = re.match(r'\s*(\d+)\.', version or '')
+    return int(match.group(1)) if match else None
+
+
+def verify_driver(driver, major):
+    """Raise RuntimeError unless the started chromedriver and Chrome are both of version major."""
+    capabilities = driver.capabilities
+    driver_major = _major(capabilities.get('chrome', {}).get('chromedriverVersion'))
+    browser_major = _major(capabilities.get('browserVersion'))
+    if driver_major != major or browser_major != major:
+        raise RuntimeError(f"Started chromedriver {driver_major} with Chrome {browser_major}, expected {major}. "
+                           f"Run python driver_cache.py to refresh the driver cache.")
+
+
+def start_chrome(options, **kwargs):
+    """Start uc.Chrome() with the cached driver and check that it matches the installed Chrome."""
+    import undetected_chromedriver as uc
+    cache_kwargs = chrome_kwargs()
+    driver = uc.Chrome(options=options, **cache_kwargs, **kwargs)
+    if cache_kwargs:
+        try:
+            verify_driver(driver, cache_kwargs['version_main'])
+        except RuntimeError:
+            driver.quit()
+            raise
+    return driver
+
+
+def prune(keep=2, cache_dir=None):
+    """Delete the cached drivers of all but the newest keep Chrome versions."""
+    cache_dir = cache_dir or default_cache_dir()
+    if not os.path.isdir(cache_dir):
+        return []
+    versions = sorted((int(name) for name in os.listdir(cache_dir) if name.isdigit()), reverse=True)
+    removed = []
+    for major in versions[keep:]:
+        with FileLock(os.path.join(cache_dir, f"{major}.lock")):
+            shutil.rmtree(os.path.join(cache_dir, str(major)), ignore_errors=True)
+        removed.append(major)
+    return removed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Download and patch chromedriver for the installed Chrome.")
+    parser.add_argument('--version', type=int, help="Chrome major version (default: the installed Chrome).")
+    parser.add_argument('--cache-dir', help=f"Cache folder (default: {default_cache_dir()}).")
+    parser.add_argument('--keep', type=int, default=2, help="Chrome versions to keep in the cache.")
+    args = parser.parse_args()
+    app_logging.configure_logging()
+
+    path = patched_driver(args.version, args.cache_dir)
+    print(f"Patched chromedriver: {path}")
+    for major in prune(args.keep, args.cache_dir):
+        print(f"Removed the driver of Chrome {major}")
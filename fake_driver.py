@@ -0,0 +1,184 @@
+"""
+Fake Driver Module for WhatsApp Sender Application
+
+This module provides a simulated WebDriver for exercising the send loop without Chrome or a
+WhatsApp account. It implements the part of the Selenium API the send functions use (get,
+find_element, click, send_keys, execute_script, quit) and draws page-load and element
+latency, timeouts and crashes from configurable distributions. A sent message shows the
+pending clock icon for a while; a page load started before it has left counts as a lost
+message.
+
+Time is simulated as well: the FakeDriver advances a VirtualClock instead of sleeping, and the
+soak runner puts the same clock in place of the `time` module of the code under test, so a
+campaign that would take days runs in minutes.
+"""
+
+import math
+import random
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+
+class VirtualClock:
+    """Drop-in replacement for the parts of the time module the send loop uses."""
+
+    def __init__(self, start=1_700_000_000.0):
+        self.start = start
+        self.now = 0.0
+
+    def advance(self, seconds):
+        self.now += max(0.0, seconds)
+
+    def sleep(self, seconds):
+        self.advance(seconds)
+
+    def time(self):
+        return self.start + self.now
+
+    def monotonic(self):
+        return self.now
+
+    def perf_counter(self):
+        return self.now
+
+
+class FakeDriverConfig:
+    """
+    Behaviour of the simulated browser.
+
+    Latencies are log-normal with the given median (seconds) and sigma; message_out_median is
+    how long a sent message stays pending (clock icon) before it has left. Rates are
+    probabilities: page_timeout_rate per opened chat, element_timeout_rate per element
+    lookup and crash_rate per opened chat.
+    """
+
+    def __init__(self, page_load_median=2.0, page_load_sigma=0.5, element_median=0.05,
+                 element_sigma=0.5, page_timeout_rate=0.02, element_timeout_rate=0.002,
+                 crash_rate=0.001, wait_timeout=10.0, message_out_median=0.5, seed=None):
+        self.page_load_median = page_load_median
+        self.page_load_sigma = page_load_sigma
+        self.element_median = element_median
+        self.element_sigma = element_sigma
+        self.page_timeout_rate = page_timeout_rate
+        self.element_timeout_rate = element_timeout_rate
+        self.crash_rate = crash_rate
+        self.wait_timeout = wait_timeout
+        self.message_out_median = message_out_median
+        self.seed = seed
+
+
+class FakeElement:
+    __slots__ = ('driver', 'locator')
+
+    def __init__(self, driver, locator):
+        self.driver = driver
+        self.locator = locator
+
+    def click(self):
+        self.driver.command('click')
+        self.driver.clicked_locators.add(self.locator)
+        if 'data-icon="send"' in str(self.locator[1]):
+            self.driver.message_sent()
+
+    def send_keys(self, *values):
+        self.driver.command('sendKeys')
+
+    def clear(self):
+        self.driver.command('clear')
+
+    def is_displayed(self):
+        # The send button disappears once it has been clicked on the current page
+        self.driver.command('isElementDisplayed')
+        return self.locator not in self.driver.clicked_locators
+
+    def get_attribute(self, name):
+        return None
+
+
+class FakeDriver:
+    """Simulated WebDriver session driven by a FakeDriverConfig and a VirtualClock."""
+
+    PENDING_ICON = 'msg-time'
+
+    def __init__(self, config=None, clock=None):
+        self.config = config or FakeDriverConfig()
+        self.clock = clock or VirtualClock()
+        self.random = random.Random(self.config.seed)
+        self.commands = 0
+        self.current_url = 'about:blank'
+        self.current_window_handle = 'tab-0'
+        self.clicked_locators = set()
+        self.lost_messages = 0
+        self._page_outcome = 'ok'
+        self._ready_at = 0.0  # Virtual time at which the page has loaded
+        self._pending_until = 0.0  # Virtual time at which the last sent message has left
+
+    def message_sent(self):
+        self._pending_until = self.clock.now + self._latency(self.config.message_out_median, 0.5)
+
+    def _latency(self, median, sigma):
+        return self.random.lognormvariate(math.log(median), sigma)
+
+    def command(self, name):
+        """Account for one WebDriver round trip."""
+        self.commands += 1
+        self.clock.advance(self._latency(self.config.element_median, self.config.element_sigma))
+
+    def execute(self, driver_command, params=None):
+        self.command(driver_command)
+        return {'value': None}
+
+    def get(self, url):
+        self.command('get')
+        self._start_load(url)
+        # get() blocks until the page has loaded
+        self.clock.advance(self._ready_at - self.clock.now)
+
+    def _start_load(self, url):
+        if self.clock.now < self._pending_until:
+            # Leaving the chat before the message went out drops it
+            self.lost_messages += 1
+            self._pending_until = 0.0
+        self.current_url = url
+        self.clicked_locators = set()
+        self._ready_at = self.clock.now + self._latency(self.config.page_load_median, self.config.page_load_sigma)
+        draw = self.random.random()
+        if draw < self.config.crash_rate:
+            self._page_outcome = 'crash'
+        elif draw < self.config.crash_rate + self.config.page_timeout_rate:
+            self._page_outcome = 'timeout'
+        else:
+            self._page_outcome = 'ok'
+
+    def find_element(self, by=None, value=None):
+        self.command('findElement')
+        # Waiting for an element of a page that is still loading (started with window.location)
+        self.clock.advance(self._ready_at - self.clock.now)
+        if self._page_outcome == 'crash':
+            raise WebDriverException("tab crashed (simulated)")
+        if self._page_outcome == 'timeout' or self.random.random() < self.config.element_timeout_rate:
+            # A real WebDriverWait would poll until its timeout; raise its exception directly
+            self.clock.advance(self.config.wait_timeout)
+            raise TimeoutException(f"Element not found (simulated): {value}")
+        return FakeElement(self, (by, value))
+
+    def find_elements(self, by=None, value=None):
+        # Like Selenium without an implicit wait: returns at once, empty while the page is loading
+        self.command('findElements')
+        if self.clock.now < self._ready_at or self._page_outcome != 'ok':
+            return []
+        if self.PENDING_ICON in str(value):
+            return [FakeElement(self, (by, value))] if self.clock.now < self._pending_until else []
+        return [FakeElement(self, (by, value))]
+
+    def execute_script(self, script, *args):
+        self.command('executeScript')
+        if script.startswith('window.location') and args:
+            self._start_load(args[0])  # Returns at once; the page loads in the background
+            return None
+        return []
+
+    def refresh(self):
+        self.get(self.current_url)
+
+    def quit(self):
+        self.commands += 1
@@ -10,6 +10,10 @@ import shutil
 import datetime
 import pandas as pd
 
+import app_logging
+
+log = app_logging.get_logger('file_manager')
+
 def create_backup_folder():
     """Create a backup folder if it doesn't exist."""
     backup_folder = os.path.join(os.getcwd(), "backups")
@@ -31,16 +35,16 @@ def backup_file(file_path):
     
     try:
         shutil.copy2(file_path, backup_path)
-        print(f"Backup created: {backup_path}")
+        log.info("Backup created: %s", backup_path)
         return backup_path
     except Exception as e:
-        print(f"Error creating backup: {e}")
+        log.error("Error creating backup: %s", e)
         return None
 
 def delete_excel_file(file_path, backup=True):
     """Delete an Excel file, optionally creating a backup first."""
     if not os.path.exists(file_path):
-        print(f"File not found: {file_path}")
+        log.warning("File not found: %s", file_path)
         return False
     
     if backup:
@@ -48,10 +52,10 @@ def delete_excel_file(file_path, backup=True):
     
     try:
         os.remove(file_path)
-        print(f"Deleted file: {file_path}")
+        log.info("Deleted file: %s", file_path)
         return True
     except Exception as e:
-        print(f"Error deleting file: {e}")
+        log.error("Error deleting file: %s", e)
         return False
 
 def create_empty_excel(file_path, columns=None):
@@ -62,16 +66,16 @@ def create_empty_excel(file_path, columns=None):
     try:
         df = pd.DataFrame(columns=columns)
         df.to_excel(file_path, index=False)
-        print(f"Created new Excel file: {file_path}")
+        log.info("Created new Excel file: %s", file_path)
         return True
     except Exception as e:
-        print(f"Error creating Excel file: {e}")
+        log.error("Error creating Excel file: %s", e)
         return False
 
 def delete_text_file(file_path, backup=True):
     """Delete a text file, optionally creating a backup first."""
     if not os.path.exists(file_path):
-        print(f"File not found: {file_path}")
+        log.warning("File not found: %s", file_path)
         return False
     
     if backup:
@@ -79,10 +83,10 @@ def delete_text_file(file_path, backup=True):
     
     try:
         os.remove(file_path)
-        print(f"Deleted file: {file_path}")
+        log.info("Deleted file: %s", file_path)
         return True
     except Exception as e:
-        print(f"Error deleting file: {e}")
+        log.error("Error deleting file: %s", e)
         return False
 
 def create_empty_text_file(file_path, content=""):
@@ -90,16 +94,16 @@ def create_empty_text_file(file_path, content=""):
     try:
         with open(file_path, 'w', encoding='utf-8') as file:
             file.write(content)
-        print(f"Created new text file: {file_path}")
+        log.info("Created new text file: %s", file_path)
         return True
     except Exception as e:
-        print(f"Error creating text file: {e}")
+        log.error("Error creating text file: %s", e)
         return False
 
 def handle_pdf_file(file_path, action="backup"):
     """Handle PDF files - backup or other actions."""
     if not os.path.exists(file_path):
-        print(f"PDF file not found: {file_path}")
+        log.warning("PDF file not found: %s", file_path)
         return False
     
     if action == "backup":
@@ -110,7 +114,7 @@ def handle_pdf_file(file_path, action="backup"):
 def list_files_in_directory(directory_path, file_extension=None):
     """List all files in a directory, optionally filtered by extension."""
     if not os.path.exists(directory_path):
-        print(f"Directory not found: {directory_path}")
+        log.warning("Directory not found: %s", directory_path)
         return []
     
     files = []
@@ -127,9 +131,9 @@ def ensure_directory_exists(directory_path):
     if not os.path.exists(directory_path):
         try:
             os.makedirs(directory_path)
-            print(f"Created directory: {directory_path}")
+            log.info("Created directory: %s", directory_path)
             return True
         except Exception as e:
-            print(f"Error creating directory: {e}")
+            log.error("Error creating directory: %s", e)
             return False
     return True
@@ -0,0 +1,188 @@
+"""
+Incremental Module for WhatsApp Sender Application
+
+This module lets a campaign send only to the rows of its contact sheet that were added or
+changed since the last run. HR keeps appending new joiners to the same sheet, and without
+this the choice was resending to everyone or editing the sheet by hand.
+
+Every contact that was sent successfully is remembered in a per-campaign fingerprint index:
+a 64-bit hash of the normalized mobile number mapped to a 64-bit hash of the row's
+template-relevant values (the columns used as {placeholders} in the template, plus the
+ATTACHMENTS column). A run in incremental mode diffs the sheet against the index and sends
+to the rows whose number is new or whose fingerprint changed.
+
+The index is a flat file of (number hash, fingerprint) pairs in .incremental/ next to the
+contacts file. Sent contacts are appended as they go, so an interrupted run resumes where it
+stopped; later pairs win when the file is read, and the file is compacted when the run ends.
+Changing only the wording of the template does not cause a resend.
+"""
+
+import os
+import re
+import string
+import hashlib
+import threading
+from array import array
+
+from contact_utils import normalize_mobile
+from attachments import ATTACHMENTS_COLUMN
+import app_logging
+
+log = app_logging.get_logger('incremental')
+
+INDEX_FOLDER = ".incremental"
+INDEX_MAGIC = b"WAIDX1\n"
+_SEPARATOR = b"\x1f"
+_LITTLE_ENDIAN = array('Q', [1]).tobytes()[0] == 1
+
+
+def template_columns(message_template, columns):
+    """Return the contact columns whose values end up in a message or its attachments."""
+    fields = set()
+    for _, field_name, _, _ in string.Formatter().parse(message_template or ''):
+        if field_name:
+            # {name.title} or {name[0]} still depend on the name column only
+            fields.add(re.split(r'[.\[]', field_name, 1)[0].lower())
+    selected = [column for column in columns if str(column).lower() in fields and column != 'MOBILE']
+    if ATTACHMENTS_COLUMN in columns:
+        selected.append(ATTACHMENTS_COLUMN)
+    return selected
+
+
+def _hash64(data):
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'little')
+
+
+def _text(value):
+    if value is None or value != value:  # None or NaN
+        return ''
+    return str(value).strip()
+
+
+def number_key(mobile):
+    return _hash64(normalize_mobile(mobile).encode('utf-8'))
+
+
+def row_fingerprint(contact, columns):
+    """Fingerprint of the normalized number and the given columns of one contact."""
+    parts = [normalize_mobile(contact['MOBILE'])]
+    parts.extend(_text(contact.get(column)) for column in columns)
+    return _hash64(_SEPARATOR.join(part.encode('utf-8') for part in parts))
+
+
+class RowDiff:
+    """Positions of the contacts to send and how many rows were new, changed or unchanged."""
+
+    def __init__(self, positions, new, changed, unchanged):
+        self.positions = positions
+        self.new = new
+        self.changed = changed
+        self.unchanged = unchanged
+
+
+class FingerprintIndex:
+    """Per-campaign index of the fingerprints of successfully sent contacts."""
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.columns = []
+        self._fingerprints = {}
+        self._appended = 0
+        self._journal = None
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.file_path, 'rb') as file:
+                data = file.read()
+        except FileNotFoundError:
+            return
+        if INDEX_MAGIC.startswith(data):
+            return  # Empty, or a crash while the header was written
+        if not data.startswith(INDEX_MAGIC):
+            raise ValueError(f"{self.file_path} is not a fingerprint index.")
+        pairs = array('Q')
+        body = data[len(INDEX_MAGIC):]
+        pairs.frombytes(body[:len(body) - len(body) % 16])  # Ignore a pair cut off by a crash
+        if not _LITTLE_ENDIAN:
+            pairs.byteswap()  # The file is little-endian
+        # Pairs appended later (re-sent contacts) overwrite earlier ones
+        self._fingerprints = dict(zip(pairs[0::2], pairs[1::2]))
+
+    def diff(self, contacts, columns):
+        """Compare the contacts with the index. columns are the fingerprinted columns (template_columns)."""
+        self.columns = list(columns)
+        fingerprints = self._fingerprints
+        positions = array('I')
+        new = changed = 0
+        for position in range(len(contacts)):
+            contact = contacts[position]
+            known = fingerprints.get(number_key(contact['MOBILE']))
+            if known is None:
+                new += 1
+            elif known != row_fingerprint(contact, self.columns):
+                changed += 1
+            else:
+                continue
+            positions.append(position)
+        return RowDiff(positions, new, changed, len(contacts) - len(positions))
+
+    def mark_sent(self, contact):
+        """Remember a sent contact; it is written to disk straight away."""
+        key = number_key(contact['MOBILE'])
+        fingerprint = row_fingerprint(contact, self.columns)
+        with self._lock:
+            self._fingerprints[key] = fingerprint
+            if self._journal is None:
+                self._journal = self._open_journal()
+            self._journal.write(_pair_bytes(array('Q', [key, fingerprint])))
+            self._journal.flush()
+            self._appended += 1
+
+    def _open_journal(self):
+        os.makedirs(os.path.dirname(self.file_path) or '.', exist_ok=True)
+        journal = open(self.file_path, 'ab')
+        size = journal.tell()
+        if size < len(INDEX_MAGIC):
+            journal.truncate(0)
+            journal.write(INDEX_MAGIC)
+        elif (size - len(INDEX_MAGIC)) % 16:
+            # Drop the pair cut off by a crash, or every pair appended after it would be misread
+            journal.truncate(size - (size - len(INDEX_MAGIC)) % 16)
+        return journal
+
+    def close(self):
+        """Stop appending and rewrite the index without superseded pairs."""
+        with self._lock:
+            if self._journal is None:
+                return
+            self._journal.close()
+            self._journal = None
+            pairs = array('Q')
+            for key, fingerprint in self._fingerprints.items():
+                pairs.append(key)
+                pairs.append(fingerprint)
+            temp_path = self.file_path + ".tmp"
+            try:
+                with open(temp_path, 'wb') as file:
+                    file.write(INDEX_MAGIC)
+                    file.write(_pair_bytes(pairs))
+                os.replace(temp_path, self.file_path)
+            except OSError as e:
+                # The appended index is still complete, only larger
+                log.error("Error compacting fingerprint index: %s", e)
+            log.info("Fingerprint index: %s contacts added, %s known", self._appended, len(self._fingerprints))
+
+
+def _pair_bytes(pairs):
+    if not _LITTLE_ENDIAN:
+        pairs.byteswap()
+    return pairs.tobytes()
+
+
+def index_path(contacts_file, campaign):
+    """Index file of a campaign, in .incremental/ next to the contacts file."""
+    folder = os.path.join(os.path.dirname(os.path.abspath(contacts_file)), INDEX_FOLDER)
+    safe_name = re.sub(r'[^\w.-]+', '_', campaign).strip('_') or 'campaign'
+    return os.path.join(folder, f"{safe_name}.idx")
@@ -0,0 +1,208 @@
+"""
+Job Submission API Module for WhatsApp Sender Application
+
+This module exposes a small local HTTP API so other systems (for example the HR system) can
+push small batches of contacts to a running daemon instead of editing contacts.xlsx and
+restarting the browser. Submitted jobs become campaigns on the daemon's scheduler and are
+sent by the session that is already logged in.
+
+    POST /jobs        {"contacts": [{"MOBILE": "919999999999", "NAME": "Ravi",
+                                     "ATTACHMENTS": ["C:/payslips/ravi_march.pdf"]}],
+                       "template": "Hello {name}", "attachments": ["C:/docs/form.pdf"],
+                       "priority": 5}
+    GET  /jobs/<id>   status of one job
+    GET  /jobs        status of all known jobs
+"""
+
+import hmac
+import json
+import time
+import uuid
+import threading
+
+import scheduler
+import attachments
+import app_logging
+from local_server import QuietRequestHandler, start_http_server
+from contact_utils import template_values
+
+log = app_logging.get_logger('job_api')
+
+JOB_PREFIX = 'job-'
+DEFAULT_JOB_PRIORITY = 5
+FINISHED_JOB_RETENTION = 24 * 60 * 60  # Seconds to keep finished jobs around for polling
+
+
+class JobError(Exception):
+    """Raised when a submitted job is invalid."""
+
+
+class JobRegistry:
+    """
+    Keeps track of submitted jobs and their per-contact results. Relative attachment paths are
+    resolved against base_dir, the same folder the daemon resolves them against when sending.
+    """
+
+    def __init__(self, campaign_scheduler, base_dir=None):
+        self.campaign_scheduler = campaign_scheduler
+        self.base_dir = base_dir
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, payload):
+        """Validate a job payload and queue it on the scheduler. Returns the job status."""
+        if not isinstance(payload, dict):
+            raise JobError("The job must be a JSON object.")
+        contacts = payload.get('contacts')
+        if contacts is None and isinstance(payload.get('numbers'), list):
+            contacts = [{'MOBILE': number} for number in payload['numbers']]
+        if not contacts or not isinstance(contacts, list):
+            raise JobError("Job needs a non-empty 'contacts' or 'numbers' list.")
+
+        normalized = []
+        for contact in contacts:
+            if not isinstance(contact, dict):
+                raise JobError("Every contact must be an object.")
+            contact = {str(key).strip().upper(): value for key, value in contact.items()}
+            if not contact.get('MOBILE'):
+                raise JobError("Every contact needs a MOBILE value.")
+            # Per-contact attachments may be sent as a list; they are checked before the job is queued
+            contact_attachments = contact.get(attachments.ATTACHMENTS_COLUMN)
+            if isinstance(contact_attachments, list):
+                if not all(isinstance(path, str) for path in contact_attachments):
+                    raise JobError(f"ATTACHMENTS of {contact['MOBILE']} must be file paths.")
+                contact[attachments.ATTACHMENTS_COLUMN] = ';'.join(contact_attachments)
+            elif contact_attachments is not None and not isinstance(contact_attachments, str):
+                raise JobError(f"ATTACHMENTS of {contact['MOBILE']} must be a list or a string of file paths.")
+            _, missing = attachments.resolve_patterns(
+                attachments.split_attachment_cell(contact.get(attachments.ATTACHMENTS_COLUMN)), self.base_dir)
+            if missing:
+                raise JobError(f"Attachments of {contact['MOBILE']} not found: {', '.join(missing)}")
+            normalized.append(contact)
+
+        message_template = payload.get('template')
+        if not message_template or not isinstance(message_template, str):
+            raise JobError("Job needs a 'template' string.")
+        for contact in normalized:
+            # Formatted as in the daemon, so a bad placeholder is refused here instead of failing every send
+            try:
+                message_template.format(**template_values(contact))
+            except (KeyError, IndexError, ValueError, AttributeError) as e:
+                raise JobError(f"Template does not fit contact {contact['MOBILE']}: {type(e).__name__}: {e}")
+
+        priority = payload.get('priority', DEFAULT_JOB_PRIORITY)
+        if isinstance(priority, bool) or not isinstance(priority, int) or priority < 1:
+            raise JobError("'priority' must be a whole number of 1 or higher.")
+
+        attachment_paths = payload.get('attachments', [])
+        if not isinstance(attachment_paths, list) or not all(isinstance(path, str) for path in attachment_paths):
+            raise JobError("'attachments' must be a list of file paths.")
+        attachment_paths, missing = attachments.resolve_patterns(attachment_paths, self.base_dir)
+        if missing:
+            raise JobError(f"Attachments not found: {', '.join(missing)}")
+
+        job_id = uuid.uuid4().hex[:12]
+        campaign = scheduler.Campaign(
+            name=JOB_PREFIX + job_id,
+            contacts=normalized,
+            message_template=message_template,
+            attachment_paths=attachment_paths,
+            priority=priority,
+        )
+        job = {
+            'id': job_id,
+            'status': 'queued',
+            'submitted_at': time.time(),
+            'finished_at': None,
+            'total': len(normalized),
+            'sent': 0,
+            'failed': 0,
+            'results': [],
+        }
+        with self._lock:
+            self._prune()
+            self._jobs[job_id] = job
+        self.campaign_scheduler.add_campaign(campaign)
+        return self.status(job_id)
+
+    def record_result(self, campaign_name, contact, success):
+        """Record the outcome of one send if it belongs to a submitted job."""
+        if not campaign_name.startswith(JOB_PREFIX):
+            return
+        with self._lock:
+            job = self._jobs.get(campaign_name[len(JOB_PREFIX):])
+            if job is None:
+                return
+            job['status'] = 'sending'
+            job['sent' if success else 'failed'] += 1
+            job['results'].append({'mobile': str(contact['MOBILE']), 'success': bool(success)})
+            finished = job['sent'] + job['failed'] >= job['total']
+            if finished:
+                job['status'] = 'finished'
+                job['finished_at'] = time.time()
+        if finished:
+            # The job's status stays here for polling; the scheduler does not need the campaign any more
+            self.campaign_scheduler.remove_campaign(campaign_name)
+
+    def status(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return None if job is None else dict(job, results=list(job['results']))
+
+    def all_statuses(self):
+        with self._lock:
+            return [dict(job, results=None) for job in self._jobs.values()]
+
+    def _prune(self):
+        cutoff = time.time() - FINISHED_JOB_RETENTION
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job['finished_at'] and job['finished_at'] < cutoff]:
+            del self._jobs[job_id]
+
+
+class JobRequestHandler(QuietRequestHandler):
+    registry = None
+    token = None
+
+    def _authorized(self):
+        expected = f"Bearer {self.token}".encode('utf-8')
+        if self.token and not hmac.compare_digest(self.headers.get('Authorization', '').encode('utf-8'), expected):
+            self._send_json(401, {'error': 'Unauthorized'})
+            return False
+        return True
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        if self.path.rstrip('/') != '/jobs':
+            self._send_json(404, {'error': 'Not found'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length) or b'{}')
+            job = self.registry.submit(payload)
+        except (ValueError, JobError) as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        self._send_json(202, dict(job, status_url=f"/jobs/{job['id']}"))
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        path = self.path.rstrip('/')
+        if path == '/jobs':
+            self._send_json(200, self.registry.all_statuses())
+            return
+        if path.startswith('/jobs/'):
+            job = self.registry.status(path[len('/jobs/'):])
+            if job is not None:
+                self._send_json(200, job)
+                return
+        self._send_json(404, {'error': 'Not found'})
+
+
+def start_job_server(registry, host='127.0.0.1', port=8765, token=None):
+    """Start the job API in a background thread and return the server."""
+    server = start_http_server(JobRequestHandler, host, port, name='job-api', registry=registry, token=token)
+    log.info("Job API listening on http://%s:%s/jobs", host, port)
+    return server
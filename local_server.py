@@ -0,0 +1,59 @@
+"""
+Local Server Module for WhatsApp Sender Application
+
+This module holds what the small HTTP servers of the application share: the status server
+(progress.py), the job API (job_api.py) and the mock messaging API (mock_api_server.py).
+QuietRequestHandler answers with JSON or any other body and keeps request lines off the
+console, and start_http_server() binds a handler class to its objects and serves it from a
+background thread.
+"""
+
+import sys
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import app_logging
+
+log = app_logging.get_logger('local_server')
+
+
+class QuietRequestHandler(BaseHTTPRequestHandler):
+    """Request handler that does not log every request."""
+
+    def _send(self, status_code, content_type, data):
+        self.send_response(status_code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_json(self, status_code, body):
+        self._send(status_code, 'application/json', json.dumps(body).encode('utf-8'))
+
+    def log_message(self, format, *args):
+        # Keep the console for send progress; request lines are not interesting
+        pass
+
+
+class LocalHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        error = sys.exc_info()[1]
+        if isinstance(error, ConnectionError):
+            return  # The client went away (e.g. timed out) before the answer was written
+        log.error("Error handling a request from %s: %s", client_address[0], app_logging.short_error(error),
+                  exc_info=error)
+
+
+def start_http_server(handler_cls, host='127.0.0.1', port=0, name='http-server', **attrs):
+    """
+    Serve handler_cls in a background thread and return the server (port 0 picks a free port).
+    attrs are set on a subclass of the handler, e.g. the tracker or registry it answers for.
+    """
+    handler = type(f"Bound{handler_cls.__name__}", (handler_cls,), attrs)
+    server = LocalHTTPServer((host, port), handler)
+    thread = threading.Thread(target=server.serve_forever, name=name, daemon=True)
+    thread.start()
+    return server
@@ -0,0 +1,232 @@
+"""
+Media Render Module for WhatsApp Sender Application
+
+This module turns a media template and contact rows into personalized images or PDFs, for
+example a poster with the recipient's name, UAN and date of birth stamped on it. A template
+is a JSON file next to its base image:
+
+    {"image": "Poster.jpg", "format": "pdf", "file_name": "Welcome {name}",
+     "fields": [{"text": "Dear {name}", "position": [120, 840], "size": 48, "color": "#1a1a1a"},
+                {"text": "UAN: {uan}", "position": [120, 910], "size": 36, "font": "arial.ttf"}]}
+
+Texts use the same {placeholders} as the message template: every column of the contacts
+sheet, lower-cased (contact_utils.template_values), with contacts read by
+contact_cache.read_contacts_frame, as the senders do. "format" is jpg, png or pdf
+(a PDF page made from the image); "font" is a TrueType file, relative to the template, and
+"anchor" a Pillow text anchor such as "mm" to center a text on its position.
+
+Rendering runs in a pool of worker processes that each load the base image and fonts once.
+MediaRenderer.stream() hands out the files in contact order while the workers already render
+the contacts ahead, so the send loop never waits for them. Every file is cached under a hash
+of the template and the rendered texts, so a re-run (or a contact whose texts are the same as
+another's) costs nothing.
+
+Pre-render all files of a campaign ahead of time with:
+
+    python media_render.py Poster.json contacts.xlsx
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, ImageDraw, ImageFont
+
+import app_logging
+from contact_utils import template_values
+
+log = app_logging.get_logger('media_render')
+
+CACHE_FOLDER = ".media_cache"
+FORMATS = {'jpg': 'JPEG', 'png': 'PNG', 'pdf': 'PDF'}
+DEFAULT_FONT = "DejaVuSans.ttf"
+
+
+class MediaTemplate:
+    """A base image with text fields to stamp on it."""
+
+    def __init__(self, spec, base_dir):
+        self.spec = spec
+        self.base_dir = base_dir
+        self.fields = spec.get('fields', [])
+        self.format = spec.get('format', 'jpg').lower()
+        if self.format not in FORMATS:
+            raise ValueError(f"Unknown media format: {self.format} (use jpg, png or pdf)")
+        self.file_name = spec.get('file_name') or os.path.splitext(os.path.basename(spec['image']))[0]
+        self.key = self._template_key()
+
+    @classmethod
+    def load(cls, file_path):
+        with open(file_path, 'r', encoding='utf-8') as file:
+            spec = json.load(file)
+        return cls(spec, os.path.dirname(os.path.abspath(file_path)))
+
+    def resolve(self, path):
+        return path if os.path.isabs(path) else os.path.join(self.base_dir, path)
+
+    def _template_key(self):
+        digest = hashlib.sha1(json.dumps(self.spec, sort_keys=True).encode('utf-8'))
+        # The files themselves, so replacing the poster or a font renders everything again
+        for path in [self.spec['image']] + [field['font'] for field in self.fields if field.get('font')]:
+            with open(self.resolve(path), 'rb') as file:
+                digest.update(hashlib.sha1(file.read()).digest())
+        return digest.hexdigest()
+
+    def texts(self, values):
+        """The rendered file name and field texts for one contact's placeholder values."""
+        return [self.file_name.format(**values)] + [field['text'].format(**values) for field in self.fields]
+
+
+def _safe_file_name(name):
+    return re.sub(r'[\\/:*?"<>|\r\n]+', '_', name).strip(' .') or 'media'
+
+
+# Per worker process: the template, its base image and the fonts, loaded once
+_worker = {}
+
+
+def _init_worker(spec, base_dir):
+    template = MediaTemplate(spec, base_dir)
+    image = Image.open(template.resolve(spec['image']))
+    image.load()
+    _worker.update(template=template, image=image.convert('RGB'), fonts={})
+
+
+def _font(font_file, size):
+    fonts = _worker['fonts']
+    font = fonts.get((font_file, size))
+    if font is None:
+        try:
+            font = ImageFont.truetype(_worker['template'].resolve(font_file) if font_file else DEFAULT_FONT, size)
+        except OSError:
+            if font_file:
+                raise
+            font = ImageFont.load_default(size)  # No DejaVu font on this machine
+        fonts[(font_file, size)] = font
+    return font
+
+
+def _render(texts, target_path):
+    """Render one file in a worker process."""
+    template = _worker['template']
+    image = _worker['image'].copy()
+    draw = ImageDraw.Draw(image)
+    for field, text in zip(template.fields, texts[1:]):
+        draw.text(tuple(field['position']), text, fill=field.get('color', '#000000'),
+                  font=_font(field.get('font'), int(field.get('size', 32))), anchor=field.get('anchor', 'la'))
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    temp_path = f"{target_path}.{os.getpid()}.tmp"
+    if template.format == 'jpg':
+        image.save(temp_path, FORMATS['jpg'], quality=int(template.spec.get('quality', 90)))
+    else:
+        image.save(temp_path, FORMATS[template.format], resolution=float(template.spec.get('dpi', 150)))
+    os.replace(temp_path, target_path)
+    return target_path
+
+
+class MediaRenderer:
+    """Renders a template for a stream of contacts in a process pool, with a file cache."""
+
+    def __init__(self, template, cache_dir=None, workers=None, ahead=None, values=template_values):
+        self.template = template
+        self.cache_dir = cache_dir or os.path.join(template.base_dir, CACHE_FOLDER)
+        self.workers = workers or os.cpu_count() or 1
+        self.ahead = ahead or self.workers * 8
+        self.values = values
+        self.counts = {'rendered': 0, 'cached': 0, 'failed': 0}
+        self._pool = None
+
+    @classmethod
+    def from_file(cls, template_file, **kwargs):
+        return cls(MediaTemplate.load(template_file), **kwargs)
+
+    def cache_path(self, texts):
+        """File of one rendering: the hash of the template and the texts, then the file name."""
+        key = hashlib.sha1((self.template.key + '\x1f'.join(texts)).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], key, f"{_safe_file_name(texts[0])}.{self.template.format}")
+
+    def _submit(self, contact):
+        """Return (contact, future or None, path, error) for one contact."""
+        try:
+            texts = self.template.texts(self.values(contact))
+        except (KeyError, IndexError, ValueError, AttributeError) as e:
+            return contact, None, None, e  # Only this contact fails, e.g. {name.upper} or a missing column
+        path = self.cache_path(texts)
+        if os.path.exists(path):
+            self.counts['cached'] += 1
+            return contact, None, path, None
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                             initargs=(self.template.spec, self.template.base_dir))
+        return contact, self._pool.submit(_render, texts, path), path, None
+
+    def stream(self, contacts):
+        """
+        Return an iterator of the rendered file of every contact, in order (None when rendering
+        failed). Up to `ahead` contacts are rendered in advance while the caller works on the
+        current one; the first of them are submitted right away, so they render while the
+        caller is still logging in.
+        """
+        contact_iter = iter(contacts)
+        pending = deque()
+        for contact in contact_iter:
+            pending.append(self._submit(contact))
+            if len(pending) >= self.ahead:
+                break
+        return self._results(contact_iter, pending)
+
+    def _results(self, contact_iter, pending):
+        while pending:
+            contact, future, path, error = pending.popleft()
+            next_contact = next(contact_iter, None)
+            if next_contact is not None:
+                pending.append(self._submit(next_contact))
+            if future is not None:
+                try:
+                    future.result()
+                    self.counts['rendered'] += 1
+                except Exception as e:
+                    path, error = None, e
+            if error is not None:
+                self.counts['failed'] += 1
+                path = None
+                log.error("Error rendering media for %s: %s", contact.get('MOBILE'), app_logging.short_error(error),
+                          extra=app_logging.log_fields(contact.get('MOBILE'), stage='render_media'))
+            yield path
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+
+if __name__ == "__main__":
+    import contact_cache
+
+    parser = argparse.ArgumentParser(description="Render the personalized media of a campaign ahead of time.")
+    parser.add_argument('template', help="Media template (JSON).")
+    parser.add_argument('contacts', help="Contacts workbook.")
+    parser.add_argument('--workers', type=int, help="Worker processes (default: all cores).")
+    parser.add_argument('--cache-dir', help="Output folder (default: .media_cache next to the template).")
+    args = parser.parse_args()
+    app_logging.configure_logging()
+
+    contacts = contact_cache.read_contacts_frame(args.contacts).to_dict(orient='records')
+    renderer = MediaRenderer.from_file(args.template, cache_dir=args.cache_dir, workers=args.workers)
+    started = time.perf_counter()
+    try:
+        for _ in renderer.stream(contacts):
+            pass
+    finally:
+        renderer.close()
+    elapsed = time.perf_counter() - started
+    print(f"{len(contacts)} contacts in {elapsed:.1f} s with {renderer.workers} workers: "
+          f"{renderer.counts['rendered']} rendered, {renderer.counts['cached']} cached, "
+          f"{renderer.counts['failed']} failed")
+    print(f"Files are in {renderer.cache_dir}")
+    sys.exit(1 if renderer.counts['failed'] else 0)
@@ -0,0 +1,189 @@
+"""
+Mock Messaging API Server for WhatsApp Sender Application
+
+This module is a local stand-in for the HTTP messaging API used by the API transport
+(transports.HttpApiTransport), so the transport can be developed and benchmarked against the
+browser transport without network access or an API account. It keeps everything in memory
+and simulates request latency and failures.
+
+    POST /v1/media            raw file bytes, X-File-Name header  -> {"id": "media-..."}
+    POST /v1/messages/batch   {"messages": [{"to": "919999999999", "text": "Hello",
+                                             "media": ["media-..."], "client_ref": "5be1..."}]}
+                              -> {"results": [{"client_ref": "5be1...", "status": "accepted", "id": "msg-..."}]}
+                                 or "status": "rejected" with "error" and "retryable"
+    GET  /v1/stats            counters of the run
+
+A message is accepted once per client_ref: sending it again (in any batch) returns the
+result of the first acceptance instead of delivering it twice.
+
+    python mock_api_server.py --port 8780 --latency 0.05 --failure-rate 0.01
+"""
+
+import json
+import time
+import uuid
+import random
+import hashlib
+import argparse
+import threading
+import app_logging
+from local_server import QuietRequestHandler, start_http_server
+
+log = app_logging.get_logger('mock_api_server')
+
+MAX_BATCH_SIZE = 100
+MAX_MEDIA_BYTES = 16 * 1024 * 1024
+
+
+class MockApiState:
+    """Uploaded media, simulated behaviour and counters, shared by all request threads."""
+
+    def __init__(self, latency=0.05, per_message_latency=0.001, failure_rate=0.0, token=None, seed=None):
+        self.latency = latency
+        self.per_message_latency = per_message_latency
+        self.failure_rate = failure_rate
+        self.token = token
+        self.random = random.Random(seed)
+        self.media = {}
+        self.delivered = {}  # client_ref -> result of the accepted message
+        self.stats = {'requests': 0, 'batches': 0, 'messages': 0, 'accepted': 0, 'rejected': 0, 'duplicates': 0,
+                      'media_uploads': 0, 'media_bytes': 0, 'connections': 0}
+        self._lock = threading.Lock()
+
+    def count(self, **increments):
+        with self._lock:
+            for name, value in increments.items():
+                self.stats[name] += value
+
+    def add_media(self, data, file_name, content_type):
+        media_id = f"media-{hashlib.sha1(data).hexdigest()[:16]}"
+        with self._lock:
+            self.media.setdefault(media_id, (file_name, content_type, len(data)))
+            self.stats['media_uploads'] += 1
+            self.stats['media_bytes'] += len(data)
+        return media_id
+
+    def deliver(self, message):
+        """Outcome of one message of a batch."""
+        client_ref = message.get('client_ref')
+        with self._lock:
+            known = self.delivered.get(client_ref) if client_ref else None
+            if known is not None:
+                self.stats['duplicates'] += 1
+                return dict(known, duplicate=True)
+        number = str(message.get('to', ''))
+        if not number.isdigit() or not 8 <= len(number) <= 15:
+            return {'status': 'rejected', 'error': 'invalid_number', 'retryable': False}
+        if not message.get('text') and not message.get('media'):
+            return {'status': 'rejected', 'error': 'empty_message', 'retryable': False}
+        unknown = [media_id for media_id in message.get('media', []) if media_id not in self.media]
+        if unknown:
+            return {'status': 'rejected', 'error': f"unknown_media: {', '.join(unknown)}", 'retryable': False}
+        with self._lock:
+            failed = self.random.random() < self.failure_rate
+        if failed:
+            return {'status': 'rejected', 'error': 'temporarily_unavailable', 'retryable': True}
+        result = {'status': 'accepted', 'id': f"msg-{uuid.uuid4().hex[:16]}"}
+        if client_ref:
+            with self._lock:
+                # Two copies in flight at once: the first one stored wins
+                result = self.delivered.setdefault(client_ref, result)
+        return dict(result)
+
+
+class MockApiRequestHandler(QuietRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive, so the client's connection pool is exercised
+    state = None
+
+    def setup(self):
+        super().setup()
+        self.state.count(connections=1)
+
+    def _read_body(self, limit):
+        length = int(self.headers.get('Content-Length', 0))
+        if length > limit:
+            self.rfile.read(length)  # Drain it so the connection can be reused
+            return None
+        return self.rfile.read(length)
+
+    def _authorized(self):
+        if self.state.token and self.headers.get('Authorization') != f"Bearer {self.state.token}":
+            self._send_json(401, {'error': 'Unauthorized'})
+            return False
+        return True
+
+    def do_POST(self):
+        self.state.count(requests=1)
+        if not self._authorized():
+            return
+        path = self.path.rstrip('/')
+        if path == '/v1/media':
+            data = self._read_body(MAX_MEDIA_BYTES)
+            if data is None:
+                self._send_json(413, {'error': f"Media larger than {MAX_MEDIA_BYTES} bytes"})
+                return
+            media_id = self.state.add_media(data, self.headers.get('X-File-Name', ''),
+                                            self.headers.get('Content-Type', 'application/octet-stream'))
+            time.sleep(self.state.latency)
+            self._send_json(201, {'id': media_id})
+            return
+        if path == '/v1/messages/batch':
+            try:
+                messages = json.loads(self._read_body(MAX_MEDIA_BYTES) or b'{}').get('messages', [])
+            except ValueError as e:
+                self._send_json(400, {'error': f"Invalid JSON: {e}"})
+                return
+            if len(messages) > MAX_BATCH_SIZE:
+                self._send_json(413, {'error': f"At most {MAX_BATCH_SIZE} messages per batch"})
+                return
+            results = []
+            for message in messages:
+                result = self.state.deliver(message)
+                result['client_ref'] = message.get('client_ref')
+                results.append(result)
+            accepted = sum(1 for result in results if result['status'] == 'accepted' and not result.get('duplicate'))
+            rejected = sum(1 for result in results if result['status'] == 'rejected')
+            self.state.count(batches=1, messages=len(messages), accepted=accepted, rejected=rejected)
+            time.sleep(self.state.latency + self.state.per_message_latency * len(messages))
+            self._send_json(200, {'results': results})
+            return
+        self._send_json(404, {'error': 'Not found'})
+
+    def do_GET(self):
+        self.state.count(requests=1)
+        if not self._authorized():
+            return
+        if self.path.rstrip('/') == '/v1/stats':
+            with self.state._lock:
+                stats = dict(self.state.stats, media_stored=len(self.state.media))
+            self._send_json(200, stats)
+            return
+        self._send_json(404, {'error': 'Not found'})
+
+
+def start_mock_server(state=None, host='127.0.0.1', port=8780):
+    """Start the mock API in a background thread and return the server (port 0 picks a free port)."""
+    state = state or MockApiState()
+    server = start_http_server(MockApiRequestHandler, host, port, name='mock-api', state=state)
+    log.info("Mock messaging API listening on http://%s:%s/v1", host, server.server_address[1])
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local mock of the messaging API.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8780)
+    parser.add_argument('--latency', type=float, default=0.05, help="Seconds added to every request.")
+    parser.add_argument('--per-message-latency', type=float, default=0.001, help="Seconds added per batched message.")
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="Share of messages rejected as retryable.")
+    parser.add_argument('--token', help="Require this bearer token.")
+    args = parser.parse_args()
+    app_logging.configure_logging()
+
+    server = start_mock_server(MockApiState(args.latency, args.per_message_latency, args.failure_rate, args.token),
+                               args.host, args.port)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
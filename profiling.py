@@ -0,0 +1,185 @@
+"""
+Profiling Module for WhatsApp Sender Application
+
+This module profiles a whole campaign run to show where the time goes: loading contacts,
+file backups, Python overhead or WebDriver round trips. It offers:
+
+- cProfile over the whole run (written as .pstats, readable by snakeviz, flameprof or
+  gprof2dot), or a low-overhead sampling profiler that writes collapsed stacks for
+  flamegraph.pl / speedscope
+- tracemalloc snapshots at checkpoints (after loading contacts, every N contacts, at shutdown)
+- a count of WebDriver commands per contact
+
+All output files are written next to the run output with a common timestamp, together with a
+short text report of the top functions, memory checkpoints and command counts.
+"""
+
+import os
+import sys
+import time
+import pstats
+import cProfile
+import datetime
+import threading
+import tracemalloc
+from collections import Counter
+
+import app_logging
+
+log = app_logging.get_logger('profiling')
+
+MODE_CPROFILE = 'cprofile'
+MODE_SAMPLE = 'sample'
+
+
+class SamplingProfiler:
+    """Samples the stack of one thread at a fixed interval and counts collapsed stacks."""
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def write_collapsed(self, file_path):
+        with open(file_path, 'w', encoding='utf-8') as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f"{stack} {count}\n")
+
+    def top_functions(self, top):
+        """Return (frame, self samples) for the frames most often on top of the stack."""
+        leaf_counts = Counter()
+        for stack, count in self.stacks.items():
+            leaf_counts[stack.rsplit(';', 1)[-1]] += count
+        return leaf_counts.most_common(top)
+
+
+class RunProfiler:
+    """Profiles one campaign run. Call start() before the run and stop() at the end."""
+
+    def __init__(self, output_dir, mode=MODE_CPROFILE, memory_every=500, top=25):
+        self.output_dir = output_dir
+        self.mode = mode
+        self.memory_every = memory_every
+        self.top = top
+        self.prefix = os.path.join(output_dir, f"profile_{datetime.datetime.now():%Y%m%d_%H%M%S}")
+        self.memory_checkpoints = []
+        self.command_counts = Counter()
+        self.commands_per_contact = []
+        self._contact_commands = None
+        self._contacts_done = 0
+        self._started = None
+        self._profile = None
+        self._sampler = None
+        self._first_snapshot = None
+
+    def start(self):
+        self._started = time.perf_counter()
+        tracemalloc.start()
+        self._first_snapshot = tracemalloc.take_snapshot()
+        if self.mode == MODE_SAMPLE:
+            self._sampler = SamplingProfiler(threading.get_ident())
+            self._sampler.start()
+        else:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    def checkpoint(self, label):
+        """Record current and peak traced memory plus the biggest growth since start."""
+        # Snapshot comparison is slow; keep it out of the CPU profile
+        if self._profile is not None:
+            self._profile.disable()
+        current, peak = tracemalloc.get_traced_memory()
+        growth = tracemalloc.take_snapshot().compare_to(self._first_snapshot, 'lineno')[:5]
+        self.memory_checkpoints.append((label, current, peak, [str(stat) for stat in growth]))
+        if self._profile is not None:
+            self._profile.enable()
+
+    def instrument_driver(self, driver):
+        """Count every WebDriver command the driver (and its elements) sends to chromedriver."""
+        execute = driver.execute
+
+        def counting_execute(driver_command, params=None):
+            self.command_counts[driver_command] += 1
+            if self._contact_commands is not None:
+                self._contact_commands += 1
+            return execute(driver_command, params)
+
+        # Elements call their parent's execute, so one instance attribute covers them too
+        driver.execute = counting_execute
+        return driver
+
+    def begin_contact(self):
+        self._contact_commands = 0
+
+    def end_contact(self):
+        if self._contact_commands is not None:
+            self.commands_per_contact.append(self._contact_commands)
+        self._contact_commands = None
+        self._contacts_done += 1
+        if self.memory_every and self._contacts_done % self.memory_every == 0:
+            self.checkpoint(f"after {self._contacts_done} contacts")
+
+    def stop(self):
+        """Stop profiling and write the profile files and the text report."""
+        elapsed = time.perf_counter() - self._started
+        self.checkpoint("shutdown")
+        tracemalloc.stop()
+
+        lines = [f"Run time: {elapsed:.1f} s, contacts processed: {self._contacts_done}", ""]
+        if self._profile is not None:
+            self._profile.disable()
+            profile_path = self.prefix + ".pstats"
+            self._profile.dump_stats(profile_path)
+            lines.append(f"cProfile data: {profile_path}")
+            lines.append(f"Top {self.top} functions by cumulative time:")
+            stats = pstats.Stats(self._profile)
+            for (file_name, line, function), (_, calls, total, cumulative, _) in \
+                    sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:self.top]:
+                lines.append(f"  {cumulative:9.3f} s cum {total:9.3f} s self {calls:8d} calls  "
+                             f"{function} ({os.path.basename(file_name)}:{line})")
+        if self._sampler is not None:
+            self._sampler.stop()
+            collapsed_path = self.prefix + ".collapsed"
+            self._sampler.write_collapsed(collapsed_path)
+            lines.append(f"Collapsed stacks (flamegraph.pl / speedscope): {collapsed_path}")
+            lines.append(f"Top {self.top} frames by samples:")
+            for frame, count in self._sampler.top_functions(self.top):
+                lines.append(f"  {count:8d}  {frame}")
+
+        lines += ["", "Memory checkpoints (tracemalloc):"]
+        for label, current, peak, growth in self.memory_checkpoints:
+            lines.append(f"  {label}: current {current / 1e6:.1f} MB, peak {peak / 1e6:.1f} MB")
+            lines += [f"    {stat}" for stat in growth]
+
+        lines += ["", "WebDriver commands:"]
+        if self.commands_per_contact:
+            per_contact = self.commands_per_contact
+            lines.append(f"  per contact: avg {sum(per_contact) / len(per_contact):.1f}, max {max(per_contact)}")
+        for command, count in self.command_counts.most_common(self.top):
+            lines.append(f"  {count:8d}  {command}")
+
+        report_path = self.prefix + ".txt"
+        with open(report_path, 'w', encoding='utf-8') as file:
+            file.write('\n'.join(lines) + '\n')
+        log.info("Profile report written to %s", report_path)
+        return report_path
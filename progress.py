@@ -0,0 +1,213 @@
+"""
+Progress Module for WhatsApp Sender Application
+
+This module keeps live progress figures for a running campaign or daemon:
+
+- messages per minute over sliding windows (1, 5 and 15 minutes)
+- counts by status (sent, partial, failed) and by failure class
+- the state of each browser session (logging in, sending, idle, ...) for multi-session runs
+- an ETA for the remaining contacts based on recent throughput
+
+The figures are printed as a compact status line every minute and can be served on a local
+HTTP port: GET /status returns JSON and GET /metrics returns Prometheus text format, so a
+monitoring system can scrape a multi-hour run. Recording a result only appends a timestamp to a
+bounded deque and bumps a few counters, so progress tracking is cheap enough for every run.
+"""
+
+import json
+import time
+import threading
+from collections import Counter, deque
+import app_logging
+from local_server import QuietRequestHandler, start_http_server
+
+log = app_logging.get_logger('progress')
+
+RATE_WINDOWS = (60, 300, 900)  # Seconds
+ETA_WINDOW = 300
+
+
+def format_duration(seconds):
+    if seconds is None:
+        return '-'
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}h{minutes:02d}m"
+    return f"{minutes}m{seconds:02d}s"
+
+
+class SessionState:
+    __slots__ = ('name', 'state', 'since', 'processed', 'failed')
+
+    def __init__(self, name, state, since):
+        self.name = name
+        self.state = state
+        self.since = since
+        self.processed = 0
+        self.failed = 0
+
+
+class ProgressTracker:
+    """Thread-safe live progress of one run. Call record() once per processed contact."""
+
+    def __init__(self, total=0, windows=RATE_WINDOWS, print_interval=60):
+        self.total = total
+        self.windows = tuple(sorted(windows))
+        self.print_interval = print_interval
+        self.processed = 0
+        self.status_counts = Counter()
+        self.failure_counts = Counter()
+        self.sessions = {}
+        self._started = time.monotonic()
+        self._events = deque()  # Monotonic times of processed contacts within the longest window
+        self._last_print = self._started
+        self._lock = threading.Lock()
+
+    def set_total(self, total):
+        with self._lock:
+            self.total = total
+
+    def add_total(self, count):
+        """Raise the number of expected contacts (re-sends, contacts added to the daemon, ...)."""
+        with self._lock:
+            self.total += count
+
+    def set_session_state(self, session, state):
+        with self._lock:
+            entry = self.sessions.get(session)
+            if entry is None:
+                self.sessions[session] = SessionState(session, state, time.monotonic())
+            elif entry.state != state:
+                entry.state = state
+                entry.since = time.monotonic()
+
+    def record(self, result, session='main'):
+        """Count one processed contact. result is a SendResult (or any bool-like outcome)."""
+        now = time.monotonic()
+        with self._lock:
+            self.processed += 1
+            self.status_counts[getattr(result, 'status', 'sent' if result else 'failed')] += 1
+            failure_class = getattr(result, 'failure_class', None)
+            if failure_class:
+                self.failure_counts[failure_class] += 1
+            entry = self.sessions.get(session)
+            if entry is None:
+                entry = self.sessions[session] = SessionState(session, 'sending', now)
+            entry.processed += 1
+            if not result:
+                entry.failed += 1
+            self._events.append(now)
+            self._trim(now)
+            print_due = self.print_interval and now - self._last_print >= self.print_interval
+            if print_due:
+                self._last_print = now
+        if print_due:
+            log.info("%s", self.status_line(), extra=app_logging.log_fields(stage='progress', session=session))
+
+    def _trim(self, now):
+        horizon = now - self.windows[-1]
+        while self._events and self._events[0] < horizon:
+            self._events.popleft()
+
+    def _rate(self, now, window):
+        # A run younger than the window is measured over its actual age
+        span = min(window, now - self._started)
+        if span <= 0:
+            return 0.0
+        horizon = now - window
+        count = 0
+        for event in reversed(self._events):
+            if event < horizon:
+                break
+            count += 1
+        return count * 60.0 / span
+
+    def snapshot(self):
+        """Return the current figures as a JSON-serialisable dict."""
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            rates = {f"{window // 60}m": round(self._rate(now, window), 2) for window in self.windows}
+            eta_rate = self._rate(now, ETA_WINDOW)
+            remaining = max(0, self.total - self.processed)
+            if not remaining:
+                eta = 0
+            else:
+                eta = remaining * 60.0 / eta_rate if eta_rate else None
+            return {
+                'total': self.total,
+                'processed': self.processed,
+                'remaining': remaining,
+                'elapsed_seconds': round(now - self._started, 1),
+                'messages_per_minute': rates,
+                'eta_seconds': None if eta is None else round(eta),
+                'status': dict(self.status_counts),
+                'failures': dict(self.failure_counts),
+                'sessions': {
+                    entry.name: {'state': entry.state, 'state_seconds': round(now - entry.since, 1),
+                                 'processed': entry.processed, 'failed': entry.failed}
+                    for entry in self.sessions.values()
+                },
+            }
+
+    def status_line(self):
+        """One compact terminal line, e.g. '[1200/5000] 4.1/min (5m) sent 1180 failed 20 ETA 15h27m'."""
+        snapshot = self.snapshot()
+        rate = snapshot['messages_per_minute'].get(f"{ETA_WINDOW // 60}m", 0.0)
+        parts = [f"[{snapshot['processed']}/{snapshot['total']}]", f"{rate:.1f}/min ({ETA_WINDOW // 60}m)"]
+        parts += [f"{status} {count}" for status, count in sorted(snapshot['status'].items())]
+        if snapshot['failures']:
+            parts.append('(' + ', '.join(f"{name} {count}" for name, count in sorted(snapshot['failures'].items())) + ')')
+        parts.append(f"ETA {format_duration(snapshot['eta_seconds'])}")
+        if len(snapshot['sessions']) > 1:
+            parts.append(' '.join(f"{name}:{session['state']}" for name, session in snapshot['sessions'].items()))
+        return ' '.join(parts)
+
+    def prometheus_metrics(self):
+        snapshot = self.snapshot()
+        lines = [
+            '# TYPE whatsapp_sender_contacts_total gauge',
+            f"whatsapp_sender_contacts_total {snapshot['total']}",
+            '# TYPE whatsapp_sender_processed_total counter',
+            f"whatsapp_sender_processed_total {snapshot['processed']}",
+            '# TYPE whatsapp_sender_messages_per_minute gauge',
+        ]
+        lines += [f'whatsapp_sender_messages_per_minute{{window="{window}"}} {rate}'
+                  for window, rate in snapshot['messages_per_minute'].items()]
+        lines.append('# TYPE whatsapp_sender_eta_seconds gauge')
+        lines.append(f"whatsapp_sender_eta_seconds {snapshot['eta_seconds'] if snapshot['eta_seconds'] is not None else 'NaN'}")
+        lines.append('# TYPE whatsapp_sender_results_total counter')
+        lines += [f'whatsapp_sender_results_total{{status="{status}"}} {count}'
+                  for status, count in snapshot['status'].items()]
+        lines.append('# TYPE whatsapp_sender_failures_total counter')
+        lines += [f'whatsapp_sender_failures_total{{class="{name}"}} {count}'
+                  for name, count in snapshot['failures'].items()]
+        lines.append('# TYPE whatsapp_sender_session_processed_total counter')
+        lines += [f'whatsapp_sender_session_processed_total{{session="{name}"}} {session["processed"]}'
+                  for name, session in snapshot['sessions'].items()]
+        lines.append('# TYPE whatsapp_sender_session_state gauge')
+        lines += [f'whatsapp_sender_session_state{{session="{name}",state="{session["state"]}"}} 1'
+                  for name, session in snapshot['sessions'].items()]
+        return '\n'.join(lines) + '\n'
+
+
+class StatusRequestHandler(QuietRequestHandler):
+    tracker = None
+
+    def do_GET(self):
+        path = self.path.rstrip('/')
+        if path in ('', '/status'):
+            self._send(200, 'application/json', json.dumps(self.tracker.snapshot()).encode('utf-8'))
+        elif path == '/metrics':
+            self._send(200, 'text/plain; version=0.0.4', self.tracker.prometheus_metrics().encode('utf-8'))
+        else:
+            self._send_json(404, {'error': 'Not found'})
+
+
+def start_status_server(tracker, host='127.0.0.1', port=8766):
+    """Serve the tracker's figures in a background thread and return the server."""
+    server = start_http_server(StatusRequestHandler, host, port, name='status-api', tracker=tracker)
+    log.info("Status available on http://%s:%s/status and /metrics", host, port)
+    return server
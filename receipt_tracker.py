@@ -0,0 +1,161 @@
+"""
+Receipt Tracker Module for WhatsApp Sender Application
+
+This module follows up on messages after the send button was clicked. The send functions only
+know that the click happened; the tick next to the message tells whether it is still pending
+(clock), sent (one tick), delivered (two ticks) or read (blue ticks).
+
+Instead of reopening every chat, the tracker reads the chat list in the side pane, which shows
+the tick state of the last message of every recent chat. That takes a single script call in
+whatever chat is open, so it fits in the delay the send loop already waits between contacts
+and does not slow sending down. Messages whose clock icon was seen and stays for too long are
+handed back to the send loop for one more attempt. A message whose chat is not in the list
+(e.g. it scrolled out on a busy account) stays unknown and is never re-sent, since it may well
+have been delivered.
+"""
+
+import time
+from collections import OrderedDict
+
+from contact_utils import normalize_mobile
+import app_logging
+
+log = app_logging.get_logger('receipt_tracker')
+
+RECEIPT_UNKNOWN = 'unknown'  # The chat has not been seen in the chat list yet
+RECEIPT_PENDING = 'pending'
+RECEIPT_SENT = 'sent'
+RECEIPT_DELIVERED = 'delivered'
+RECEIPT_READ = 'read'
+
+# Collect (chat title, tick icon, tick label) for every chat row in the side pane
+CHAT_LIST_SCRIPT = """
+const rows = document.querySelectorAll('#pane-side [role="listitem"], #pane-side [role="row"]');
+return Array.from(rows).map(row => {
+    const title = row.querySelector('span[title]');
+    const icon = row.querySelector('span[data-icon^="status-"], span[data-icon^="msg-"]');
+    return [
+        title ? title.getAttribute('title') : '',
+        icon ? icon.getAttribute('data-icon') : '',
+        icon ? (icon.getAttribute('aria-label') || '') : ''
+    ];
+});
+"""
+
+
+def receipt_from_icon(icon, label):
+    """Translate a WhatsApp Web tick icon into a receipt state, or None if it is not a tick."""
+    icon = icon.replace('status-', '').replace('msg-', '')
+    if icon == 'time':
+        return RECEIPT_PENDING
+    if icon == 'check':
+        return RECEIPT_SENT
+    if icon == 'dblcheck':
+        return RECEIPT_READ if 'read' in label.lower() else RECEIPT_DELIVERED
+    return None
+
+
+class TrackedMessage:
+    __slots__ = ('contact', 'sent_at', 'receipt')
+
+    def __init__(self, contact, sent_at):
+        self.contact = contact
+        self.sent_at = sent_at
+        self.receipt = RECEIPT_UNKNOWN
+
+
+class ReceiptTracker:
+    """
+    Tracks the receipt state of sent messages.
+
+    pending_timeout: seconds a message may show the clock icon before it is queued for re-send.
+    max_age: seconds after which a message is no longer followed (it has scrolled out of
+    the chat list by then on busy accounts).
+    """
+
+    def __init__(self, report_writer=None, pending_timeout=300, max_age=3600, max_resends=1):
+        self.report_writer = report_writer
+        self.pending_timeout = pending_timeout
+        self.max_age = max_age
+        self.max_resends = max_resends
+        self._messages = OrderedDict()
+        self._resends = []
+        self._resend_counts = {}
+        self.counts = {RECEIPT_UNKNOWN: 0, RECEIPT_PENDING: 0, RECEIPT_SENT: 0, RECEIPT_DELIVERED: 0,
+                       RECEIPT_READ: 0}
+
+    def track(self, contact):
+        """Start following the message just sent to contact."""
+        mobile = normalize_mobile(contact['MOBILE'])
+        self._messages.pop(mobile, None)
+        self._messages[mobile] = TrackedMessage(contact, time.monotonic())
+
+    def has_pending(self):
+        # Only messages seen with the clock icon; chats that were never found are not waited for
+        return any(message.receipt == RECEIPT_PENDING for message in self._messages.values())
+
+    def poll(self, driver):
+        """Read tick states from the chat list and update the tracked messages."""
+        if not self._messages:
+            return
+        try:
+            rows = driver.execute_script(CHAT_LIST_SCRIPT) or []
+        except Exception as e:
+            log.error("Error reading delivery receipts: %s", e)
+            return
+
+        for title, icon, label in rows:
+            receipt = receipt_from_icon(icon or '', label or '')
+            if receipt is None:
+                continue
+            message = self._find(title)
+            if message is not None and message.receipt != receipt:
+                message.receipt = receipt
+                if self.report_writer:
+                    self.report_writer.record_receipt(message.contact, receipt)
+
+        self._expire()
+
+    def _find(self, title):
+        # Unsaved numbers are shown as e.g. '+91 99999 00001', saved contacts by name
+        message = self._messages.get(normalize_mobile(title))
+        if message is not None:
+            return message
+        for message in self._messages.values():
+            if str(message.contact.get('NAME', '')).strip() == title.strip():
+                return message
+        return None
+
+    def _expire(self):
+        now = time.monotonic()
+        for mobile in list(self._messages):
+            message = self._messages[mobile]
+            age = now - message.sent_at
+            # Only a clock icon actually seen counts as stuck; an unseen chat may well be delivered
+            if message.receipt == RECEIPT_PENDING and age > self.pending_timeout:
+                del self._messages[mobile]
+                self.counts[RECEIPT_PENDING] += 1
+                if self._resend_counts.get(mobile, 0) < self.max_resends:
+                    self._resend_counts[mobile] = self._resend_counts.get(mobile, 0) + 1
+                    self._resends.append(message.contact)
+                    log.info("Message to %s is still pending. Queued for re-send.", message.contact['MOBILE'],
+                             extra=app_logging.log_fields(message.contact, stage='receipts'))
+            elif message.receipt == RECEIPT_READ or age > self.max_age:
+                del self._messages[mobile]
+                self.counts[message.receipt] += 1
+
+    def has_resends(self):
+        return bool(self._resends)
+
+    def take_resends(self):
+        """Return the contacts whose messages got stuck pending and clear the list."""
+        resends, self._resends = self._resends, []
+        return resends
+
+    def idle(self, driver, seconds):
+        """Spend an idle period (e.g. the delay between contacts) polling receipts."""
+        deadline = time.monotonic() + seconds
+        self.poll(driver)
+        remaining = deadline - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
@@ -0,0 +1,312 @@
+"""
+Campaign Scheduler Module for WhatsApp Sender Application
+
+This module lets a single, already logged-in WhatsApp Web session work through several
+campaigns at once. Every campaign has its own contacts file, message template, attachments,
+priority and allowed sending windows (in its own time zone). Campaigns that are inside their
+window share the send capacity in proportion to their priority, so a big low-priority list
+never starves a small urgent one and vice versa.
+"""
+
+import os
+import json
+import heapq
+import datetime
+import threading
+from zoneinfo import ZoneInfo
+
+import app_logging
+
+log = app_logging.get_logger('scheduler')
+
+DAY_NAMES = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']
+
+
+def parse_window(window):
+    """Parse a window such as {"days": "mon-fri", "start": "09:00", "end": "18:00"}."""
+    start = datetime.time.fromisoformat(window.get('start', '00:00'))
+    end = datetime.time.fromisoformat(window.get('end', '23:59'))
+
+    days = set()
+    for part in str(window.get('days', 'mon-sun')).lower().split(','):
+        part = part.strip()
+        if '-' in part:
+            first, last = (DAY_NAMES.index(day.strip()[:3]) for day in part.split('-', 1))
+            day = first
+            while True:
+                days.add(day)
+                if day == last:
+                    break
+                day = (day + 1) % 7
+        elif part:
+            days.add(DAY_NAMES.index(part[:3]))
+    return SendWindow(start, end, days)
+
+
+class SendWindow:
+    """A daily time range, limited to some days of the week, in local campaign time."""
+
+    def __init__(self, start, end, days=None):
+        self.start = start
+        self.end = end
+        self.days = set(range(7)) if days is None else set(days)
+
+    def contains(self, local_dt):
+        if local_dt.weekday() not in self.days:
+            return False
+        current = local_dt.time()
+        if self.start <= self.end:
+            return self.start <= current < self.end
+        # Window crossing midnight, e.g. 22:00 - 02:00
+        return current >= self.start or current < self.end
+
+    def next_open(self, local_dt):
+        """Return the next local datetime (>= local_dt) at which this window is open."""
+        if self.contains(local_dt):
+            return local_dt
+        for offset in range(8):
+            day = (local_dt + datetime.timedelta(days=offset)).date()
+            if day.weekday() not in self.days:
+                continue
+            candidate = datetime.datetime.combine(day, self.start, tzinfo=local_dt.tzinfo)
+            if candidate >= local_dt:
+                return candidate
+        return None
+
+
+class Campaign:
+    """One list of contacts to message with a template and optional attachments."""
+
+    def __init__(self, name, contacts, message_template, attachment_paths=None,
+                 priority=1, windows=None, timezone='UTC'):
+        if priority < 1:
+            raise ValueError(f"Campaign '{name}': priority must be 1 or higher.")
+        self.name = name
+        self.contacts = contacts
+        self.message_template = message_template
+        self.attachment_paths = attachment_paths or []
+        self.priority = priority
+        self.windows = windows or []
+        self.timezone = ZoneInfo(timezone)
+        self.position = 0
+        self.sent = 0
+        self.failed = 0
+        self.virtual_time = 0.0
+
+    def remaining(self):
+        return len(self.contacts) - self.position
+
+    def is_finished(self):
+        return self.position >= len(self.contacts)
+
+    def is_open(self, now):
+        """Check whether the campaign may send at the given aware datetime."""
+        if not self.windows:
+            return True
+        local_now = now.astimezone(self.timezone)
+        return any(window.contains(local_now) for window in self.windows)
+
+    def next_open(self, now):
+        """Return the next aware datetime at which the campaign may send."""
+        if not self.windows:
+            return now
+        local_now = now.astimezone(self.timezone)
+        candidates = [window.next_open(local_now) for window in self.windows]
+        candidates = [candidate for candidate in candidates if candidate is not None]
+        return min(candidates) if candidates else None
+
+    def take_next_contact(self):
+        contact = self.contacts[self.position]
+        self.position += 1
+        return contact
+
+
+class CampaignScheduler:
+    """
+    Weighted fair queue of campaigns.
+
+    Every campaign carries a virtual time that grows by 1/priority for each contact it sends.
+    The open campaign with the smallest virtual time goes next, which interleaves campaigns
+    and gives each one a share of the sends proportional to its priority.
+
+    Campaigns may be added from other threads (e.g. the job API); adding one wakes up an
+    idle run() loop straight away.
+    """
+
+    def __init__(self):
+        self._queue = []
+        self._sleeping = []
+        self._counter = 0
+        self._virtual_time = 0.0
+        self._lock = threading.RLock()
+        self._wakeup = threading.Event()
+        self.campaigns = {}
+        self.removed_contacts = 0  # Contacts of campaigns taken off the scheduler, for progress totals
+
+    def add_campaign(self, campaign):
+        with self._lock:
+            if campaign.name in self.campaigns:
+                log.info("Campaign '%s' is already scheduled. Skipping.", campaign.name)
+                return False
+            # A campaign joining late starts at the current virtual time instead of getting a burst
+            campaign.virtual_time = max(campaign.virtual_time, self._virtual_time)
+            self.campaigns[campaign.name] = campaign
+            self._push(campaign)
+        self._wakeup.set()
+        log.info("Scheduled campaign '%s' (%s contacts, priority %s)", campaign.name, len(campaign.contacts),
+                 campaign.priority, extra=app_logging.log_fields(campaign=campaign.name))
+        return True
+
+    def remove_campaign(self, name):
+        """Forget a campaign, e.g. a finished job, so a long-running daemon does not keep every one."""
+        with self._lock:
+            campaign = self.campaigns.pop(name, None)
+            if campaign is None:
+                return False
+            self.removed_contacts += len(campaign.contacts)
+            self._sleeping = [(wake_at, sleeping) for wake_at, sleeping in self._sleeping if sleeping is not campaign]
+        return True
+
+    def total_contacts(self):
+        """Contacts of all campaigns scheduled so far, including removed ones."""
+        with self._lock:
+            return self.removed_contacts + sum(len(campaign.contacts) for campaign in self.campaigns.values())
+
+    def _push(self, campaign):
+        self._counter += 1
+        heapq.heappush(self._queue, (campaign.virtual_time, self._counter, campaign))
+
+    def _wake_sleeping(self, now):
+        still_sleeping = []
+        for wake_at, campaign in self._sleeping:
+            if wake_at is not None and wake_at <= now:
+                campaign.virtual_time = max(campaign.virtual_time, self._virtual_time)
+                self._push(campaign)
+            else:
+                still_sleeping.append((wake_at, campaign))
+        self._sleeping = still_sleeping
+
+    def next_send(self, now=None):
+        """Return (campaign, contact) for the next send, or None when nothing may send now."""
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+        with self._lock:
+            self._wake_sleeping(now)
+
+            while self._queue:
+                _, _, campaign = heapq.heappop(self._queue)
+                if campaign.is_finished() or self.campaigns.get(campaign.name) is not campaign:
+                    continue
+                if not campaign.is_open(now):
+                    self._sleeping.append((campaign.next_open(now), campaign))
+                    continue
+
+                contact = campaign.take_next_contact()
+                self._virtual_time = campaign.virtual_time
+                campaign.virtual_time += 1.0 / campaign.priority
+                self._push(campaign)
+                return campaign, contact
+            return None
+
+    def seconds_until_next_window(self, now=None):
+        """Seconds until the earliest sleeping campaign opens, or None if none is waiting."""
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+        with self._lock:
+            wake_times = [wake_at for wake_at, campaign in self._sleeping
+                          if wake_at is not None and not campaign.is_finished()]
+        if not wake_times:
+            return None
+        return max(0.0, (min(wake_times) - now).total_seconds())
+
+    def has_work(self):
+        with self._lock:
+            return any(not campaign.is_finished() for campaign in self.campaigns.values())
+
+    def run(self, send_contact, on_idle=None, poll_interval=30, stop_when_empty=False, on_error=None):
+        """
+        Daemon loop: send contacts one at a time until stopped.
+
+        send_contact(campaign, contact) performs the actual send and returns its SendResult (or
+        anything that is true on success).
+        on_idle() is called whenever there is nothing to send, e.g. to keep the session warm
+        or to pick up new campaigns. An exception from send_contact counts as a failed send
+        and is passed to on_error(campaign, contact, error), so one bad contact does not stop
+        every campaign.
+        """
+        while True:
+            picked = self.next_send()
+            if picked is None:
+                if stop_when_empty and not self.has_work():
+                    log.info("All campaigns are finished.")
+                    return
+                if on_idle:
+                    on_idle()
+                wait = self.seconds_until_next_window()
+                self._wakeup.wait(poll_interval if wait is None else min(wait, poll_interval))
+                self._wakeup.clear()
+                continue
+
+            campaign, contact = picked
+            try:
+                success = send_contact(campaign, contact)
+            except Exception as e:
+                log.error("Error sending to %s in campaign '%s': %s", contact.get('MOBILE'), campaign.name,
+                          app_logging.short_error(e), exc_info=e,
+                          extra=app_logging.log_fields(contact, campaign=campaign.name))
+                success = False
+                if on_error:
+                    on_error(campaign, contact, e)
+            if success:
+                campaign.sent += 1
+            else:
+                campaign.failed += 1
+            if campaign.is_finished():
+                log.info("Campaign '%s' finished: %s sent, %s failed.", campaign.name, campaign.sent, campaign.failed)
+
+
+def load_campaigns(config_file, load_contacts, load_message_template, skip_names=()):
+    """
+    Build campaigns from a JSON config file.
+
+    The file holds a list of campaigns, for example:
+    [{"name": "joiners", "contacts": "contacts.xlsx", "template": "Message.txt",
+      "attachments": ["Good morning.pdf"], "priority": 2, "timezone": "Asia/Kolkata",
+      "windows": [{"days": "mon-fri", "start": "09:30", "end": "18:00"}]}]
+    Relative paths are resolved against the folder of the config file. Campaigns named in
+    skip_names are not loaded again.
+    """
+    base_path = os.path.dirname(os.path.abspath(config_file))
+    try:
+        with open(config_file, 'r', encoding='utf-8') as file:
+            entries = json.load(file)
+    except Exception as e:
+        log.error("Error reading campaign config: %s", e)
+        return []
+
+    campaigns = []
+    for entry in entries:
+        name = entry.get('name') or os.path.basename(entry.get('contacts', ''))
+        if name in skip_names:
+            continue
+        try:
+            contacts = load_contacts(os.path.join(base_path, entry['contacts']))
+            message_template = load_message_template(os.path.join(base_path, entry['template']))
+            if not contacts or not message_template:
+                log.warning("Campaign '%s' has no contacts or template. Skipping.", name)
+                continue
+            attachment_paths = [os.path.join(base_path, path) for path in entry.get('attachments', [])]
+            missing = [path for path in attachment_paths if not os.path.exists(path)]
+            if missing:
+                log.warning("Campaign '%s' is missing attachments: %s. Skipping.", name, ', '.join(missing))
+                continue
+            campaigns.append(Campaign(
+                name=name,
+                contacts=contacts,
+                message_template=message_template,
+                attachment_paths=attachment_paths,
+                priority=int(entry.get('priority', 1)),
+                windows=[parse_window(window) for window in entry.get('windows', [])],
+                timezone=entry.get('timezone', 'UTC'),
+            ))
+        except Exception as e:
+            log.error("Error loading campaign '%s': %s", name, e)
+    return campaigns
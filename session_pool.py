@@ -0,0 +1,249 @@
+"""
+Session Pool Module for WhatsApp Sender Application
+
+This module sends one contact list through several browser sessions at once. Every session is
+a WhatsApp Web login with its own persistent Chrome profile and runs either locally or on a
+remote WebDriver endpoint: a Selenium Grid hub or a standalone-chrome container. Capacity then
+grows by adding grid nodes instead of RAM on one machine.
+
+Sessions are described in a JSON file:
+
+    [{"name": "hr-1", "remote_url": "http://grid:4444", "node": "node-a", "profile_dir": "/profiles/hr-1"},
+     {"name": "hr-2", "remote_url": "http://grid:4444", "node": "node-b", "profile_dir": "/profiles/hr-2"},
+     {"name": "desk", "profile_dir": "C:/wa-profiles/desk"}]
+
+A WhatsApp login lives in the Chrome profile on the machine that runs the browser, so every
+session is pinned to its node. The "node" value is sent as the wa:node capability; give each
+grid node the same value in its stereotype, for example
+--driver-configuration stereotype='{"browserName": "chrome", "wa:node": "node-a"}',
+and Selenium Grid only places the session on that node.
+
+The sessions share one queue of contacts. When a node goes away, the contact in flight is put
+back at the front of the queue for the other sessions, and the session tries to reconnect to
+its node a few times before giving up. A session that finds the queue empty waits until no
+contact is in flight any more, so it can still pick up one put back by a lost session.
+"""
+
+import json
+import threading
+from collections import deque
+from selenium import webdriver
+
+import app_logging
+
+log = app_logging.get_logger('session_pool')
+
+NODE_CAPABILITY = 'wa:node'
+STATE_STARTING = 'starting'
+STATE_SENDING = 'sending'
+STATE_RECONNECTING = 'reconnecting'
+STATE_LOST = 'lost'
+STATE_DONE = 'done'
+
+
+class SessionSpec:
+    """Where one session runs and which Chrome profile it uses."""
+
+    def __init__(self, name, remote_url=None, node=None, profile_dir=None):
+        self.name = name
+        self.remote_url = remote_url
+        self.node = node
+        self.profile_dir = profile_dir
+
+    @classmethod
+    def from_dict(cls, entry):
+        return cls(entry['name'], entry.get('remote_url'), entry.get('node'), entry.get('profile_dir'))
+
+
+def load_session_specs(file_path):
+    """Read the session list from a JSON file."""
+    with open(file_path, 'r', encoding='utf-8') as file:
+        entries = json.load(file)
+    specs = [SessionSpec.from_dict(entry) for entry in entries]
+    names = [spec.name for spec in specs]
+    if len(set(names)) != len(names):
+        raise ValueError("Session names must be unique.")
+    return specs
+
+
+def create_remote_driver(remote_url, chrome_options, node=None, session_name=None):
+    """Start a Chrome session on a remote WebDriver endpoint, pinned to a grid node if given."""
+    if node:
+        chrome_options.set_capability(NODE_CAPABILITY, node)
+    if session_name:
+        chrome_options.set_capability('se:name', session_name)  # Shown in the Grid UI
+    return webdriver.Remote(command_executor=remote_url, options=chrome_options)
+
+
+def session_alive(driver):
+    """Check whether the browser session still answers."""
+    try:
+        driver.current_window_handle
+        return True
+    except Exception as e:
+        # WebDriverException, or a urllib3/socket error when the node's host is gone
+        log.debug("Session check failed: %s", app_logging.short_error(e))
+        return False
+
+
+class PooledSession:
+    __slots__ = ('spec', 'driver', 'state', 'sent', 'requeued')
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.driver = None
+        self.state = STATE_STARTING
+        self.sent = 0
+        self.requeued = 0
+
+
+class SessionPool:
+    """
+    Runs one worker thread per session over a shared queue of items.
+
+    start_session(spec) returns a ready (logged-in) driver or raises; stop_session(driver), if
+    given, releases what start_session attached to it before the driver quits. work(session_name, driver,
+    item) sends one item and returns its result; results with failure_class in lost_failure_classes
+    (or exceptions) trigger a session check, and if the session is gone the item is requeued.
+    """
+
+    def __init__(self, specs, start_session, progress=None, reconnect_attempts=3, reconnect_delay=30,
+                 lost_failure_classes=(), stop_session=None):
+        self.sessions = [PooledSession(spec) for spec in specs]
+        self.start_session = start_session
+        self.stop_session = stop_session
+        self.progress = progress
+        self.reconnect_attempts = reconnect_attempts
+        self.reconnect_delay = reconnect_delay
+        self.lost_failure_classes = set(lost_failure_classes)
+        self._items = iter(())
+        self._requeued = deque()
+        self._in_flight = 0  # Items handed to a session and not finished or requeued yet
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._stop = threading.Event()
+
+    def _set_state(self, session, state):
+        session.state = state
+        if self.progress:
+            self.progress.set_session_state(session.spec.name, state)
+
+    def _next_item(self):
+        with self._changed:
+            while not self._stop.is_set():
+                item = self._requeued.popleft() if self._requeued else next(self._items, None)
+                if item is not None:
+                    self._in_flight += 1
+                    return item
+                if not self._in_flight:
+                    return None
+                # Another session may still lose its contact and put it back
+                self._changed.wait(1)
+            return None
+
+    def _finish_item(self):
+        with self._changed:
+            self._in_flight -= 1
+            self._changed.notify_all()
+
+    def _requeue(self, session, item):
+        with self._changed:
+            self._requeued.appendleft(item)
+            self._in_flight -= 1
+            self._changed.notify_all()
+        session.requeued += 1
+
+    def _connect(self, session, attempts):
+        for attempt in range(1, attempts + 1):
+            if self._stop.is_set():
+                return False
+            try:
+                session.driver = self.start_session(session.spec)
+                return True
+            except Exception as e:
+                log.error("[%s] Could not start session (attempt %s/%s): %s", session.spec.name, attempt, attempts,
+                          app_logging.short_error(e), extra=app_logging.log_fields(session=session.spec.name))
+                session.driver = None
+            if attempt < attempts:
+                self._stop.wait(self.reconnect_delay)
+        return False
+
+    def _quit(self, session):
+        if session.driver is not None:
+            try:
+                if self.stop_session:
+                    self.stop_session(session.driver)
+                session.driver.quit()
+            except Exception:
+                pass  # The node is usually gone already
+            session.driver = None
+
+    def _worker(self, session, work, on_result):
+        name = session.spec.name
+        if not self._connect(session, 1):
+            self._set_state(session, STATE_LOST)
+            return
+        self._set_state(session, STATE_SENDING)
+        while not self._stop.is_set():
+            item = self._next_item()
+            if item is None:
+                break
+            try:
+                result = work(name, session.driver, item)
+                error = None
+            except Exception as e:
+                result, error = None, e
+            lost_suspect = error is not None or getattr(result, 'failure_class', None) in self.lost_failure_classes
+            if lost_suspect and not session_alive(session.driver):
+                # The node (or its browser) is gone: hand the contact to the other sessions
+                log.warning("[%s] Session lost; contact requeued and reconnecting", name,
+                            extra=app_logging.log_fields(item[0] if isinstance(item, tuple) else item, session=name))
+                self._requeue(session, item)
+                self._quit(session)
+                self._set_state(session, STATE_RECONNECTING)
+                if not self._connect(session, self.reconnect_attempts):
+                    log.error("[%s] Giving up on this session; the other sessions continue", name,
+                              extra=app_logging.log_fields(session=name))
+                    self._set_state(session, STATE_LOST)
+                    return
+                self._set_state(session, STATE_SENDING)
+                continue
+            if error is not None:
+                log.error("[%s] Error sending: %s", name, app_logging.short_error(error), exc_info=error,
+                          extra=app_logging.log_fields(session=name))
+            session.sent += 1
+            self._finish_item()
+            on_result(name, item, result)
+        self._set_state(session, STATE_DONE)
+
+    def run(self, items, work, on_result):
+        """Work through items with all sessions. Returns the items that no session could send."""
+        self._items = iter(items)
+        self._in_flight = 0
+        threads = [threading.Thread(target=self._worker, args=(session, work, on_result),
+                                    name=f"session-{session.spec.name}", daemon=True)
+                   for session in self.sessions]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(1)
+        except KeyboardInterrupt:
+            log.info("Stopping sessions after their current contact...")
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+        finally:
+            for session in self.sessions:
+                self._quit(session)
+
+        # Whatever is left had no live session to go to
+        with self._lock:
+            unsent = list(self._requeued)
+            self._requeued.clear()
+            unsent.extend(self._items)
+        for session in self.sessions:
+            log.info("[%s] %s: %s processed, %s requeued", session.spec.name, session.state, session.sent,
+                     session.requeued, extra=app_logging.log_fields(session=session.spec.name))
+        return unsent
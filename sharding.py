@@ -0,0 +1,126 @@
+"""
+Sharding Module for WhatsApp Sender Application
+
+This module splits one campaign across several machines or WhatsApp accounts without any
+coordination service. Contacts are assigned to shards by hashing the normalized mobile
+number, so the same number always lands in the same shard no matter which machine does the
+split. Each shard run writes a delivery report, and the reports are merged into one
+success/failure report afterwards.
+
+    python sharding.py split contacts.xlsx 4
+    python sharding.py merge Campaign_Report.xlsx report_shard_*.csv
+"""
+
+import os
+import sys
+import glob
+import hashlib
+import pandas as pd
+
+import contact_cache
+import app_logging
+from contact_utils import normalize_mobile
+from delivery_report import read_report, STATUS_SENT, STATUS_PARTIAL, STATUS_RECEIPT
+
+log = app_logging.get_logger('sharding')
+
+
+def shard_for(mobile, shard_count):
+    """Return the shard index (0 based) for a mobile number."""
+    digest = hashlib.sha1(normalize_mobile(mobile).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % shard_count
+
+
+def split_contacts(file_path, shard_count, output_dir=None):
+    """Split a contacts workbook into shard_count workbooks. Returns the created file paths."""
+    if shard_count < 1:
+        log.error("The number of shards must be at least 1.")
+        return []
+
+    try:
+        df = contact_cache.read_contacts_frame(file_path)
+    except Exception as e:
+        log.error("Error loading contacts: %s", e)
+        return []
+    if 'MOBILE' not in df.columns:
+        log.error("Required column (MOBILE) is missing.")
+        return []
+
+    # Mobile numbers are already normalized by the contact cache
+    duplicates = df['MOBILE'].duplicated()
+    if duplicates.any():
+        log.warning("Dropping %s duplicate mobile numbers.", int(duplicates.sum()))
+        df = df[~duplicates]
+    shards = df['MOBILE'].map(lambda mobile: shard_for(mobile, shard_count))
+
+    output_dir = output_dir or os.path.dirname(os.path.abspath(file_path))
+    base_name = os.path.splitext(os.path.basename(file_path))[0]
+    shard_files = []
+    for shard in range(shard_count):
+        shard_file = os.path.join(output_dir, f"{base_name}_shard_{shard}_of_{shard_count}.xlsx")
+        df[shards == shard].to_excel(shard_file, index=False)
+        log.info("Shard %s: %s contacts -> %s", shard, int((shards == shard).sum()), shard_file)
+        shard_files.append(shard_file)
+    return shard_files
+
+
+def merge_results(result_files, output_file):
+    """
+    Merge shard delivery reports (.csv or .jsonl) into one report without duplicates.
+
+    The row of a number's highest attempt wins, so a failed re-send is not hidden by the send
+    before it. Among rows of the same attempt (other shards or runs) a sent row wins over a
+    partial send (text sent, an attachment failed), and that over the latest failure.
+    Receipt rows do not count as sends; the latest receipt of a number is copied onto its row.
+    The report has one 'Sent', one 'Partial' and one 'Failed' sheet.
+    """
+    frames = []
+    for result_file in result_files:
+        try:
+            frame = pd.DataFrame(list(read_report(result_file)), dtype=str)
+            if not frame.empty:
+                frames.append(frame)
+        except Exception as e:
+            log.error("Error reading result file %s: %s", result_file, e)
+    if not frames:
+        log.warning("No result files to merge.")
+        return None
+
+    results = pd.concat(frames, ignore_index=True)
+    results['MOBILE'] = results['MOBILE'].map(normalize_mobile)
+    if 'RECEIPT' not in results.columns:
+        results['RECEIPT'] = ''
+    results['RECEIPT'] = results['RECEIPT'].fillna('')
+    # Older reports wrote receipt rows with the status 'sent'; the RECEIPT value marks them too
+    is_receipt = (results['STATUS'] == STATUS_RECEIPT) | (results['RECEIPT'] != '')
+    receipts = results[is_receipt].sort_values('TIMESTAMP').drop_duplicates('MOBILE', keep='last')
+    results = results[~is_receipt]
+    results['_RANK'] = results['STATUS'].map({STATUS_PARTIAL: 1, STATUS_SENT: 2}).fillna(0)
+    results['_ATTEMPTS'] = pd.to_numeric(results['ATTEMPTS'], errors='coerce').fillna(1)
+    results = results.sort_values(['_ATTEMPTS', '_RANK', 'TIMESTAMP'])
+    results = results.drop_duplicates('MOBILE', keep='last').drop(columns=['_ATTEMPTS', '_RANK'])
+    latest_receipt = results['MOBILE'].map(receipts.set_index('MOBILE')['RECEIPT'])
+    results['RECEIPT'] = latest_receipt.fillna(results['RECEIPT'])
+
+    sent = results[results['STATUS'] == STATUS_SENT]
+    partial = results[results['STATUS'] == STATUS_PARTIAL]
+    failed = results[~results['STATUS'].isin([STATUS_SENT, STATUS_PARTIAL])]
+    with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
+        sent.to_excel(writer, sheet_name='Sent', index=False)
+        partial.to_excel(writer, sheet_name='Partial', index=False)
+        failed.to_excel(writer, sheet_name='Failed', index=False)
+    log.info("Merged %s result files: %s sent, %s partial, %s failed -> %s", len(result_files), len(sent),
+             len(partial), len(failed), output_file)
+    return output_file
+
+
+if __name__ == "__main__":
+    app_logging.configure_logging()
+    if len(sys.argv) == 4 and sys.argv[1] == 'split':
+        split_contacts(sys.argv[2], int(sys.argv[3]))
+    elif len(sys.argv) >= 4 and sys.argv[1] == 'merge':
+        files = [path for pattern in sys.argv[3:] for path in sorted(glob.glob(pattern))]
+        merge_results(files, sys.argv[2])
+    else:
+        print("Usage: python sharding.py split CONTACTS.xlsx SHARD_COUNT")
+        print("       python sharding.py merge REPORT.xlsx DELIVERY_REPORT [DELIVERY_REPORT ...]")
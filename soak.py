@@ -0,0 +1,221 @@
+"""
+Soak Test Runner for WhatsApp Sender Application
+
+This script pushes large numbers of synthetic contacts through the real orchestration code of a
+sender script (its run_campaign, send functions, retries and failed-contacts bookkeeping) using
+the FakeDriver from fake_driver.py, and reports throughput and memory.
+
+    python soak.py --variant v3 --contacts 200000 --attachments 2
+    python soak.py --variant v1 --contacts 100000 --page-timeout-rate 0.05
+    python soak.py --transport api --contacts 100000 --attachments 2
+
+With --transport api the same contacts go through the HTTP API transport to the local mock
+server (mock_api_server.py) instead of the simulated browser. That run takes real time, so
+compare its messages per hour with the simulated hours of a browser run.
+
+Output files (delivery report, Failed_Contacts.xlsx, backups) are written to a temporary
+working folder, never next to the real scripts.
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import contextlib
+import importlib.util
+import tracemalloc
+
+from fake_driver import FakeDriver, FakeDriverConfig, VirtualClock
+from contact_store import ContactStore
+import app_logging
+
+BASE_PATH = os.path.dirname(os.path.abspath(__file__))
+VARIANTS = {
+    'v1': os.path.join(BASE_PATH, "1.Watsapp message  applctaion", "1.Watsapp message  applctaion", "main.py"),
+    'v3': os.path.join(BASE_PATH, "4.Whatsapp_message  version 3", "4.Project_WP", "main.py"),
+}
+MESSAGE_TEMPLATE = "Hello {name},\n\nYour UAN {uan} has been activated. Your date of birth is {dob}.\n\nRegards,\nHR Team"
+
+
+def load_variant(variant):
+    """Import a sender script by path as a module."""
+    spec = importlib.util.spec_from_file_location(f"sender_{variant}", VARIANTS[variant])
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def synthetic_contacts(count):
+    return ContactStore.from_columns({
+        'NAME': (f"Employee {i}" for i in range(count)),
+        'UAN': (100100000000 + i for i in range(count)),
+        'DOB': (f"19{70 + i % 30}-{1 + i % 12:02d}-{1 + i % 28:02d}" for i in range(count)),
+        'MOBILE': (919000000000 + i for i in range(count)),
+    })
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak / 1e6 if sys.platform == 'darwin' else peak / 1e3
+
+
+def run_soak(variant, contact_count, attachments, config, workdir, trace_memory=False, prefetch=False, caption=False):
+    module = load_variant(variant)
+    clock = VirtualClock()
+    driver = FakeDriver(config, clock)
+    # The code under test sleeps through the virtual clock instead of the real one
+    module.time = clock
+    module.adaptive_wait.time = clock
+
+    stats = {'send_calls': 0, 'send_failures': 0}
+    send_message = module.send_message
+
+    def counting_send_message(*args, **kwargs):
+        result = send_message(*args, **kwargs)
+        stats['send_calls'] += 1
+        if not result:
+            stats['send_failures'] += 1
+        return result
+
+    module.send_message = counting_send_message
+
+    contacts = synthetic_contacts(contact_count)
+    attachment_paths = []
+    for number in range(attachments):
+        attachment_path = os.path.join(workdir, f"attachment_{number}.pdf")
+        with open(attachment_path, 'wb') as file:
+            file.write(b'%PDF-1.4\n')
+        attachment_paths.append(attachment_path)
+
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    previous_dir = os.getcwd()
+    os.chdir(workdir)  # file_manager writes backups below the working directory
+    try:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            if variant == 'v1':
+                module.run_campaign(driver, contacts, MESSAGE_TEMPLATE,
+                                    failed_contacts_file=os.path.join(workdir, "Failed_Contacts.xlsx"))
+            else:
+                report_writer = module.delivery_report.DeliveryReportWriter(os.path.join(workdir, "report.csv"))
+                try:
+                    module.run_campaign(driver, contacts, MESSAGE_TEMPLATE, attachment_paths,
+                                        report_writer=report_writer, prefetch=prefetch, caption=caption)
+                finally:
+                    report_writer.close()
+    finally:
+        os.chdir(previous_dir)
+    elapsed = time.perf_counter() - started
+
+    print(f"Variant:            {variant}")
+    print(f"Contacts:           {contact_count}")
+    print(f"Wall time:          {elapsed:.1f} s ({contact_count / elapsed:,.0f} contacts/s)")
+    print(f"Simulated time:     {clock.now / 3600:.1f} h of sending")
+    print(f"send_message calls: {stats['send_calls']} ({stats['send_failures']} failed)")
+    print(f"WebDriver commands: {driver.commands} ({driver.commands / max(contact_count, 1):.1f} per contact)")
+    print(f"Lost messages:      {driver.lost_messages} (page loads started while a message was pending)")
+    if trace_memory:
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"Python memory:      {current / 1e6:.1f} MB now, {peak / 1e6:.1f} MB peak")
+    rss = peak_rss_mb()
+    if rss is not None:
+        print(f"Peak RSS:           {rss:.1f} MB")
+    for stage, (samples, p99, timeout) in module.stage_timeouts.summary().items():
+        print(f"Wait '{stage}':{' ' * max(1, 12 - len(stage))}p99 {p99:.2f} s, timeout {timeout:.1f} s ({samples} samples)")
+    print(f"Output folder:      {workdir}")
+
+
+def run_api_soak(contact_count, attachments, workdir, latency=0.05, failure_rate=0.0, concurrency=8, batch_size=50,
+                 seed=None):
+    import transports
+    import mock_api_server
+
+    module = load_variant('v3')
+    state = mock_api_server.MockApiState(latency=latency, failure_rate=failure_rate, seed=seed)
+    server = mock_api_server.start_mock_server(state, port=0)
+    transport = transports.HttpApiTransport(f"http://127.0.0.1:{server.server_address[1]}",
+                                            concurrency=concurrency, batch_size=batch_size)
+
+    contacts = synthetic_contacts(contact_count)
+    attachment_paths = []
+    for number in range(attachments):
+        attachment_path = os.path.join(workdir, f"attachment_{number}.pdf")
+        with open(attachment_path, 'wb') as file:
+            file.write(b'%PDF-1.4\n' + os.urandom(64 * 1024))
+        attachment_paths.append(attachment_path)
+    plan = module.attachments.build_attachment_plan(contacts, attachment_paths)
+    run_progress = module.progress.ProgressTracker(total=len(plan))
+
+    started = time.perf_counter()
+    report_writer = module.delivery_report.DeliveryReportWriter(os.path.join(workdir, "report.csv"))
+    try:
+        module.run_transport_campaign(transport, plan, MESSAGE_TEMPLATE, report_writer=report_writer,
+                                      progress=run_progress)
+    finally:
+        report_writer.close()
+        transport.close()
+        server.shutdown()
+    elapsed = time.perf_counter() - started
+
+    print(f"Transport:          api (mock server, {latency * 1000:.0f} ms latency, {failure_rate:.1%} failures)")
+    print(f"Contacts:           {contact_count}")
+    print(f"Wall time:          {elapsed:.1f} s ({contact_count / elapsed * 3600:,.0f} messages/h)")
+    print(f"Outcomes:           {dict(run_progress.status_counts)}")
+    print(f"Batches:            {state.stats['batches']} of up to {batch_size}, {concurrency} in flight")
+    print(f"HTTP connections:   {state.stats['connections']} for {state.stats['requests']} requests")
+    print(f"Media uploads:      {state.stats['media_uploads']} ({state.stats['media_bytes'] / 1e6:.1f} MB)")
+    rss = peak_rss_mb()
+    if rss is not None:
+        print(f"Peak RSS:           {rss:.1f} MB")
+    print(f"Output folder:      {workdir}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Soak-test the send loop with a simulated browser.")
+    parser.add_argument('--variant', choices=sorted(VARIANTS), default='v3')
+    parser.add_argument('--contacts', type=int, default=100000)
+    parser.add_argument('--attachments', type=int, default=0, help="Attachments per contact (v3 only).")
+    parser.add_argument('--prefetch', action='store_true', help="Load the next chat during the delay (v3 only).")
+    parser.add_argument('--caption', action='store_true', help="Send the message as attachment caption (v3 only).")
+    parser.add_argument('--transport', choices=['browser', 'api'], default='browser',
+                        help="Simulated browser, or the HTTP API transport against the local mock server (v3).")
+    parser.add_argument('--api-latency', type=float, default=0.05, help="Mock API latency per request in seconds.")
+    parser.add_argument('--api-failure-rate', type=float, default=0.01, help="Share of retryable mock API failures.")
+    parser.add_argument('--api-concurrency', type=int, default=8)
+    parser.add_argument('--api-batch-size', type=int, default=50)
+    parser.add_argument('--page-load-median', type=float, default=2.0)
+    parser.add_argument('--page-timeout-rate', type=float, default=0.02)
+    parser.add_argument('--element-timeout-rate', type=float, default=0.002)
+    parser.add_argument('--crash-rate', type=float, default=0.001)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--trace-memory', action='store_true', help="Measure Python memory with tracemalloc (slower).")
+    parser.add_argument('--log-file', help="Write the JSON log of the run to this file (measures logging overhead).")
+    parser.add_argument('--workdir', help="Folder for output files (default: a new temporary folder).")
+    args = parser.parse_args()
+    # The send loop logs every contact; keep it off the console and out of stderr
+    app_logging.configure_logging('INFO' if args.log_file else 'CRITICAL', log_file=args.log_file, console=False)
+
+    config = FakeDriverConfig(
+        page_load_median=args.page_load_median,
+        page_timeout_rate=args.page_timeout_rate,
+        element_timeout_rate=args.element_timeout_rate,
+        crash_rate=args.crash_rate,
+        seed=args.seed,
+    )
+    workdir = args.workdir or tempfile.mkdtemp(prefix="wa_soak_")
+    os.makedirs(workdir, exist_ok=True)
+    if args.transport == 'api':
+        run_api_soak(args.contacts, args.attachments, workdir, latency=args.api_latency,
+                     failure_rate=args.api_failure_rate, concurrency=args.api_concurrency,
+                     batch_size=args.api_batch_size, seed=args.seed)
+    else:
+        run_soak(args.variant, args.contacts, args.attachments, config, workdir, trace_memory=args.trace_memory,
+                 prefetch=args.prefetch, caption=args.caption)
@@ -0,0 +1,197 @@
+"""
+Transports Module for WhatsApp Sender Application
+
+A transport is the way prepared messages reach WhatsApp. The browser transport is the send
+loop of main.py (Selenium driving WhatsApp Web, one contact at a time). This module adds the
+Transport interface for everything else and the HttpApiTransport, which sends through a
+batched HTTP messaging API, so loading contacts, formatting templates, retrying and reporting
+stay the same whichever way the messages go out.
+
+The HTTP API (see mock_api_server.py for a local stand-in):
+
+    POST /v1/media            raw file bytes -> {"id": "media-..."}
+    POST /v1/messages/batch   {"messages": [{"to", "text", "media": [ids], "client_ref"}]}
+                              -> {"results": [{"client_ref", "status": "accepted" | "rejected",
+                                               "id", "error", "retryable"}]}
+
+HttpApiTransport keeps a pool of keep-alive connections (urllib3), has several batches in
+flight at once, and uploads every attachment file once per run; messages reference it by id.
+
+The API accepts a message once per client_ref and answers a repeated one with the first
+result. client_ref is a hash of the campaign, the number, the text and the attachment names,
+so the same message gets the same ref in every batch and every run: a batch whose response
+was lost and that is sent again (by urllib3 or by the campaign's retry pass) is not
+delivered twice.
+"""
+
+import os
+import abc
+import json
+import hashlib
+import threading
+import mimetypes
+import urllib.parse
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+import urllib3
+
+from contact_utils import normalize_mobile
+from delivery_report import SendResult, FAILURE_API, FAILURE_REJECTED
+import app_logging
+
+log = app_logging.get_logger('transports')
+
+TOKEN_ENV = 'WA_TRANSPORT_TOKEN'
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class TransportError(Exception):
+    """An API request failed after urllib3's retries."""
+
+
+def message_key(campaign, contact, message, attachment_paths):
+    """Stable idempotency key of one message of a campaign."""
+    parts = [campaign, normalize_mobile(contact['MOBILE']), message]
+    parts.extend(os.path.basename(path) for path in attachment_paths)
+    return hashlib.blake2b('\x1f'.join(parts).encode('utf-8'), digest_size=16).hexdigest()
+
+
+class Transport(abc.ABC):
+    """Sends prepared messages. Subclasses implement send() for one way of reaching WhatsApp."""
+
+    name = None
+
+    @abc.abstractmethod
+    def send(self, items):
+        """
+        Send (contact, message, attachment_paths) items, read lazily from any iterable, and
+        yield (item, SendResult) pairs in the order of the items.
+        """
+
+    def close(self):
+        pass
+
+
+class HttpApiTransport(Transport):
+    """Sends batches of messages to an HTTP messaging API over a pool of keep-alive connections."""
+
+    name = 'api'
+
+    def __init__(self, base_url, token=None, campaign='', concurrency=8, batch_size=50, timeout=30, retries=3):
+        self.base_url = base_url.rstrip('/')
+        self.campaign = campaign
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.headers = {'User-Agent': 'whatsapp-sender'}
+        token = token or os.environ.get(TOKEN_ENV)
+        if token:
+            self.headers['Authorization'] = f"Bearer {token}"
+        # One connection per concurrent batch; block instead of opening throw-away connections
+        self.http = urllib3.PoolManager(
+            num_pools=2, maxsize=concurrency, block=True,
+            timeout=urllib3.Timeout(connect=5, read=timeout),
+            retries=urllib3.Retry(total=retries, backoff_factor=0.5, status_forcelist=RETRY_STATUSES,
+                                  allowed_methods=None, raise_on_status=False))
+        self._executor = ThreadPoolExecutor(concurrency, thread_name_prefix='api-transport')
+        self._media = {}  # (path, size, mtime) -> Future of the media id
+        self._media_lock = threading.Lock()
+        self.counts = {'batches': 0, 'media_uploads': 0}
+
+    def _request(self, method, path, body, headers):
+        try:
+            # Headers given to a request replace the pool's, so the defaults are merged in here
+            response = self.http.request(method, self.base_url + path, body=body, headers={**self.headers, **headers})
+        except urllib3.exceptions.HTTPError as e:
+            raise TransportError(f"{method} {path}: {e}") from e
+        if response.status >= 400:
+            raise TransportError(f"{method} {path}: HTTP {response.status} {response.data[:200]!r}")
+        try:
+            return json.loads(response.data)
+        except ValueError as e:
+            raise TransportError(f"{method} {path}: invalid JSON response") from e
+
+    def media_id(self, path):
+        """Id of an attachment file, uploading it the first time it is used."""
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        with self._media_lock:
+            future = self._media.get(key)
+            owner = future is None
+            if owner:
+                future = self._media[key] = Future()
+        if not owner:
+            return future.result()  # Another batch is uploading it
+        try:
+            with open(path, 'rb') as file:
+                data = file.read()
+            file_name = os.path.basename(path)
+            reply = self._request('POST', '/v1/media', data, {
+                'Content-Type': mimetypes.guess_type(file_name)[0] or 'application/octet-stream',
+                'X-File-Name': urllib.parse.quote(file_name),
+            })
+            future.set_result(reply['id'])
+            self.counts['media_uploads'] += 1
+            log.debug("Uploaded %s as %s", file_name, reply['id'])
+        except Exception as e:
+            with self._media_lock:
+                del self._media[key]  # The next batch that needs it tries again
+            future.set_exception(e)
+        return future.result()
+
+    def _send_batch(self, batch):
+        """Return one SendResult per item of the batch."""
+        try:
+            messages = []
+            for contact, message, attachment_paths in batch:
+                messages.append({'to': normalize_mobile(contact['MOBILE']), 'text': message,
+                                 'media': [self.media_id(path) for path in attachment_paths],
+                                 'client_ref': message_key(self.campaign, contact, message, attachment_paths)})
+            reply = self._request('POST', '/v1/messages/batch', json.dumps({'messages': messages}).encode('utf-8'),
+                                  {'Content-Type': 'application/json'})
+        except (TransportError, OSError, KeyError) as e:
+            log.error("API batch of %s messages failed: %s", len(batch), app_logging.short_error(e),
+                      extra=app_logging.log_fields(stage='api_batch'))
+            return [SendResult(False, FAILURE_API, str(e)) for _ in batch]
+        self.counts['batches'] += 1
+
+        outcomes = {str(outcome.get('client_ref')): outcome for outcome in reply.get('results', [])}
+        results = []
+        for (contact, message, attachment_paths), sent in zip(batch, messages):
+            outcome = outcomes.get(sent['client_ref'])
+            if outcome is None:
+                result = SendResult(False, FAILURE_API, "No result for this message")
+            elif outcome.get('status') == 'accepted':
+                result = SendResult(True, detail=outcome.get('id'))
+                result.attachments = [(os.path.basename(path), True) for path in attachment_paths]
+            else:
+                failure_class = FAILURE_API if outcome.get('retryable') else FAILURE_REJECTED
+                result = SendResult(False, failure_class, outcome.get('error'))
+            results.append(result)
+        return results
+
+    def send(self, items):
+        item_iter = iter(items)
+        in_flight = deque()
+
+        def submit_next():
+            batch = []
+            for item in item_iter:
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+            if batch:
+                in_flight.append((batch, self._executor.submit(self._send_batch, batch)))
+            return bool(batch)
+
+        # Keep every worker busy: the next batches are on the wire while results are recorded
+        while len(in_flight) < self.concurrency * 2 and submit_next():
+            pass
+        while in_flight:
+            batch, future = in_flight.popleft()
+            results = future.result()
+            submit_next()
+            yield from zip(batch, results)
+
+    def close(self):
+        self._executor.shutdown(cancel_futures=True)
+        self.http.clear()